@@ -3,18 +3,67 @@
 #installing pycurl
 #https://stackoverflow.com/questions/37669428/error-in-installation-pycurl-7-19-0
 
-import pycurl
-from io import BytesIO
-
 import json
-
-import pandas as pd
+import codecs
+
+import queue
+
+import functools
+import operator
+
+import importlib
+
+import os
+import re
+import sys
+import time
+import zlib
+import gzip
+import tempfile
+import heapq
+import copy
+import itertools
+import random
+import hashlib
+import threading
+import collections
+import contextlib
+import contextvars
+from urllib.parse import urlsplit, parse_qsl, quote, unquote
 
 from datetime import datetime, timedelta
 
 import math
 
-AMPL_API_DEBUG_MODE = False
+#a module imported on its first use, pycurl on the first network call, pandas and numpy on the first data frame conversion,
+#so building queries, reading cached responses or running with AMPL_DTYPES_JSON doesn't pay for loading them
+class amplitudeLazyModule:
+
+	def __init__(self, alias, name):
+		self.alias = alias
+		self.name = name
+
+	def __getattr__(self, attribute):
+		module = importlib.import_module(self.name)
+		#like import a.b, a dotted name binds its top level package
+		if '.' in self.name:
+			module = sys.modules[self.name.split('.')[0]]
+		#further lookups of the alias in this module find the module itself
+		globals()[self.alias] = module
+		return getattr(module, attribute)
+
+	def __repr__(self):
+		return '<lazy module {0}>'.format(self.name)
+
+pycurl = amplitudeLazyModule('pycurl', 'pycurl')
+np = amplitudeLazyModule('np', 'numpy')
+pd = amplitudeLazyModule('pd', 'pandas')
+asyncio = amplitudeLazyModule('asyncio', 'asyncio')
+inspect = amplitudeLazyModule('inspect', 'inspect')
+zipfile = amplitudeLazyModule('zipfile', 'zipfile')
+concurrent = amplitudeLazyModule('concurrent', 'concurrent.futures')
+
+AMPL_API_DEBUG_MODE = False      #prints every measurement of amplitudeMetrics (see amplitudeDebugListener)
 
 #constants 
 AMPL_FREQ_REALTIME = -300000
@@ -44,6 +93,145 @@ AMPL_LTV_METRIC_ARPPU = 1
 AMPL_LTV_METRIC_TOTREV = 2
 AMPL_LTV_METRIC_PAYING = 3
 
+#API endpoint, can be overridden with apiUrl in the config file (e.g. https://analytics.eu.amplitude.com for EU data residency)
+AMPL_API_URL = 'https://amplitude.com'
+
+#output dtypes of returned data frames
+AMPL_DTYPES_DEFAULT = 'default'    #as built by the parsers
+AMPL_DTYPES_COMPACT = 'compact'    #repeated labels become categoricals, numbers are downcast where no information is lost
+AMPL_DTYPES_ARROW = 'arrow'        #compact, with the remaining columns backed by Arrow (requires pyarrow)
+AMPL_DTYPES_JSON = 'json'          #no data frames, getters return the decoded responses and pandas is never imported
+
+#transport defaults
+AMPL_POOL_SIZE = 4                 #number of idle curl handles kept alive between calls
+AMPL_CONNECT_TIMEOUT = 30          #seconds
+AMPL_TIMEOUT = 600                 #seconds, whole transfer
+AMPL_MAX_IN_FLIGHT = 5             #Amplitude allows up to 5 concurrent queries per project
+
+#group by fan-out defaults
+AMPL_FANOUT_MAX_REQUESTS = 100     #requests getEventSegmentationFanOut may issue for a single call
+
+#project pool defaults
+AMPL_PROJECT_WORKERS = 16          #getter calls amplitudeProjectPool runs at the same time, across all projects
+#config entries of amplitudeProjectPool projects passed to their own amplitudeScheduler
+AMPL_PROJECT_SCHEDULER_SETTINGS = ['rate', 'burst', 'maxConcurrent', 'costBudget', 'maxRetries', 'backoffBase', 'backoffCap']
+
+#export API defaults
+AMPL_EXPORT_BATCH_SIZE = 50000     #events per parquet row group
+
+#scheduler defaults
+AMPL_MAX_RETRIES = 5               #retries of throttled (429), failed (5xx) and interrupted (transport errors) requests
+AMPL_BACKOFF_BASE = 1.0            #seconds, the first retry waits up to this long, every next one twice as long
+AMPL_BACKOFF_CAP = 60.0            #seconds, upper limit of a single backoff
+AMPL_SCHEDULER_POLL = 0.05         #seconds between attempts to get a free query slot
+
+#metrics defaults
+AMPL_METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)   #seconds, request duration histogram buckets
+#curl transfer timings recorded for every request: measurement key -> name of the curl info, seconds since the transfer started
+AMPL_METRICS_TIMINGS = [('namelookup', 'NAMELOOKUP_TIME'),
+						('connect', 'CONNECT_TIME'),
+						('appconnect', 'APPCONNECT_TIME'),
+						('starttransfer', 'STARTTRANSFER_TIME'),
+						('total', 'TOTAL_TIME')]
+
+#response cache defaults
+AMPL_CACHE_MAX_BYTES = 1024 ** 3   #on-disk size limit, least recently used entries are evicted first
+AMPL_CACHE_SETTLE_DAYS = 3         #data older than this is considered final
+AMPL_CACHE_TTL = 3600              #seconds, lifetime of entries covering recent or incomplete data
+
+#in-memory result cache defaults
+AMPL_RESULT_CACHE_MAX_BYTES = 256 * 1024 ** 2   #memory taken by cached results, least recently used ones are evicted first
+AMPL_RESULT_CACHE_TTL = 300                     #seconds, lifetime of a cached result
+
+#getters issuing exactly one API request -> methods building their (url, parser) pairs
+AMPL_REQUEST_BUILDERS = {'getEvents': '__eventsRequest__',
+						 'getDataFromExistingChart': '__existingChartRequest__',
+						 'getAnnotations': '__annotationsRequest__',
+						 'getUserActivity': '__userActivityRequest__',
+						 'getLTV': '__ltvRequest__',
+						 'getRetention': '__retentionRequest__',
+						 'getFunnel': '__funnelRequest__',
+						 'getEventSegmentation': '__eventSegmentationRequest__',
+						 'getEventUniques': '__eventUniquesRequest__',
+						 'getEventTotals': '__eventTotalsRequest__',
+						 'getEventPropSum': '__eventPropSumRequest__',
+						 'getSessionLengthDistro': '__sessionLengthDistroRequest__',
+						 'getSessionAvgLength': '__sessionAvgLengthRequest__',
+						 'getSessionAvgPerUser': '__sessionAvgPerUserRequest__'}
+
+#getters which can be split into date shards -> methods stitching shard responses back into a single response
+AMPL_SHARD_MERGERS = {'getEventSegmentation': '__mergeSeries__',
+					  'getEventUniques': '__mergeSeries__',
+					  'getEventTotals': '__mergeSeries__',
+					  'getEventPropSum': '__mergeSeries__',
+					  'getSessionAvgLength': '__mergeSeries__',
+					  'getSessionAvgPerUser': '__mergeSeries__',
+					  'getSessionLengthDistro': '__mergeHistograms__',
+					  'getRetention': '__mergeRetention__',
+					  'getLTV': '__mergeLTV__'}
+
+#event fields getUserActivity keeps in separate columns rather than in the header
+AMPL_USER_ACTIVITY_FIELDS = ['user_id', 'event_type', 'server_received_time', 'user_properties', 'event_properties']
+#columns of flattened getUserActivity output stored as categoricals
+AMPL_USER_ACTIVITY_CATEGORIES = ['event_type', 'platform', 'country']
+
+#columns of exported events and their types, nested values are stored as JSON strings,
+#fields missing from this list are kept in the extra column (as a JSON object)
+AMPL_EXPORT_FIELDS = [('$insert_id', 'string'),
+					  ('adid', 'string'),
+					  ('amplitude_attribution_ids', 'json'),
+					  ('amplitude_event_type', 'string'),
+					  ('amplitude_id', 'int'),
+					  ('app', 'int'),
+					  ('city', 'string'),
+					  ('client_event_time', 'string'),
+					  ('client_upload_time', 'string'),
+					  ('country', 'string'),
+					  ('data', 'json'),
+					  ('device_brand', 'string'),
+					  ('device_carrier', 'string'),
+					  ('device_family', 'string'),
+					  ('device_id', 'string'),
+					  ('device_manufacturer', 'string'),
+					  ('device_model', 'string'),
+					  ('device_type', 'string'),
+					  ('dma', 'string'),
+					  ('event_id', 'int'),
+					  ('event_properties', 'json'),
+					  ('event_time', 'string'),
+					  ('event_type', 'string'),
+					  ('global_user_properties', 'json'),
+					  ('group_properties', 'json'),
+					  ('groups', 'json'),
+					  ('idfa', 'string'),
+					  ('ip_address', 'string'),
+					  ('is_attribution_event', 'bool'),
+					  ('language', 'string'),
+					  ('library', 'string'),
+					  ('location_lat', 'float'),
+					  ('location_lng', 'float'),
+					  ('os_name', 'string'),
+					  ('os_version', 'string'),
+					  ('partner_id', 'string'),
+					  ('paying', 'string'),
+					  ('plan', 'json'),
+					  ('platform', 'string'),
+					  ('processed_time', 'string'),
+					  ('region', 'string'),
+					  ('sample_rate', 'float'),
+					  ('server_received_time', 'string'),
+					  ('server_upload_time', 'string'),
+					  ('session_id', 'int'),
+					  ('source_id', 'string'),
+					  ('start_version', 'string'),
+					  ('user_creation_time', 'string'),
+					  ('user_id', 'string'),
+					  ('user_properties', 'json'),
+					  ('uuid', 'string'),
+					  ('version_name', 'string')]
+
+AMPL_WEEK_START = 6                #Amplitude's weeks start on Sunday (datetime.weekday() numbering)
+
 #
 AMPL_SYSTEM_PROPERTIES = ['version', 
 						  'country', 
@@ -60,11 +248,16 @@ AMPL_SYSTEM_PROPERTIES = ['version',
 						  'userdata_cohort',
 						  'user_id']
 
+#event names and property values may be given percent-encoded (e.g. 'United%20States'), they are decoded once
+#and the url is built by the frozen version of the event, so an event and its freeze() always give the same url
 class amplitudeEvent:
 	
 	def __init__(self, 
 				 eventName):
-		self.eventName = eventName.replace(' ', '%20')
+		self.name = eventName
+		self.eventName = unquote(eventName)
+		#(property type, Amplitude property name, operator, values) and (property type, Amplitude property name),
+		#like in amplitudeFrozenEvent
 		self.filters = []
 		self.groupby = []
 
@@ -78,34 +271,34 @@ class amplitudeEvent:
 		else:
 			propertyName = propertyName.lower() #system props are all lower case
 
-		propertyValues = ['"{0}"'.format(str(val)) for val in propertyValues]
-		propertyValues = ','.join(propertyValues)
-
-		condString = '{{"subprop_type":"{0}","subprop_key":"{1}","subprop_op":"{2}","subprop_value":[{3}]}}'.format(propertyType,
-																													propertyName,
-																													operator,
-																													propertyValues)
-		self.filters += [condString]
+		self.filters += [(propertyType, propertyName, unquote(operator), [unquote(str(val)) for val in propertyValues])]
 
 	def getEventUrl(self):
-		
-		#filters = ','.join(list(set(self.filters)))
-		filters = ','.join(self.filters)
-		#print(filters)
-		if len(filters) > 0:
-			filters = ',"filters":[{0}]'.format(filters)
-		
-		groupby = ','.join(list(self.groupby))
-		if len(groupby) > 0:
-			groupby = ',"group_by":[{0}]'.format(groupby)	
-
-		result = '{{"event_type":"{0}"{1}{2}}}'.format(self.eventName, filters, groupby) 	
-		#print(result)	
-		return result
+		return self.freeze().url
 
 	def resetGroupBy(self):
 		self.groupby = []
 
+	def copy(self):
+		result = amplitudeEvent.__new__(amplitudeEvent)
+		result.name = self.name
+		result.eventName = self.eventName
+		result.filters = list(self.filters)
+		result.groupby = list(self.groupby)
+		return result
+
+	#copy of the event grouped by the given (property type, property name) pairs instead of its own group by
+	def withGroupBy(self, groupProperties):
+		result = self.copy()
+		result.resetGroupBy()
+		for propertyType, propertyName in groupProperties:
+			result.groupBy(propertyType, propertyName)
+		return result
+
+	#immutable, hashable snapshot of the event (see amplitudeFrozenEvent)
+	def freeze(self):
+		return amplitudeFrozenEvent(self.eventName, self.filters, self.groupby)
+
 	def andIs(self, propertyType, propertyName, propertyValues):
 		operator = 'is'
 		self.__addFilter__(propertyType, propertyName, operator, propertyValues)
@@ -159,11 +352,13 @@ class amplitudeEvent:
 		else:
 			propertyName = propertyName.lower() #system props are all lower case
 
-		self.groupby += ['{{"type":"{0}","value":"{1}"}}'.format(propertyType, propertyName)]
+		self.groupby += [(propertyType, propertyName)]
 
+#property values may be given percent-encoded, like those of amplitudeEvent, the url is built by the frozen segment
 class amplitudeSegment:
 
 	def __init__(self):
+		#(Amplitude property name, operator, values), like in amplitudeFrozenSegment
 		self.conditions = []
 
 	def __addProperty__(self, operator, propertyName, propertyValues):
@@ -173,19 +368,15 @@ class amplitudeSegment:
 		else:
 			propertyName = propertyName.lower() #system props are all lower case
 
-		propertyValues = ['"{0}"'.format(str(val)) for val in propertyValues]
-		propertyValues = ','.join(propertyValues)
-		condString = '{{"prop":"{0}","op":"{1}","values":[{2}]}}'.format(propertyName,
-																		 operator,
-																		 propertyValues)
-		self.conditions += [condString]
+		self.conditions += [(propertyName, unquote(operator), [unquote(str(val)) for val in propertyValues])]
 
+	#duplicates are removed and conditions are sorted, so the same segment always gives the same url
 	def getConditionsUrl(self):
-		#removing duplicates
-		#joining into a list-string
-		result = list(set(self.conditions))
-		result = ','.join(result)
-		return '&s=[{0}]'.format(result)
+		return self.freeze().url
+
+	#immutable, hashable snapshot of the segment (see amplitudeFrozenSegment)
+	def freeze(self):
+		return amplitudeFrozenSegment(self.conditions)
 
 	def andIs(self, propertyName, propertyValues):
 		operator = 'is'
@@ -241,64 +432,2661 @@ class amplitudeUserPropertyGroupBy:
 			else:
 				return propertyName.lower() #system props are all lower case
 
+		self.names = list(properties)
 		self.properties = [transformAmplPropetyName(propName) for propName in properties]	
 
+	#duplicates are removed (the order of dimensions is kept), the url is built by the frozen group by
+	def getConditionsUrl(self):
+		return self.freeze().url
+
+	#immutable, hashable snapshot of the group by (see amplitudeFrozenUserPropertyGroupBy)
+	def freeze(self):
+		return amplitudeFrozenUserPropertyGroupBy(self.names)
+
+#Amplitude name of a property: system properties are lower case, user properties get the gp: prefix
+def amplitudePropertyName(propertyName, propertyType = 'user'):
+	if propertyName.lower() in AMPL_SYSTEM_PROPERTIES:
+		return propertyName.lower()
+	if propertyType == 'user':
+		return 'gp:{0}'.format(propertyName)
+	return propertyName
+
+#compact JSON, percent-encoded to be placed in a query string
+def amplitudeUrlValue(value):
+	return quote(json.dumps(value, ensure_ascii = False, separators = (',', ':')), safe = '')
+
+#base of the frozen (immutable and hashable) query objects
+#the url is computed once, when the object is created, and also serves as its identity
+class amplitudeFrozen:
+
+	__slots__ = ('url', 'hash')
+
+	def __setattr__(self, name, value):
+		raise AttributeError('{0} is immutable'.format(type(self).__name__))
+
+	def __delattr__(self, name):
+		raise AttributeError('{0} is immutable'.format(type(self).__name__))
+
+	def __seal__(self, url):
+		object.__setattr__(self, 'url', url)
+		object.__setattr__(self, 'hash', hash((type(self).__name__, url)))
+
+	def __eq__(self, other):
+		return type(self) is type(other) and self.url == other.url
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return self.hash
+
+	def __repr__(self):
+		return '{0}({1})'.format(type(self).__name__, unquote(self.url))
+
+	def freeze(self):
+		return self
+
+#immutable version of amplitudeEvent, the and... and groupBy methods return a new event
+#filters are (property type, Amplitude property name, operator, values); they are deduplicated and sorted,
+#as are the values of every filter, group by dimensions are deduplicated keeping their order
+class amplitudeFrozenEvent(amplitudeFrozen):
+
+	__slots__ = ('eventName', 'filters', 'groupby')
+
+	def __init__(self, eventName, filters = (), groupby = ()):
+		filters = {(str(propertyType), str(propertyName), str(operator), tuple(sorted(set(str(val) for val in values))))
+				   for propertyType, propertyName, operator, values in filters}
+		groupby = tuple(dict.fromkeys((str(propertyType), str(propertyName)) for propertyType, propertyName in groupby))
+
+		#Amplitude doesn't allow more than 2 dimensions
+		if len(groupby) > 2: raise ValueError('Amplitude doesn\'t allow more than 2 group by dimensions')
+
+		object.__setattr__(self, 'eventName', str(eventName))
+		object.__setattr__(self, 'filters', tuple(sorted(filters)))
+		object.__setattr__(self, 'groupby', groupby)
+
+		query = {'event_type': self.eventName}
+		if len(self.filters) > 0:
+			query['filters'] = [{'subprop_type': propertyType, 'subprop_key': propertyName, 'subprop_op': operator, 'subprop_value': list(values)}
+								for propertyType, propertyName, operator, values in self.filters]
+		if len(self.groupby) > 0:
+			query['group_by'] = [{'type': propertyType, 'value': propertyName} for propertyType, propertyName in self.groupby]
+		self.__seal__(amplitudeUrlValue(query))
+
+	def __reduce__(self):
+		return (amplitudeFrozenEvent, (self.eventName, self.filters, self.groupby))
+
+	def getEventUrl(self):
+		return self.url
+
+	def __withFilter__(self, propertyType, propertyName, operator, propertyValues):
+		condition = (propertyType, amplitudePropertyName(propertyName, propertyType), operator, propertyValues)
+		return amplitudeFrozenEvent(self.eventName, self.filters + (condition,), self.groupby)
+
+	def copy(self):
+		return self
+
+	def withGroupBy(self, groupProperties):
+		return amplitudeFrozenEvent(self.eventName, self.filters, 
+									[(propertyType, amplitudePropertyName(propertyName, propertyType)) for propertyType, propertyName in groupProperties])
+
+	def resetGroupBy(self):
+		return amplitudeFrozenEvent(self.eventName, self.filters)
+
+	def groupBy(self, propertyType, propertyName):
+		return amplitudeFrozenEvent(self.eventName, self.filters, self.groupby + ((propertyType, amplitudePropertyName(propertyName, propertyType)),))
+
+	def andIs(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'is', propertyValues)
+
+	def andIsNot(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'is not', propertyValues)
+
+	def andContains(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'contains', propertyValues)
+
+	def andDoesntContain(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'does not contain', propertyValues)
+
+	def andLess(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'less', propertyValues)
+
+	def andLessOrEqual(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'less or equal', propertyValues)
+
+	def andGreater(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'greater', propertyValues)
+
+	def andGreaterOrEqual(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'greater or equal', propertyValues)
+
+	def andSetIs(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'set is', propertyValues)
+
+	def andSetIsNot(self, propertyType, propertyName, propertyValues):
+		return self.__withFilter__(propertyType, propertyName, 'set is not', propertyValues)
+
+#immutable version of amplitudeSegment, the and... methods return a new segment
+#conditions are (Amplitude property name, operator, values), deduplicated and sorted like event filters
+class amplitudeFrozenSegment(amplitudeFrozen):
+
+	__slots__ = ('conditions',)
+
+	def __init__(self, conditions = ()):
+		conditions = {(str(propertyName), str(operator), tuple(sorted(set(str(val) for val in values))))
+					  for propertyName, operator, values in conditions}
+		object.__setattr__(self, 'conditions', tuple(sorted(conditions)))
+		self.__seal__('&s=' + amplitudeUrlValue([{'prop': propertyName, 'op': operator, 'values': list(values)}
+												  for propertyName, operator, values in self.conditions]))
+
+	def __reduce__(self):
+		return (amplitudeFrozenSegment, (self.conditions,))
+
 	def getConditionsUrl(self):
-		#removing duplicates
-		#joining into a list-string
-		result = [''] + list(set(self.properties))
-		return '&g='.join(result)    	
+		return self.url
+
+	def __withProperty__(self, operator, propertyName, propertyValues):
+		return amplitudeFrozenSegment(self.conditions + ((amplitudePropertyName(propertyName), operator, propertyValues),))
+
+	def andIs(self, propertyName, propertyValues):
+		return self.__withProperty__('is', propertyName, propertyValues)
+
+	def andIsNot(self, propertyName, propertyValues):
+		return self.__withProperty__('is not', propertyName, propertyValues)
 
+	def andContains(self, propertyName, propertyValues):
+		return self.__withProperty__('contains', propertyName, propertyValues)
+
+	def andDoesntContain(self, propertyName, propertyValues):
+		return self.__withProperty__('does not contain', propertyName, propertyValues)
+
+	def andLess(self, propertyName, propertyValues):
+		return self.__withProperty__('less', propertyName, propertyValues)
+
+	def andLessOrEqual(self, propertyName, propertyValues):
+		return self.__withProperty__('less or equal', propertyName, propertyValues)
+
+	def andGreater(self, propertyName, propertyValues):
+		return self.__withProperty__('greater', propertyName, propertyValues)
+
+	def andGreaterOrEqual(self, propertyName, propertyValues):
+		return self.__withProperty__('greater or equal', propertyName, propertyValues)
+
+	def andSetIs(self, propertyName, propertyValues):
+		return self.__withProperty__('set is', propertyName, propertyValues)
+
+	def andSetIsNot(self, propertyName, propertyValues):
+		return self.__withProperty__('set is not', propertyName, propertyValues)
+
+#immutable version of amplitudeUserPropertyGroupBy (same property names), dimensions are deduplicated keeping their order
+class amplitudeFrozenUserPropertyGroupBy(amplitudeFrozen):
+
+	__slots__ = ('names', 'properties')
+
+	def __init__(self, properties):
+		names = tuple(dict.fromkeys(str(propName) for propName in properties))
+
+		#Amplitude doesn't allow more than 2 dimensions 
+		if len(names) > 2: raise ValueError('Amplitude doesn\'t allow more than 2 group by dimensions')
+
+		object.__setattr__(self, 'names', names)
+		object.__setattr__(self, 'properties', tuple(dict.fromkeys(amplitudePropertyName(propName) for propName in names)))
+		self.__seal__(''.join('&g=' + quote(propName, safe = '') for propName in self.properties))
+
+	def __reduce__(self):
+		return (amplitudeFrozenUserPropertyGroupBy, (self.names,))
+
+	def getConditionsUrl(self):
+		return self.url
+
+#hashable description of a single-request getter call (see AMPL_REQUEST_BUILDERS), usable as a cache key
+#query is a list of positional or a dict of keyword arguments, like in getMany; arguments are bound to the
+#getter's signature with defaults filled in, events, segments and group bys are frozen, lists become tuples,
+#so equivalent calls give equal specs; key is a sha256 of the canonical JSON form
+class amplitudeRequestSpec:
+
+	__slots__ = ('getterName', 'arguments', 'text', 'key', 'hash')
+
+	def __init__(self, getterName, query = ()):
+		if getterName not in AMPL_REQUEST_BUILDERS:
+			raise ValueError('{0} is not a single-request getter'.format(getterName))
+
+		builder = getattr(amplitudeAPI, AMPL_REQUEST_BUILDERS[getterName])
+		if isinstance(query, dict):
+			bound = inspect.signature(builder).bind(None, **query)
+		else:
+			bound = inspect.signature(builder).bind(None, *query)
+		bound.apply_defaults()
+		arguments = tuple((name, amplitudeRequestSpec.__freeze__(value)) for name, value in list(bound.arguments.items())[1:])
+
+		text = json.dumps([getterName, [[name, amplitudeRequestSpec.__canonical__(value)] for name, value in arguments]],
+						  ensure_ascii = False, separators = (',', ':'), sort_keys = True)
+		object.__setattr__(self, 'getterName', getterName)
+		object.__setattr__(self, 'arguments', arguments)
+		object.__setattr__(self, 'text', text)
+		object.__setattr__(self, 'key', hashlib.sha256(text.encode('utf-8')).hexdigest())
+		object.__setattr__(self, 'hash', hash(text))
+
+	@staticmethod
+	def __freeze__(value):
+		if hasattr(value, 'freeze'): return value.freeze()
+		if isinstance(value, (list, tuple)): return tuple(amplitudeRequestSpec.__freeze__(member) for member in value)
+		if isinstance(value, (set, frozenset)): return frozenset(amplitudeRequestSpec.__freeze__(member) for member in value)
+		if isinstance(value, dict): return tuple(sorted((str(name), amplitudeRequestSpec.__freeze__(member)) for name, member in value.items()))
+		return value
+
+	@staticmethod
+	def __canonical__(value):
+		if isinstance(value, amplitudeFrozen): return {type(value).__name__: value.url}
+		if isinstance(value, tuple): return [amplitudeRequestSpec.__canonical__(member) for member in value]
+		if isinstance(value, frozenset): return sorted((amplitudeRequestSpec.__canonical__(member) for member in value), key = json.dumps)
+		if isinstance(value, datetime): return value.isoformat()
+		if value is None or isinstance(value, (str, bool, int, float)): return value
+		return str(value)
+
+	def __setattr__(self, name, value):
+		raise AttributeError('amplitudeRequestSpec is immutable')
+
+	def __reduce__(self):
+		return (amplitudeRequestSpec, (self.getterName, dict(self.arguments)))
+
+	def __eq__(self, other):
+		return isinstance(other, amplitudeRequestSpec) and self.text == other.text
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return self.hash
+
+	def __repr__(self):
+		return 'amplitudeRequestSpec({0})'.format(self.text)
+
+	#keyword arguments of the getter
+	def kwargs(self):
+		return dict(self.arguments)
+
+	#(url, parser) pair of the request for the given client
+	def request(self, api):
+		return api.__buildRequest__(self.getterName, self.kwargs())
+
+	#runs the getter
+	def call(self, api):
+		return getattr(api, self.getterName)(**self.kwargs())
+
+#a batch of logical getter calls turned into physical requests by amplitudeAPI.planQueries
+#specs are the distinct calls, queries maps every logical query to its spec index, fetches are (url, members) pairs,
+#a member being (spec index, start and finish of a sliced range or None, parser)
+class amplitudeQueryPlan:
+
+	def __init__(self, specs, queries, fetches):
+		self.specs = specs
+		self.queries = queries
+		self.fetches = fetches
+
+	@property
+	def logicalCount(self):
+		return len(self.queries)
+
+	@property
+	def physicalCount(self):
+		return len(self.fetches)
+
+	def report(self):
+		return {'logical': len(self.queries),
+				'unique': len(self.specs),
+				'physical': len(self.fetches),
+				'merged': sum(1 for url, members in self.fetches if any(member[1] is not None for member in members))}
+
+class amplitudeAPIError(Exception):
+
+	def __init__(self, message, url = None, status = None, body = None):
+		Exception.__init__(self, message)
+		self.url = url
+		self.status = status
+		self.body = body
+
+#rate limiter and retry scheduler shared by all requests of an amplitudeAPI instance
+#* token bucket: at most rate requests per second, with bursts of up to burst requests (no limit when rate is None);
+#* at most maxConcurrent requests in flight;
+#* optional budget of query cost (as reported by Amplitude in novaCost), requests fail once it is spent;
+#* exponential backoff with jitter for 429 and 5xx responses and transport errors (timeouts, reset connections, etc.),
+#  throttled responses are retried after their Retry-After when they have one;
+#* throughput and wait time statistics per job (see job())
+class amplitudeScheduler:
+
+	def __init__(self, 
+				 rate = None, 
+				 burst = 1, 
+				 maxConcurrent = AMPL_MAX_IN_FLIGHT, 
+				 costBudget = None, 
+				 maxRetries = AMPL_MAX_RETRIES, 
+				 backoffBase = AMPL_BACKOFF_BASE, 
+				 backoffCap = AMPL_BACKOFF_CAP):
+
+		self.rate = rate
+		self.burst = burst
+		self.maxConcurrent = maxConcurrent
+		self.costBudget = costBudget
+		self.maxRetries = maxRetries
+		self.backoffBase = backoffBase
+		self.backoffCap = backoffCap
+
+		self.lock = threading.Lock()
+		self.tokens = burst
+		self.updated = time.monotonic()
+		self.active = 0
+		self.costSpent = 0
+
+		self.currentJob = contextvars.ContextVar('amplitudeJob', default = 'default')
+		self.jobs = {}
+
+	#all requests issued inside the block (from this thread or asyncio task) are accounted to job name
+	@contextlib.contextmanager
+	def job(self, name):
+		token = self.currentJob.set(name)
+		try:
+			yield self
+		finally:
+			self.currentJob.reset(token)
+
+	def __jobStats__(self):
+		name = self.currentJob.get()
+		if name not in self.jobs:
+			self.jobs[name] = {'requests': 0, 
+							   'retries': 0, 
+							   'throttled': 0, 
+							   'waitTime': 0.0, 
+							   'busyTime': 0.0, 
+							   'cost': 0, 
+							   'firstStart': None, 
+							   'lastFinish': None}
+		return self.jobs[name]
+
+	#takes a query slot and a token if both are available and returns 0,
+	#otherwise returns the number of seconds to wait before trying again
+	def tryAcquire(self):
+		with self.lock:
+			if self.costBudget is not None and self.costSpent >= self.costBudget:
+				raise amplitudeAPIError('query cost budget of {0} is exhausted'.format(self.costBudget))
+			if self.active >= self.maxConcurrent:
+				return AMPL_SCHEDULER_POLL
+			if self.rate is not None:
+				now = time.monotonic()
+				self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+				self.updated = now
+				if self.tokens < 1:
+					return (1 - self.tokens) / self.rate
+				self.tokens -= 1
+			self.active += 1
+
+			stats = self.__jobStats__()
+			if stats['firstStart'] is None:
+				stats['firstStart'] = time.monotonic()
+			return 0
+
+	def acquire(self):
+		queuedAt = time.monotonic()
+		while True:
+			delay = self.tryAcquire()
+			if delay == 0: break
+			time.sleep(delay)
+		self.recordWait(time.monotonic() - queuedAt)
+
+	def release(self, busyTime):
+		with self.lock:
+			self.active -= 1
+			stats = self.__jobStats__()
+			stats['requests'] += 1
+			stats['busyTime'] += busyTime
+			stats['lastFinish'] = time.monotonic()
+
+	def recordWait(self, waitTime):
+		with self.lock:
+			self.__jobStats__()['waitTime'] += waitTime
+
+	def recordCost(self, cost):
+		with self.lock:
+			self.costSpent += cost
+			self.__jobStats__()['cost'] += cost
+
+	#seconds to wait before retrying a request which ended with status (None for a transport error) and,
+	#for throttled requests, retryAfter seconds of the Retry-After header (0 or None without one), None if it shouldn't be retried
+	def retryDelay(self, attempt, status, retryAfter = None):
+		if status is not None and status != 429 and status < 500: return None
+		if attempt >= self.maxRetries: return None
+
+		delay = min(self.backoffCap, self.backoffBase * 2 ** attempt)
+		with self.lock:
+			stats = self.__jobStats__()
+			stats['retries'] += 1
+			if status == 429:
+				stats['throttled'] += 1
+		if status == 429 and retryAfter:
+			return retryAfter
+		return random.uniform(delay / 2, delay)
+
+	def stats(self):
+		with self.lock:
+			result = {}
+			for name, stats in self.jobs.items():
+				stats = dict(stats)
+				elapsed = 0
+				if stats['firstStart'] is not None and stats['lastFinish'] is not None:
+					elapsed = stats['lastFinish'] - stats['firstStart']
+				stats['throughput'] = stats['requests'] / elapsed if elapsed > 0 else None  #requests per second
+				stats['avgWaitTime'] = stats['waitTime'] / stats['requests'] if stats['requests'] > 0 else None
+				del stats['firstStart'], stats['lastFinish']
+				result[name] = stats
+			return result
+
+#measurements of the requests and getter calls of an amplitudeAPI instance
+#every measurement is a dict passed to the listeners (callables taking kind and measurement) and added to the totals
+#reported by stats() and prometheus():
+#* 'request' - a finished request: getter, url, endpoint, status, bytes (received, as counted by curl), bodyBytes (decoded),
+#  cost (novaCost), decode (seconds spent in JSON decoding), result (the decoded response, listeners shouldn't keep it),
+#  the curl timings of AMPL_METRICS_TIMINGS, cached and shared (responses read from the cache or shared with a concurrent
+#  request of the same url, see amplitudeSingleFlight, are cached and have no timings);
+#  retried and failed requests are reported too, without decode and result;
+#* 'getter' - a finished getter call: getter, duration, decode and build (seconds spent building the result from decoded responses),
+#  requests and error (the exception type name, None for successful calls);
+#* 'invalid' - a response which isn't a JSON: url and body
+#requests are accounted to the outermost getter call of the thread or asyncio task (see getter()),
+#requests issued outside of any getter call have an empty getter
+class amplitudeMetrics:
+
+	def __init__(self, listeners = (), buckets = AMPL_METRICS_BUCKETS):
+		self.listeners = list(listeners)
+		self.buckets = tuple(sorted(buckets))
+
+		self.lock = threading.Lock()
+		self.requests = {}
+		self.getters = {}
+		self.currentCall = contextvars.ContextVar('amplitudeGetterCall', default = None)
+
+	def addListener(self, listener):
+		self.listeners += [listener]
+
+	def removeListener(self, listener):
+		self.listeners.remove(listener)
+
+	#accounts the block to a call of getter name, unless it's already a part of another getter call
+	@contextlib.contextmanager
+	def getter(self, name):
+		if self.currentCall.get() is not None:
+			yield self
+			return
+
+		call = {'getter': name, 'decode': 0.0, 'build': 0.0, 'requests': 0}
+		token = self.currentCall.set(call)
+		started = time.perf_counter()
+		error = None
+		try:
+			yield self
+		except BaseException as e:
+			error = type(e).__name__
+			raise
+		finally:
+			self.currentCall.reset(token)
+			self.record('getter', dict(call, duration = time.perf_counter() - started, error = error))
+
+	#iterates over items (a generator) as a call of getter name; the steps of the generator run in a context of their own,
+	#so the call doesn't leak into the caller's context while the generator is suspended
+	def stream(self, name, items):
+		context = contextvars.copy_context()
+		call = self.getter(name)
+		context.run(call.__enter__)
+		error = None
+		try:
+			while True:
+				try:
+					item = context.run(next, items)
+				except StopIteration:
+					return
+				yield item
+		except GeneratorExit:
+			raise
+		except BaseException as e:
+			error = e
+			raise
+		finally:
+			context.run(items.close)
+			context.run(call.__exit__, type(error) if error is not None else None, error, error.__traceback__ if error is not None else None)
+
+	#returns parse(*args), the time it takes is accounted to the current getter call as building time
+	def build(self, parse, *args):
+		started = time.perf_counter()
+		result = parse(*args)
+		call = self.currentCall.get()
+		if call is not None:
+			with self.lock:
+				call['build'] += time.perf_counter() - started
+		return result
+
+	def record(self, kind, measurement):
+		if kind == 'request':
+			call = self.currentCall.get()
+			measurement['getter'] = call['getter'] if call is not None else ''
+		with self.lock:
+			if kind == 'request':
+				self.__addRequest__(measurement, call)
+			elif kind == 'getter':
+				self.__addGetter__(measurement)
+		for listener in self.listeners:
+			listener(kind, measurement)
+		if AMPL_API_DEBUG_MODE:
+			amplitudeDebugListener(kind, measurement)
+
+	def __addRequest__(self, measurement, call):
+		key = (measurement['getter'], measurement['endpoint'], measurement['status'], measurement['cached'])
+		if key not in self.requests:
+			self.requests[key] = {'count': 0,
+								  'bytes': 0,
+								  'bodyBytes': 0,
+								  'cost': 0,
+								  'decode': 0.0,
+								  'timings': {name: 0.0 for name, info in AMPL_METRICS_TIMINGS},
+								  'timed': 0,
+								  'buckets': [0] * len(self.buckets)}
+		totals = self.requests[key]
+		totals['count'] += 1
+		totals['bytes'] += measurement.get('bytes') or 0
+		totals['bodyBytes'] += measurement['bodyBytes'] or 0
+		totals['cost'] += measurement['cost'] or 0
+		totals['decode'] += measurement['decode'] or 0
+		for name, info in AMPL_METRICS_TIMINGS:
+			totals['timings'][name] += measurement.get(name) or 0
+		if measurement.get('total') is not None:
+			totals['timed'] += 1
+			for index, bound in enumerate(self.buckets):
+				if measurement['total'] <= bound:
+					totals['buckets'][index] += 1
+
+		if call is not None:
+			call['decode'] += measurement['decode'] or 0
+			call['requests'] += 1
+
+	def __addGetter__(self, measurement):
+		name = measurement['getter']
+		if name not in self.getters:
+			self.getters[name] = {'calls': 0, 'errors': 0, 'requests': 0, 'duration': 0.0, 'decode': 0.0, 'build': 0.0}
+		totals = self.getters[name]
+		totals['calls'] += 1
+		totals['errors'] += measurement['error'] is not None
+		for field in ['requests', 'duration', 'decode', 'build']:
+			totals[field] += measurement[field]
+
+	#totals per (getter, endpoint, status, cached) of requests and per getter of getter calls
+	def stats(self):
+		with self.lock:
+			requests = pd.DataFrame([dict(zip(['getter', 'endpoint', 'status', 'cached'], key),
+										  count = totals['count'],
+										  bytes = totals['bytes'],
+										  bodyBytes = totals['bodyBytes'],
+										  cost = totals['cost'],
+										  decode = totals['decode'],
+										  **totals['timings']) for key, totals in self.requests.items()],
+									columns = ['getter', 'endpoint', 'status', 'cached', 'count', 'bytes', 'bodyBytes', 'cost', 'decode'] + [name for name, info in AMPL_METRICS_TIMINGS])
+			getters = pd.DataFrame([dict(totals, getter = name) for name, totals in self.getters.items()],
+								   columns = ['getter', 'calls', 'errors', 'requests', 'duration', 'decode', 'build'])
+		return {'requests': requests, 'getters': getters}
+
+	#the totals in Prometheus text exposition format, metric names start with prefix
+	def prometheus(self, prefix = 'amplitude'):
+
+		def text(value):
+			if value is None: return ''
+			if isinstance(value, bool): return 'true' if value else 'false'
+			return str(value)
+
+		def labels(**values):
+			return '{' + ','.join('{0}="{1}"'.format(name, text(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) 
+								  for name, value in values.items()) + '}'
+
+		lines = []
+		def family(name, kind, description, samples):
+			lines.extend(['# HELP {0}_{1} {2}'.format(prefix, name, description), '# TYPE {0}_{1} {2}'.format(prefix, name, kind)])
+			lines.extend('{0}_{1}{2} {3}'.format(prefix, sampleName, sampleLabels, repr(float(value)) if isinstance(value, float) else value) 
+						 for sampleName, sampleLabels, value in samples)
+
+		with self.lock:
+			requests = [(dict(zip(['getter', 'endpoint', 'status', 'cached'], key)), totals) for key, totals in sorted(self.requests.items(), key = repr)]
+			getters = sorted(self.getters.items())
+
+			family('requests_total', 'counter', 'Requests sent to the API or read from the cache', 
+				   [('requests_total', labels(**key), totals['count']) for key, totals in requests])
+			family('response_bytes_total', 'counter', 'Bytes received', 
+				   [('response_bytes_total', labels(**key), totals['bytes']) for key, totals in requests])
+			family('query_cost_total', 'counter', 'Query cost reported by the API (novaCost)', 
+				   [('query_cost_total', labels(**key), totals['cost']) for key, totals in requests])
+			family('decode_seconds_total', 'counter', 'Time spent decoding JSON responses', 
+				   [('decode_seconds_total', labels(**key), totals['decode']) for key, totals in requests])
+			family('transfer_seconds_total', 'counter', 'Curl transfer timings, seconds since the start of the transfer summed over requests', 
+				   [('transfer_seconds_total', labels(phase = name, **key), totals['timings'][name]) 
+					for key, totals in requests if not key['cached'] for name, info in AMPL_METRICS_TIMINGS])
+
+			samples = []
+			for key, totals in requests:
+				if key['cached']: continue
+				samples += [('request_duration_seconds_bucket', labels(**key, le = bound), count) for bound, count in zip(self.buckets, totals['buckets'])]
+				samples += [('request_duration_seconds_bucket', labels(**key, le = '+Inf'), totals['timed']),
+							('request_duration_seconds_sum', labels(**key), totals['timings']['total']),
+							('request_duration_seconds_count', labels(**key), totals['timed'])]
+			family('request_duration_seconds', 'histogram', 'Duration of requests', samples)
+
+			family('getter_calls_total', 'counter', 'Getter calls', 
+				   [('getter_calls_total', labels(getter = name), totals['calls']) for name, totals in getters])
+			family('getter_errors_total', 'counter', 'Getter calls ended with an exception', 
+				   [('getter_errors_total', labels(getter = name), totals['errors']) for name, totals in getters])
+			for field, description in [('duration', 'Time spent in getter calls'), 
+									   ('decode', 'Time getter calls spent decoding JSON responses'), 
+									   ('build', 'Time getter calls spent building results from decoded responses')]:
+				family('getter_{0}_seconds_total'.format(field), 'counter', description, 
+					   [('getter_{0}_seconds_total'.format(field), labels(getter = name), totals[field]) for name, totals in getters])
+
+		return '\n'.join(lines) + '\n'
+
+#listener printing every measurement, used by every amplitudeMetrics while AMPL_API_DEBUG_MODE is True
+def amplitudeDebugListener(kind, measurement):
+	if kind == 'request':
+		print(measurement['url'])
+		print(measurement['result'] if measurement.get('result') is not None else 
+			  'HTTP {0}, {1} bytes'.format(measurement['status'], measurement['bodyBytes']))
+	elif kind == 'getter':
+		print('{getter}: {duration:.3f}s, {requests} requests, decode {decode:.3f}s, build {build:.3f}s'.format(**measurement))
+	elif kind == 'invalid':
+		print('Body is not a json')
+		print(measurement['url'])
+		print(measurement['body'])
+
+#a call shared by concurrent callers asking for the same thing, see amplitudeSingleFlight
+class amplitudeFlight:
+
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+		self.followers = 0
+
+#single-flight coalescing: while a call for a key is running, callers asking for the same key
+#wait for it and get its result (or its exception) instead of running the call again
+#the first caller (leader) runs the call and finishes the flight, the others (followers) wait for it
+class amplitudeSingleFlight:
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.flights = {}
+		self.leaders = 0
+		self.followers = 0
+
+	#returns (flight, True) if the caller leads a new flight, (flight, False) if it joined a running one
+	def begin(self, key):
+		with self.lock:
+			flight = self.flights.get(key)
+			if flight is None:
+				flight = self.flights[key] = amplitudeFlight()
+				self.leaders += 1
+				return flight, True
+			flight.followers += 1
+			self.followers += 1
+			return flight, False
+
+	def finish(self, key, flight, result = None, error = None):
+		flight.result = result
+		flight.error = error
+		with self.lock:
+			if self.flights.get(key) is flight:
+				del self.flights[key]
+		flight.done.set()
+
+	def wait(self, flight):
+		flight.done.wait()
+		if flight.error is not None:
+			raise flight.error
+		return flight.result
+
+	#returns (result, leader), function is only called by the leader
+	def run(self, key, function):
+		flight, leader = self.begin(key)
+		if not leader:
+			return self.wait(flight), False
+		try:
+			result = function()
+		except BaseException as error:
+			self.finish(key, flight, error = error)
+			raise
+		self.finish(key, flight, result)
+		return result, True
+
+	def stats(self):
+		with self.lock:
+			return {'leaders': self.leaders, 'followers': self.followers, 'inFlight': len(self.flights)}
+
+#a pool of reusable curl handles
+#all handles share DNS cache, TLS sessions and (where libcurl supports it) open connections,
+#so consecutive queries skip DNS lookups as well as TCP and TLS handshakes
+class amplitudeConnectionPool:
+
+	def __init__(self, 
+				 apiKey, 
+				 secretKey, 
+				 poolSize = AMPL_POOL_SIZE, 
+				 connectTimeout = AMPL_CONNECT_TIMEOUT, 
+				 timeout = AMPL_TIMEOUT):
+
+		self.userPwd = '{0}:{1}'.format(apiKey, secretKey)
+		self.poolSize = poolSize
+		self.connectTimeout = connectTimeout
+		self.timeout = timeout
+
+		#LIFO, so the most recently used (and most likely still connected) handle is reused first
+		self.idle = queue.LifoQueue(maxsize = poolSize)
+
+		#created with the first handle, so clients which never go to the network don't load pycurl
+		self.share = None
+		self.shareLock = threading.Lock()
+
+	def __newShare__(self):
+		share = pycurl.CurlShare()
+		share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+		share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+		if hasattr(pycurl, 'LOCK_DATA_CONNECT'): #libcurl 7.57+
+			share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+		return share
+
+	def __newHandle__(self):
+		with self.shareLock:
+			if self.share is None:
+				self.share = self.__newShare__()
+		c = pycurl.Curl()
+		c.setopt(pycurl.SHARE, self.share)
+		c.setopt(pycurl.USERPWD, self.userPwd)
+		c.setopt(pycurl.ENCODING, '')            #empty string asks for every encoding libcurl supports (gzip, deflate, ...)
+		c.setopt(pycurl.TCP_KEEPALIVE, 1)
+		c.setopt(pycurl.NOSIGNAL, 1)             #timeouts must not rely on signals when handles are used from threads
+		c.setopt(pycurl.CONNECTTIMEOUT, self.connectTimeout)
+		c.setopt(pycurl.TIMEOUT, self.timeout)
+		try:
+			c.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+		except (AttributeError, pycurl.error):
+			pass                                 #libcurl without HTTP/2 support, staying on HTTP/1.1 keep-alive
+		return c
+
+	def acquire(self):
+		try:
+			return self.idle.get_nowait()
+		except queue.Empty:
+			return self.__newHandle__()
+
+	#curl timings, the number of received bytes and the Retry-After seconds (0 without the header) of a finished transfer of c
+	@staticmethod
+	def transferInfo(c):
+		transfer = {name: c.getinfo(getattr(pycurl, info)) for name, info in AMPL_METRICS_TIMINGS}
+		transfer['bytes'] = c.getinfo(pycurl.SIZE_DOWNLOAD_T)
+		transfer['retryAfter'] = c.getinfo(pycurl.RETRY_AFTER)
+		return transfer
+
+	def release(self, c):
+		try:
+			self.idle.put_nowait(c)
+		except queue.Full:
+			c.close()
+
+	#a handle whose transfer failed or was aborted may be left in any state, so it is closed instead of being reused
+	def discard(self, c):
+		c.close()
+
+	def close(self):
+		while True:
+			try:
+				self.idle.get_nowait().close()
+			except queue.Empty:
+				break
+
+#persistent on-disk cache of raw API responses
+#entries are keyed by the canonical request (api key, endpoint and sorted query parameters) and stored zlib-compressed
+#responses whose end date is older than settleDays never expire, while recent or incomplete data lives for ttl seconds
+class amplitudeResponseCache:
+
+	#responses flagging some of their cells as not final
+	incompletePattern = re.compile(rb'"completed"\s*:\s*false|"incomplete"\s*:\s*true')
+	#LTV responses flag every age of every cohort in complete and of the combined row in combined_complete
+	completenessPattern = re.compile(rb'"(?:combined_)?complete"\s*:')
+
+	def __init__(self, 
+				 directory, 
+				 maxBytes = AMPL_CACHE_MAX_BYTES, 
+				 settleDays = AMPL_CACHE_SETTLE_DAYS, 
+				 ttl = AMPL_CACHE_TTL):
+
+		self.directory = directory
+		self.maxBytes = maxBytes
+		self.settleDays = settleDays
+		self.ttl = ttl
+		self.lock = threading.Lock()
+
+		self.hits = 0
+		self.misses = 0
+		self.bytesSaved = 0
+		self.evictions = 0
+
+		os.makedirs(directory, exist_ok = True)
+		self.sizes = {}
+		for name in os.listdir(directory):
+			if name.endswith('.z'):
+				self.sizes[name] = os.path.getsize(os.path.join(directory, name))
+		self.totalBytes = sum(self.sizes.values())
+
+	def key(self, url, apiKey = ''):
+		parts = urlsplit(url)
+		#stable sort keeps the order of repeated parameters (e.g. funnel steps)
+		params = sorted(parse_qsl(parts.query, keep_blank_values = True), key = lambda param: param[0])
+		canonical = '{0}|{1}{2}?{3}'.format(apiKey, 
+											parts.netloc.lower(), 
+											parts.path, 
+											'&'.join('{0}={1}'.format(name, value) for name, value in params))
+		return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+	def __expiry__(self, url, body):
+		end = dict(parse_qsl(urlsplit(url).query)).get('end', '')
+		try:
+			end = datetime.strptime(end[:8], '%Y%m%d')
+		except ValueError:
+			return time.time() + self.ttl
+
+		if end.date() > datetime.now().date() - timedelta(days = self.settleDays):
+			return time.time() + self.ttl
+		if self.__incomplete__(body):
+			return time.time() + self.ttl
+		return None
+
+	def __incomplete__(self, body):
+		if self.incompletePattern.search(body) is not None: return True
+		if self.completenessPattern.search(body) is None: return False
+		try:
+			for current in json.loads(body)['data']['series']:
+				flags = list(current.get('combined_complete', {}).values())
+				for ages in current.get('complete', {}).values():
+					flags += list(ages.values())
+				if not all(flags): return True
+		except (ValueError, KeyError, TypeError, AttributeError):
+			return True
+		return False
+
+	def get(self, key):
+		path = os.path.join(self.directory, key + '.z')
+		try:
+			with open(path, 'rb') as f:
+				header = f.readline()
+				data = f.read()
+		except OSError:
+			with self.lock:
+				self.misses += 1
+			return None
+
+		#corrupt entries (e.g. cut short by a full disk) are dropped like expired ones
+		try:
+			expires = json.loads(header)['expires']
+			expired = expires is not None and expires < time.time()
+			body = None if expired else zlib.decompress(data)
+		except (ValueError, KeyError, TypeError, zlib.error):
+			expired = True
+		if expired:
+			self.__remove__(key + '.z')
+			with self.lock:
+				self.misses += 1
+			return None
+
+		try:
+			os.utime(path) #marking as recently used
+		except OSError:
+			pass
+
+		with self.lock:
+			self.hits += 1
+			self.bytesSaved += len(body)
+		return body
+
+	def put(self, key, url, body):
+		name = key + '.z'
+		path = os.path.join(self.directory, name)
+		header = json.dumps({'url': url, 'expires': self.__expiry__(url, body), 'size': len(body)}).encode('utf-8')
+
+		temporaryPath = '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.get_ident())
+		with open(temporaryPath, 'wb') as f:
+			f.write(header + b'\n')
+			f.write(zlib.compress(body))
+		os.replace(temporaryPath, path)
+
+		with self.lock:
+			self.totalBytes += os.path.getsize(path) - self.sizes.get(name, 0)
+			self.sizes[name] = os.path.getsize(path)
+		if self.totalBytes > self.maxBytes:
+			self.__evict__()
+
+	def __remove__(self, name):
+		try:
+			os.remove(os.path.join(self.directory, name))
+		except OSError:
+			pass
+		with self.lock:
+			self.totalBytes -= self.sizes.pop(name, 0)
+
+	def __evict__(self):
+		def lastUsed(name):
+			try:
+				return os.path.getmtime(os.path.join(self.directory, name))
+			except OSError:
+				return 0
+
+		with self.lock:
+			names = sorted(self.sizes, key = lastUsed)
+		for name in names:
+			if self.totalBytes <= self.maxBytes: break
+			self.__remove__(name)
+			with self.lock:
+				self.evictions += 1
+
+	def clear(self):
+		with self.lock:
+			names = list(self.sizes)
+		for name in names:
+			self.__remove__(name)
+
+	def stats(self):
+		with self.lock:
+			return {'hits': self.hits,
+					'misses': self.misses,
+					'bytesSaved': self.bytesSaved,
+					'evictions': self.evictions,
+					'entries': len(self.sizes),
+					'bytesOnDisk': self.totalBytes}
+
+#bounded in-memory LRU cache of getter results (data frames, tuples and lists of them and decoded responses)
+#entries expire ttl seconds after they are stored, the least recently used ones are evicted once the results
+#take more than maxBytes (memory of data frames, size of the JSON of decoded responses)
+#every get returns a copy, so callers can change their results without changing the cached ones
+class amplitudeResultCache:
+
+	def __init__(self, maxBytes = AMPL_RESULT_CACHE_MAX_BYTES, ttl = AMPL_RESULT_CACHE_TTL):
+		self.maxBytes = maxBytes
+		self.ttl = ttl
+		self.lock = threading.Lock()
+		self.entries = collections.OrderedDict()   #key -> (result, size, expires), least recently used first
+		self.totalBytes = 0
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+
+	#memory taken by a result, None for results which can't be cached
+	@staticmethod
+	def size(result):
+		if isinstance(result, dict):
+			return len(json.dumps(result, default = str))
+		if isinstance(result, (tuple, list)):
+			sizes = [amplitudeResultCache.size(member) for member in result]
+			return None if None in sizes else sum(sizes)
+		if hasattr(result, 'memory_usage'):
+			return int(result.memory_usage(deep = True).sum())
+		return None
+
+	@staticmethod
+	def copy(result):
+		if isinstance(result, dict):
+			return copy.deepcopy(result)
+		if isinstance(result, tuple):
+			return tuple(amplitudeResultCache.copy(member) for member in result)
+		if isinstance(result, list):
+			return [amplitudeResultCache.copy(member) for member in result]
+		if hasattr(result, 'memory_usage'):
+			return result.copy()
+		return result
+
+	def get(self, key):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None and entry[2] < time.monotonic():
+				self.__remove__(key)
+				self.expirations += 1
+				entry = None
+			if entry is None:
+				self.misses += 1
+				return None
+			self.entries.move_to_end(key)
+			self.hits += 1
+		return self.copy(entry[0])
+
+	#stores a copy of result, results which can't be cached or are larger than maxBytes are skipped
+	def put(self, key, result):
+		size = self.size(result)
+		if size is None or size > self.maxBytes: return
+		result = self.copy(result)
+		with self.lock:
+			if key in self.entries:
+				self.__remove__(key)
+			self.entries[key] = (result, size, time.monotonic() + self.ttl)
+			self.totalBytes += size
+			while self.totalBytes > self.maxBytes:
+				self.__remove__(next(iter(self.entries)))
+				self.evictions += 1
+
+	def __remove__(self, key):
+		result, size, expires = self.entries.pop(key)
+		self.totalBytes -= size
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.totalBytes = 0
+
+	def stats(self):
+		with self.lock:
+			return {'hits': self.hits,
+					'misses': self.misses,
+					'evictions': self.evictions,
+					'expirations': self.expirations,
+					'entries': len(self.entries),
+					'bytes': self.totalBytes}
+
+#local store of long-format (Segment, x, y) segmentation series, used for incremental fetching
+#every (event, segment, groupBy, metric, formula, frequency) bucket of a project (api key) is kept in a separate pickle
+#together with the covered date range and the last date which was already final when it was fetched
+class amplitudeSegmentationStore:
+
+	def __init__(self, directory):
+		self.directory = directory
+		os.makedirs(directory, exist_ok = True)
+
+	def key(self, event, segment, groupBy, metric, formula, frequency, apiKey = ''):
+		parts = [apiKey,
+				 event.getEventUrl(),
+				 segment.getConditionsUrl() if segment is not None else '',
+				 groupBy.getConditionsUrl() if groupBy is not None else '',
+				 str(metric),
+				 str(formula) if metric == AMPL_METRIC_FORMULA else '',
+				 str(frequency)]
+		return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+	def load(self, key):
+		path = os.path.join(self.directory, key + '.pkl')
+		if not os.path.exists(path): return None
+		return pd.read_pickle(path)
+
+	def save(self, key, entry):
+		path = os.path.join(self.directory, key + '.pkl')
+		temporaryPath = '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.get_ident())
+		pd.to_pickle(entry, temporaryPath)
+		os.replace(temporaryPath, path)
+
+	def remove(self, key):
+		try:
+			os.remove(os.path.join(self.directory, key + '.pkl'))
+		except OSError:
+			pass
+
+#writes data frames into numbered part files, one subdirectory per table (e.g. events/part-00000.parquet)
+#rows are buffered up to rowsPerFile, so memory use doesn't grow with the amount of exported data
+#non-string values of object columns (event properties, user data, etc.) are written as JSON strings
+class amplitudeFileSink:
+
+	def __init__(self, directory, fileFormat = 'parquet', rowsPerFile = 100000):
+		if fileFormat not in ('parquet', 'csv'):
+			raise ValueError('Unsupported file format {0}, use parquet or csv'.format(fileFormat))
+		self.directory = directory
+		self.fileFormat = fileFormat
+		self.rowsPerFile = rowsPerFile
+		self.buffers = {}
+		self.rows = {}
+		self.parts = {}
+		self.lock = threading.Lock()
+
+	def write(self, table, frame):
+		with self.lock:
+			self.buffers.setdefault(table, []).append(frame)
+			self.rows[table] = self.rows.get(table, 0) + len(frame)
+			if self.rows[table] >= self.rowsPerFile:
+				self.__flush__(table)
+
+	@staticmethod
+	def __jsonValue__(value):
+		if value is None or isinstance(value, str): return value
+		if isinstance(value, float) and math.isnan(value): return value
+		return json.dumps(value, default = str)
+
+	def __flush__(self, table):
+		frames = self.buffers.pop(table, [])
+		self.rows[table] = 0
+		if not frames: return
+
+		#part files get the same wide types whatever the in-memory frames were downcast to,
+		#so they can be read back together (the file formats encode small values compactly anyway)
+		frame = pd.concat(frames, ignore_index = True)
+		for column in frame.columns:
+			values = frame[column]
+			if isinstance(values.dtype, pd.CategoricalDtype):
+				values = values.astype(values.cat.categories.dtype)
+			if pd.api.types.is_bool_dtype(values):
+				pass
+			elif pd.api.types.is_integer_dtype(values):
+				values = values.astype(np.int64)
+			elif pd.api.types.is_float_dtype(values):
+				values = values.astype(np.float64)
+			elif pd.api.types.is_object_dtype(values):
+				values = values.map(self.__jsonValue__)
+			frame[column] = values
+
+		part = self.parts.get(table, 0)
+		self.parts[table] = part + 1
+		os.makedirs(os.path.join(self.directory, table), exist_ok = True)
+		path = os.path.join(self.directory, table, 'part-{0:05d}.{1}'.format(part, self.fileFormat))
+		if self.fileFormat == 'parquet':
+			frame.to_parquet(path, index = False)
+		else:
+			frame.to_csv(path, index = False)
+
+	def close(self):
+		with self.lock:
+			for table in list(self.buffers):
+				self.__flush__(table)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+#parquet dataset with a directory per partition (e.g. date=2019-05-01/part-00000.parquet)
+#every written batch is appended to the partition's file as a separate row group, so nothing is held in memory
+#beyond a single batch; files of earlier runs are kept, new ones get the next free part number
+class amplitudeParquetSink:
+
+	def __init__(self, directory):
+		self.directory = directory
+		self.writers = {}
+		self.lock = threading.Lock()
+
+	#table is a pyarrow Table or RecordBatch, all batches of a partition must share the same schema
+	def write(self, partition, table):
+		import pyarrow.parquet as pq
+
+		with self.lock:
+			writer = self.writers.get(partition)
+			if writer is None:
+				directory = os.path.join(self.directory, partition)
+				os.makedirs(directory, exist_ok = True)
+				part = 0
+				while os.path.exists(os.path.join(directory, 'part-{0:05d}.parquet'.format(part))):
+					part += 1
+				writer = pq.ParquetWriter(os.path.join(directory, 'part-{0:05d}.parquet'.format(part)), table.schema)
+				self.writers[partition] = writer
+			if hasattr(table, 'to_batches'):
+				writer.write_table(table)
+			else:
+				writer.write_batch(table)
+
+	def close(self):
+		with self.lock:
+			for writer in self.writers.values():
+				writer.close()
+			self.writers = {}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+#incremental reader of a single array inside a JSON response, e.g. the events of a user activity response or
+#the series of a segmentation response, given by path - the list of keys leading to it (an empty path is a top-level array)
+#chunks of the body are fed as they arrive and every array item is returned as soon as it is complete,
+#so only the current item and the unparsed tail of the body are held in memory
+#other values met on the way (e.g. novaCost or seriesLabels) are kept in the values dictionary
+class amplitudeJSONArrayReader:
+
+	whitespace = re.compile(r'[ \t\n\r]*')
+
+	def __init__(self, path):
+		self.path = list(path)
+		self.decoder = json.JSONDecoder()
+		self.textDecoder = codecs.getincrementaldecoder('utf-8')()
+		self.values = {}
+
+		self.buffer = ''
+		self.position = 0
+		self.pending = []
+		self.pendingLength = 0
+		self.retryLength = 0        #unparsed length at which an incomplete value is decoded again
+
+		self.state = 'object' if self.path else 'array'
+		self.depth = 0              #number of objects along the path entered so far
+		self.key = None
+		self.found = False
+		self.finished = False
+
+	def feed(self, chunk):
+		text = self.textDecoder.decode(chunk)
+		self.pending += [text]
+		self.pendingLength += len(text)
+		#decoding a large value is only retried once its unparsed text has doubled, which keeps reading linear
+		if len(self.buffer) - self.position + self.pendingLength < self.retryLength: return []
+		return self.__parse__()
+
+	#parses the rest of the body, raises ValueError if the response ends prematurely or has no array at path
+	def finish(self):
+		self.pending += [self.textDecoder.decode(b'', final = True)]
+		self.finished = True
+		items = self.__parse__()
+		if self.state != 'end':
+			raise ValueError('Unexpected end of the response')
+		if not self.found:
+			raise ValueError('No array at {0} in the response'.format(self.path))
+		return items
+
+	#skips whitespace and returns the next character, None if more data is needed
+	def __peek__(self):
+		self.position = self.whitespace.match(self.buffer, self.position).end()
+		if self.position < len(self.buffer): return self.buffer[self.position]
+		if self.finished: raise ValueError('Unexpected end of the response')
+		return None
+
+	#decodes the value at the current position into self.value, returns False if it isn't complete yet
+	def __value__(self):
+		try:
+			value, end = self.decoder.raw_decode(self.buffer, self.position)
+		except json.JSONDecodeError:
+			if self.finished: raise
+			self.retryLength = 2 * (len(self.buffer) - self.position)
+			return False
+		#a number at the very end of the received data may continue in the next chunk
+		if end == len(self.buffer) and not self.finished and isinstance(value, (int, float)):
+			return False
+		self.value = value
+		self.position = end
+		self.retryLength = 0
+		return True
+
+	def __expect__(self, char, expected):
+		if char != expected:
+			raise ValueError('Expected {0} at {1} of the response, got {2}'.format(expected, self.path[:self.depth], char))
+		self.position += 1
+
+	def __parse__(self):
+		if self.pending:
+			self.buffer = self.buffer[self.position:] + ''.join(self.pending)
+			self.position = 0
+			self.pending = []
+			self.pendingLength = 0
+
+		items = []
+		while self.state != 'end':
+			char = self.__peek__()
+			if char is None: break
+
+			if self.state == 'object':
+				self.__expect__(char, '{')
+				self.depth += 1
+				self.state = 'key'
+
+			elif self.state == 'array':
+				self.__expect__(char, '[')
+				self.state = 'item'
+
+			elif self.state == 'key':
+				if char == ',':
+					self.position += 1
+				elif char == '}':
+					self.position += 1
+					self.depth -= 1
+					self.state = 'key' if self.depth > 0 else 'end'
+				else:
+					if not self.__value__(): break
+					self.key = self.value
+					self.state = 'colon'
+
+			elif self.state == 'colon':
+				self.__expect__(char, ':')
+				if not self.found and self.key == self.path[self.depth - 1]:
+					self.state = 'array' if self.depth == len(self.path) else 'object'
+				else:
+					self.state = 'value'
+
+			elif self.state == 'value':
+				if not self.__value__(): break
+				self.values[self.key] = self.value
+				self.state = 'key'
+
+			elif self.state == 'item':
+				if char == ',':
+					self.position += 1
+				elif char == ']':
+					self.position += 1
+					self.found = True
+					self.state = 'key' if self.depth > 0 else 'end'
+				else:
+					if not self.__value__(): break
+					items += [self.value]
+
+		return items
+
+#columnar view of a getLTV response
+#the rNd / rNnew keys of every series are decoded once into an age index and each series is read into days x ages
+#matrices, so the long-format frames are assembled from NumPy columns aligned by position instead of joins;
+#all tables are built on first access only
+class amplitudeLTVResult:
+
+	keyPattern = re.compile(r'^r(\d+)(d|new)$')
+
+	def __init__(self, result):
+		self.labels = result['data']['seriesLabels']
+		self.series = result['data']['series']
+		self.tables = {}
+		self.convert = None         #optional function applied to every table once it's built
+
+	def __store__(self, name, frame):
+		self.tables[name] = frame if self.convert is None else self.convert(frame)
+
+	@property
+	def byDayCumulativeSpendPerUser(self):
+		if 'spend' not in self.tables: self.__buildByDay__()
+		return self.tables['spend']
+
+	@property
+	def byDayConversions(self):
+		if 'conversions' not in self.tables: self.__buildByDay__()
+		return self.tables['conversions']
+
+	@property
+	def combinedSpendPerUser(self):
+		if 'combinedSpend' not in self.tables: self.__buildCombined__()
+		return self.tables['combinedSpend']
+
+	@property
+	def combinedTotals(self):
+		if 'combinedTotals' not in self.tables:
+			combinedTotals = pd.DataFrame([[label, current['combined']['paid']] for label, current in zip(self.labels, self.series)], 
+										  columns = ['segment', 'payers']).set_index('segment')
+			self.__store__('combinedTotals', combinedTotals)
+		return self.tables['combinedTotals']
+
+	@property
+	def combinedCompleteFlag(self):
+		if 'combinedComplete' not in self.tables: self.__buildCombined__()
+		return self.tables['combinedComplete']
+
+	#sorted ages and matching keys of one kind ('d' - cumulative spend, 'new' - new payers)
+	def __ages__(self, keys, kind):
+		ages = sorted(int(match.group(1)) for match in map(self.keyPattern.match, keys) if match is not None and match.group(2) == kind)
+		return np.array(ages, dtype = np.int64), ['r{0}{1}'.format(age, kind) for age in ages]
+
+	#rows x keys matrix of the values, together with a mask of present cells (None when every cell is present)
+	@staticmethod
+	def __matrix__(rows, keys, dtype):
+		matrix = np.zeros((len(rows), len(keys)), dtype = dtype)
+		present = None
+		if len(keys) == 0: return matrix, present
+		getter = operator.itemgetter(*keys)
+		for rowIndex, row in enumerate(rows):
+			try:
+				matrix[rowIndex] = getter(row)
+			except KeyError:
+				if present is None: present = np.ones(matrix.shape, dtype = bool)
+				for keyIndex, key in enumerate(keys):
+					present[rowIndex, keyIndex] = key in row
+					if key in row: matrix[rowIndex, keyIndex] = row[key]
+		return matrix, present
+
+	#completion flags stay boolean unless some of them are missing
+	@staticmethod
+	def __flags__(flags, present):
+		if present is None or present.all(): return flags
+		flags = flags.astype(object)
+		flags[~present] = np.nan
+		return flags
+
+	@staticmethod
+	def __labelColumn__(label, size):
+		column = np.empty(size, dtype = object)
+		for index in range(size): column[index] = label
+		return column
+
+	@staticmethod
+	def __frame__(parts, columns, sortBy):
+		if len(parts) == 0: return pd.DataFrame(columns = columns)
+		frame = pd.DataFrame({column: np.concatenate([part[column] for part in parts]) for column in columns}, columns = columns)
+		return frame.sort_values(by = sortBy).reset_index(drop = True)
+
+	def __buildByDay__(self):
+		spendParts = []
+		conversionParts = []
+
+		for label, current in zip(self.labels, self.series):
+			values = current['values']
+			days = list(values)
+			rows = list(values.values())
+			completeRows = [current['complete'].get(day, {}) for day in days]
+
+			keys = set()
+			for row in rows: keys.update(row)
+			spendAges, spendKeys = self.__ages__(keys, 'd')
+			newAges, newKeys = self.__ages__(keys, 'new')
+
+			cohortSize = np.array([row['count'] for row in rows], dtype = np.int64)
+			payers = np.array([row['paid'] for row in rows], dtype = np.int64)
+			days = np.array(days, dtype = object)
+
+			#cumulative spend per paying user
+			revenue, present = self.__matrix__(rows, spendKeys, np.float64)
+			completed, completePresent = self.__matrix__(completeRows, spendKeys, bool)
+			ageCount = len(spendKeys)
+			part = {'segment': self.__labelColumn__(label, revenue.size),
+					'dt': np.repeat(days, ageCount),
+					'age': np.tile(spendAges, len(days)),
+					'cohort_size': np.repeat(cohortSize, ageCount),
+					'payers': np.repeat(payers, ageCount),
+					'rev_ppu': revenue.ravel(),
+					'completed': self.__flags__(completed, completePresent).ravel()}
+			part['tot_rev'] = part['rev_ppu'] * part['payers']
+			if present is not None:
+				part = {column: data[present.ravel()] for column, data in part.items()}
+			spendParts += [part]
+
+			#non-cumulative new payers, accumulated along the age axis
+			newPayers, present = self.__matrix__(rows, newKeys, np.int64)
+			completed, completePresent = self.__matrix__(completeRows, ['r{0}d'.format(age) for age in newAges], bool)
+			ageCount = len(newKeys)
+			part = {'segment': self.__labelColumn__(label, newPayers.size),
+					'dt': np.repeat(days, ageCount),
+					'age': np.tile(newAges, len(days)),
+					'cohort_size': np.repeat(cohortSize, ageCount),
+					'payers': np.repeat(payers, ageCount),
+					'new_payers': newPayers.ravel(),
+					'conv': np.cumsum(newPayers, axis = 1).ravel(),
+					'completed': self.__flags__(completed, completePresent).ravel()}
+			if present is not None:
+				part = {column: data[present.ravel()] for column, data in part.items()}
+			conversionParts += [part]
+
+		self.__store__('spend', self.__frame__(spendParts, 
+											   ['segment', 'dt', 'age', 'cohort_size', 'payers', 'rev_ppu', 'tot_rev', 'completed'], 
+											   ['segment', 'dt', 'age']))
+		self.__store__('conversions', self.__frame__(conversionParts, 
+													 ['segment', 'dt', 'age', 'cohort_size', 'payers', 'new_payers', 'conv', 'completed'], 
+													 ['segment', 'dt', 'age']))
+
+	def __buildCombined__(self):
+		spendParts = []
+		completeParts = []
+
+		for label, current in zip(self.labels, self.series):
+			combined = current['combined']
+			combinedComplete = current['combined_complete']
+
+			ages, keys = self.__ages__(combined, 'd')
+			spend, present = self.__matrix__([combined], keys, np.float64)
+			completed, completePresent = self.__matrix__([combinedComplete], keys, bool)
+			part = {'segment': self.__labelColumn__(label, len(keys)),
+					'age': ages,
+					'x': spend.ravel(),
+					'payers': np.repeat(np.int64(combined['paid']), len(keys)),
+					'combined_complete': self.__flags__(completed, completePresent).ravel()}
+			if present is not None:
+				part = {column: data[present.ravel()] for column, data in part.items()}
+			spendParts += [part]
+
+			ages, keys = self.__ages__(combinedComplete, 'd')
+			completed, _ = self.__matrix__([combinedComplete], keys, bool)
+			completeParts += [{'segment': self.__labelColumn__(label, len(keys)), 
+							   'age': ages, 
+							   'combined_complete': completed.ravel()}]
+
+		self.__store__('combinedSpend', self.__frame__(spendParts, 
+													   ['segment', 'age', 'x', 'payers', 'combined_complete'], 
+													   ['segment', 'age']))
+		if len(completeParts) == 0:
+			combinedComplete = pd.DataFrame(columns = ['segment', 'age', 'combined_complete'])
+		else:
+			combinedComplete = pd.DataFrame({column: np.concatenate([part[column] for part in completeParts]) for column in ['segment', 'age', 'combined_complete']})
+		self.__store__('combinedComplete', combinedComplete.set_index(['segment', 'age']))
+
+#columnar view of a getRetention response
+#the cells of all series are read in one pass into flat NumPy columns, which are then viewed either as long-format
+#frames or as segment x cohort x age matrices; day 0, which always duplicates day 1, is left out of every view
+class amplitudeRetentionResult:
+
+	cellFields = ['count', 'outof', 'incomplete']
+
+	def __init__(self, result):
+		self.labels = result['data']['seriesLabels']
+		self.series = result['data']['series']
+		self.tables = {}
+		self.convert = None         #optional function applied to every table once it's built
+
+	def __store__(self, name, frame):
+		self.tables[name] = frame if self.convert is None else self.convert(frame)
+
+	#series labels as an object array (labels of multi-property group-bys are lists)
+	def __segmentArray__(self):
+		segments = np.empty(len(self.labels), dtype = object)
+		for index, label in enumerate(self.labels): segments[index] = label
+		return segments
+
+	#flat (retained, cohort_size, incomplete) columns of a list of cell lists, with the position of every cell in its list
+	def __cells__(self, rows):
+		lengths = np.array([len(row) for row in rows], dtype = np.int64)
+		cellCount = int(lengths.sum())
+		cells = np.empty((cellCount, len(self.cellFields)), dtype = np.int64)
+		for fieldIndex, field in enumerate(self.cellFields):
+			cells[:, fieldIndex] = np.fromiter(map(operator.itemgetter(field), itertools.chain.from_iterable(rows)), dtype = np.int64, count = cellCount)
+		offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+		return lengths, cells, np.arange(cellCount, dtype = np.int64) - offsets
+
+	def __buildByDay__(self):
+		rows = []
+		days = []
+		seriesIndex = []
+		for index, current in enumerate(self.series):
+			rows += current['values'].values()
+			days += current['values'].keys()
+			seriesIndex += [index] * len(current['values'])
+
+		lengths, cells, ages = self.__cells__(rows)
+		segments = self.__segmentArray__()
+		self.tables['cells'] = (np.array(seriesIndex, dtype = np.int64), np.array(days, dtype = object), lengths, cells, ages)
+
+		keep = ages > 0
+		byDay = pd.DataFrame({'segment': np.repeat(segments[np.array(seriesIndex, dtype = np.int64)], lengths)[keep],
+							  'dt': np.repeat(np.array(days, dtype = object), lengths)[keep],
+							  'age': ages[keep],
+							  'retained': cells[keep, 0],
+							  'cohort_size': cells[keep, 1],
+							  'completed': cells[keep, 2] == 0}, 
+							 index = np.flatnonzero(keep))
+		self.__store__('byDay', byDay)
+
+	#day-by-day retention: segment, dt, age, retained, cohort_size, completed
+	@property
+	def byDayRetention(self):
+		if 'byDay' not in self.tables: self.__buildByDay__()
+		return self.tables['byDay']
+
+	#retention over all cohorts: segment, age, retained, cohort_size, completed
+	@property
+	def combinedRetention(self):
+		if 'combined' not in self.tables:
+			lengths, cells, ages = self.__cells__([current['combined'] for current in self.series])
+			segments = self.__segmentArray__()
+			keep = ages > 0
+			combined = pd.DataFrame({'segment': np.repeat(segments, lengths)[keep],
+									 'age': ages[keep],
+									 'retained': cells[keep, 0],
+									 'cohort_size': cells[keep, 1],
+									 'completed': cells[keep, 2] == 0}, 
+									index = np.flatnonzero(keep))
+			self.__store__('combined', combined)
+		return self.tables['combined']
+
+	def __buildMatrices__(self):
+		if 'byDay' not in self.tables: self.__buildByDay__()
+		seriesIndex, days, lengths, cells, ages = self.tables['cells']
+
+		cohorts, cohortIndex = np.unique(days.astype(str), return_inverse = True)
+		ageCount = max(int(lengths.max()) - 1, 0) if len(lengths) > 0 else 0
+		shape = (len(self.labels), len(cohorts), ageCount)
+
+		keep = ages > 0
+		position = (np.repeat(seriesIndex, lengths)[keep], np.repeat(cohortIndex, lengths)[keep], ages[keep] - 1)
+		retained = np.zeros(shape, dtype = np.int64)
+		cohortSize = np.zeros(shape, dtype = np.int64)
+		completed = np.zeros(shape, dtype = bool)
+		retained[position] = cells[keep, 0]
+		cohortSize[position] = cells[keep, 1]
+		completed[position] = cells[keep, 2] == 0
+
+		self.tables['matrices'] = {'cohorts': cohorts, 
+								   'ages': np.arange(1, ageCount + 1, dtype = np.int64), 
+								   'retained': retained, 
+								   'cohortSize': cohortSize, 
+								   'completed': completed}
+
+	def __matrix__(self, name):
+		if 'matrices' not in self.tables: self.__buildMatrices__()
+		return self.tables['matrices'][name]
+
+	#axis labels of the segment x cohort x age matrices
+	@property
+	def segments(self):
+		return list(self.labels)
+
+	@property
+	def cohorts(self):
+		return self.__matrix__('cohorts')
+
+	@property
+	def ages(self):
+		return self.__matrix__('ages')
+
+	#segment x cohort x age matrices, cells missing from the response are zero (and not completed)
+	@property
+	def retained(self):
+		return self.__matrix__('retained')
+
+	@property
+	def cohortSize(self):
+		return self.__matrix__('cohortSize')
+
+	@property
+	def completed(self):
+		return self.__matrix__('completed')
 
 #amplitude API 
 #https://amplitude.zendesk.com/hc/en-us/articles/205469748-Dashboard-Rest-API-Export-Amplitude-Dashboard-Data#results-from-an-existing-chart
 class amplitudeAPI:
 	
-	def __init__(self, configFile):
-
-		with open(configFile, 'r') as f:
-			config = json.load(f)
+	def __init__(self, 
+				 configFile,
+				 poolSize = AMPL_POOL_SIZE,
+				 connectTimeout = AMPL_CONNECT_TIMEOUT,
+				 timeout = AMPL_TIMEOUT,
+				 cache = None,
+				 scheduler = None,
+				 dtypes = AMPL_DTYPES_DEFAULT,
+				 metrics = None,
+				 resultCache = None):
+
+		#the path of a config file or an already loaded config
+		if isinstance(configFile, dict):
+			config = configFile
+		else:
+			with open(configFile, 'r') as f:
+				config = json.load(f)
 			
 		self.apiKey = config['apiKey']
 		self.secretKey = config['secretKey']
+		self.apiUrl = config.get('apiUrl', AMPL_API_URL).rstrip('/')
+
+		self.pool = amplitudeConnectionPool(self.apiKey, 
+											self.secretKey, 
+											poolSize = poolSize, 
+											connectTimeout = connectTimeout, 
+											timeout = timeout)
+
+		#an optional amplitudeResponseCache
+		self.cache = cache
+		#an optional amplitudeResultCache, may be shared by several clients
+		self.resultCache = resultCache
+		#identical requests and getter calls running at the same time in several threads
+		self.flights = amplitudeSingleFlight()
+
+		if scheduler is None:
+			scheduler = amplitudeScheduler()
+		self.scheduler = scheduler
+
+		#an amplitudeMetrics collecting request and getter measurements, may be shared by several clients
+		if metrics is None:
+			metrics = amplitudeMetrics()
+		self.metrics = metrics
+
+		if dtypes not in (AMPL_DTYPES_DEFAULT, AMPL_DTYPES_COMPACT, AMPL_DTYPES_ARROW, AMPL_DTYPES_JSON):
+			raise ValueError('Unsupported dtypes {0}'.format(dtypes))
+		self.dtypes = dtypes
+		self.memoryLock = threading.Lock()
+		self.memoryStats = {'frames': 0, 'bytesBefore': 0, 'bytesAfter': 0}
+
+	def close(self):
+		self.pool.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
 		
+	#concurrent calls for the same url share a single request, every caller gets its own decoded copy of the body
 	def queryApi(self, url):
-		buffer = BytesIO()
-		c = pycurl.Curl()
-		c.setopt(c.URL, url)
-		c.setopt(c.USERPWD, '{0}:{1}'.format(self.apiKey, self.secretKey)) 
-		c.setopt(c.WRITEDATA, buffer)
-		c.perform()
-		c.close()    
-		body = buffer.getvalue()
-		body = body.decode('iso-8859-1')
-		#print(body)
+		body = self.__cacheGet__(url)
+		if body is not None:
+			return self.__cachedResponse__(url, body)
+
+		def fetch():
+			attempt = 0
+			while True:
+				self.scheduler.acquire()
+				started = time.monotonic()
+				try:
+					status, body, transfer = self.__perform__(url)
+				except pycurl.error:
+					delay = self.scheduler.retryDelay(attempt, None)
+					if delay is None: raise
+					attempt += 1
+					time.sleep(delay)
+					continue
+				finally:
+					self.scheduler.release(time.monotonic() - started)
+
+				delay = self.scheduler.retryDelay(attempt, status, transfer['retryAfter'])
+				if delay is None: break
+				self.__recordRequest__(url, status, body, transfer)
+				attempt += 1
+				time.sleep(delay)
+
+			return self.__completeResponse__(url, status, body, transfer), body
+
+		(result, body), leader = self.flights.run(url, fetch)
+		if leader: return result
+		return self.__sharedResponse__(url, body)
+
+	#iterates over the items of the array at path (e.g. ['events'] or ['data', 'series']) of the response,
+	#decoding them while the body is being received, see amplitudeJSONArrayReader
+	#streamed responses are read from the cache but never written to it, as that would require holding the whole body
+	def queryApiStream(self, url, path):
+		return self.metrics.stream('queryApiStream', self.__queryApiStream__(url, path))
+
+	def __queryApiStream__(self, url, path):
+		body = self.__cacheGet__(url)
+		if body is not None:
+			reader = amplitudeJSONArrayReader(path)
+			yield from reader.feed(body)
+			yield from reader.finish()
+			self.__recordRequest__(url, None, body, {}, cached = True)
+			return
+
+		attempt = 0
+		while True:
+			reader = amplitudeJSONArrayReader(path)
+			errorBody = bytearray()
+			received = 0
+			transfer = {}
+			emitted = False
+			self.scheduler.acquire()
+			started = time.monotonic()
+			try:
+				with contextlib.closing(self.__performStream__(url, transfer)) as chunks:
+					for status, chunk in chunks:
+						received += len(chunk)
+						if status != 0 and (status < 200 or status >= 300):
+							errorBody += chunk
+						else:
+							items = reader.feed(chunk)
+							emitted = emitted or len(items) > 0
+							yield from items
+			except pycurl.error:
+				#a transfer interrupted after some of the items were yielded can't be repeated
+				delay = None if emitted else self.scheduler.retryDelay(attempt, None)
+				if delay is None: raise
+				attempt += 1
+				time.sleep(delay)
+				continue
+			finally:
+				self.scheduler.release(time.monotonic() - started)
+
+			delay = self.scheduler.retryDelay(attempt, status, transfer.get('retryAfter'))
+			if delay is None: break
+			self.__recordRequest__(url, status, errorBody, transfer)
+			attempt += 1
+			time.sleep(delay)
+
+		if status != 0 and (status < 200 or status >= 300):
+			self.__recordRequest__(url, status, errorBody, transfer)
+			raise amplitudeAPIError('HTTP {0} for {1}'.format(status, url), 
+									url = url, 
+									status = status, 
+									body = errorBody.decode('utf-8', 'replace'))
+		yield from reader.finish()
+		cost = reader.values.get('novaCost')
+		if isinstance(cost, (int, float)):
+			self.scheduler.recordCost(cost)
+		self.__recordRequest__(url, status, received, transfer, cost = cost)
+
+	#yields (status, chunk) pairs as the body arrives, driving a single transfer through a curl multi handle
+	#the curl timings of the finished transfer are added to transfer (see amplitudeConnectionPool.transferInfo)
+	def __performStream__(self, url, transfer = None):
+		chunks = []
+		c = self.pool.acquire()
+		multi = pycurl.CurlMulti()
+		completed = False
 		try:
-			body = json.loads(body)
-			if AMPL_API_DEBUG_MODE:
-				print(url)
-				#print('Nova cost: {0}'.format(body['novaCost']))
-				print(body)
-			return body
-		except:
-			print('Body is not a json')
-			print(url)
-			print(body)
+			c.setopt(pycurl.URL, url)
+			c.setopt(pycurl.WRITEFUNCTION, chunks.append)
+			multi.add_handle(c)
+			running = 1
+			while running:
+				while True:
+					ret, running = multi.perform()
+					if ret != pycurl.E_CALL_MULTI_PERFORM: break
+
+				queued, succeeded, failed = multi.info_read()
+				for c, errno, message in failed:
+					raise pycurl.error(errno, '{0} ({1})'.format(message, url))
+
+				if chunks:
+					status = c.getinfo(pycurl.RESPONSE_CODE)
+					received = chunks[:]
+					del chunks[:]
+					for chunk in received:
+						yield status, chunk
+				if running: 
+					multi.select(1.0)
+			if transfer is not None:
+				transfer.update(self.pool.transferInfo(c))
+			completed = True
+			#responses without a body
+			yield c.getinfo(pycurl.RESPONSE_CODE), b''
+		finally:
+			multi.remove_handle(c)
+			multi.close()
+			#failed transfers and streams closed before the end of the body
+			if completed:
+				self.pool.release(c)
+			else:
+				self.pool.discard(c)
+
+	#downloads the response into file (any writable binary file object) without holding it in memory,
+	#returns the HTTP status; failed or throttled requests are retried as usual
+	def queryApiToFile(self, url, file):
+		attempt = 0
+		while True:
+			start = file.tell()
+			errorBody = bytearray()
+			transfer = {}
+			self.scheduler.acquire()
+			started = time.monotonic()
+			try:
+				with contextlib.closing(self.__performStream__(url, transfer)) as chunks:
+					for status, chunk in chunks:
+						if status != 0 and (status < 200 or status >= 300):
+							errorBody += chunk
+						else:
+							file.write(chunk)
+			except pycurl.error:
+				delay = self.scheduler.retryDelay(attempt, None)
+				if delay is None: raise
+				attempt += 1
+				file.seek(start)
+				file.truncate()
+				time.sleep(delay)
+				continue
+			finally:
+				self.scheduler.release(time.monotonic() - started)
+
+			delay = self.scheduler.retryDelay(attempt, status, transfer.get('retryAfter'))
+			self.__recordRequest__(url, status, errorBody if errorBody else file.tell() - start, transfer)
+			if delay is None: break
+			attempt += 1
+			file.seek(start)
+			file.truncate()
+			time.sleep(delay)
+
+		if status != 0 and (status < 200 or status >= 300):
+			raise amplitudeAPIError('HTTP {0} for {1}'.format(status, url), 
+									url = url, 
+									status = status, 
+									body = errorBody.decode('utf-8', 'replace'))
+		return status
+
+	def __perform__(self, url):
+		#the body is collected in a single growing buffer which is parsed in place, without intermediate copies
+		buffer = bytearray()
+		c = self.pool.acquire()
+		try:
+			c.setopt(pycurl.URL, url)
+			c.setopt(pycurl.WRITEFUNCTION, buffer.extend)
+			c.perform()
+			status = c.getinfo(pycurl.RESPONSE_CODE)
+			transfer = self.pool.transferInfo(c)
+		except BaseException:
+			self.pool.discard(c)
 			raise
+		self.pool.release(c)
+		return status, buffer, transfer
+
+	#reports a request to the metrics, body is either the body or its size
+	def __recordRequest__(self, url, status, body, transfer, decode = None, result = None, cost = None, cached = False, shared = False):
+		measurement = {'url': url,
+					   'endpoint': urlsplit(url).path,
+					   'status': status,
+					   'bodyBytes': body if isinstance(body, int) else len(body),
+					   'cost': cost,
+					   'decode': decode,
+					   'result': result,
+					   'cached': cached,
+					   'shared': shared}
+		measurement.update(transfer)
+		self.metrics.record('request', measurement)
+
+	#checks the status of a finished request, parses it, accounts its cost and caches it
+	def __completeResponse__(self, url, status, body, transfer = None):
+		transfer = transfer or {}
+		#status is 0 for non-HTTP urls
+		if status != 0 and (status < 200 or status >= 300):
+			self.__recordRequest__(url, status, body, transfer)
+			raise amplitudeAPIError('HTTP {0} for {1}'.format(status, url), 
+									url = url, 
+									status = status, 
+									body = body.decode('utf-8', 'replace'))
+
+		started = time.perf_counter()
+		result = self.__parseBody__(url, body)
+		decode = time.perf_counter() - started
+		cost = None
+		if isinstance(result, dict) and isinstance(result.get('novaCost'), (int, float)):
+			cost = result['novaCost']
+			self.scheduler.recordCost(cost)
+		self.__recordRequest__(url, status, body, transfer, decode = decode, result = result, cost = cost)
+		self.__cachePut__(url, body)
+		return result
+
+	#parses a body read from the cache, no cost is accounted as no query was run
+	def __cachedResponse__(self, url, body):
+		started = time.perf_counter()
+		result = self.__parseBody__(url, body)
+		self.__recordRequest__(url, None, body, {}, decode = time.perf_counter() - started, result = result, cached = True)
+		return result
+
+	#parses a body received by a concurrent request of the same url, whose cost was already accounted
+	def __sharedResponse__(self, url, body):
+		started = time.perf_counter()
+		result = self.__parseBody__(url, body)
+		self.__recordRequest__(url, None, body, {}, decode = time.perf_counter() - started, result = result, cached = True, shared = True)
+		return result
+
+	def __cacheGet__(self, url):
+		if self.cache is None: return None
+		return self.cache.get(self.cache.key(url, self.apiKey))
+
+	#only called for bodies that were successfully parsed, errors are never cached
+	def __cachePut__(self, url, body):
+		if self.cache is None: return
+		self.cache.put(self.cache.key(url, self.apiKey), url, body)
+
+	#json reads the UTF-8 bytes directly, so no decoded copy of the body is made before parsing
+	def __parseBody__(self, url, body):
+		try:
+			return json.loads(body)
+		except ValueError:
+			self.metrics.record('invalid', {'url': url, 'body': bytes(body).decode('utf-8', 'replace')})
+			raise
+
+	#runs a list of requests concurrently, keeping at most maxInFlight transfers open
+	#parsed bodies are returned in the same order as urls
+	#urls already requested by other threads (or repeated in urls) are not requested again, their responses are shared
+	def queryMany(self, urls, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		urls = list(urls)
+		bodies = [None] * len(urls)
+		attempts = [0] * len(urls)
+
+		#heap of (time the request may start, index)
+		pending = []
+		leading = {}
+		following = {}
+		queuedAt = time.monotonic()
+		for index in range(len(urls)):
+			body = self.__cacheGet__(urls[index])
+			if body is not None:
+				bodies[index] = self.__cachedResponse__(urls[index], body)
+				continue
+			flight, leader = self.flights.begin(urls[index])
+			if leader:
+				leading[index] = flight
+				pending += [(queuedAt, index)]
+			else:
+				following[index] = flight
+		heapq.heapify(pending)
+		active = {}
+
+		multi = pycurl.CurlMulti()
+		try:
+			while pending or active:
+				wait = 1.0
+				while pending and len(active) < maxInFlight:
+					readyAt, index = pending[0]
+					delay = readyAt - time.monotonic()
+					if delay <= 0:
+						delay = self.scheduler.tryAcquire()
+					if delay > 0:
+						wait = min(wait, delay)
+						break
+
+					heapq.heappop(pending)
+					self.scheduler.recordWait(max(0, time.monotonic() - readyAt))
+					buffer = bytearray()
+					c = self.pool.acquire()
+					c.setopt(pycurl.URL, urls[index])
+					c.setopt(pycurl.WRITEFUNCTION, buffer.extend)
+					multi.add_handle(c)
+					active[c] = (index, buffer, time.monotonic())
+
+				while True:
+					ret, running = multi.perform()
+					if ret != pycurl.E_CALL_MULTI_PERFORM: break
+
+				while True:
+					queued, succeeded, failed = multi.info_read()
+					for c in succeeded:
+						index, buffer, started = active.pop(c)
+						status = c.getinfo(pycurl.RESPONSE_CODE)
+						transfer = self.pool.transferInfo(c)
+						multi.remove_handle(c)
+						self.pool.release(c)
+						self.scheduler.release(time.monotonic() - started)
+
+						delay = self.scheduler.retryDelay(attempts[index], status, transfer['retryAfter'])
+						if delay is not None:
+							self.__recordRequest__(urls[index], status, buffer, transfer)
+							attempts[index] += 1
+							heapq.heappush(pending, (time.monotonic() + delay, index))
+						else:
+							bodies[index] = self.__completeResponse__(urls[index], status, buffer, transfer)
+							self.flights.finish(urls[index], leading.pop(index), (bodies[index], buffer))
+					for c, errno, message in failed:
+						index, buffer, started = active.pop(c)
+						multi.remove_handle(c)
+						self.pool.discard(c)
+						self.scheduler.release(time.monotonic() - started)
+						delay = self.scheduler.retryDelay(attempts[index], None)
+						if delay is None:
+							raise pycurl.error(errno, '{0} ({1})'.format(message, urls[index]))
+						attempts[index] += 1
+						heapq.heappush(pending, (time.monotonic() + delay, index))
+					if queued == 0: break
+
+				if active: 
+					multi.select(wait)
+				elif pending:
+					time.sleep(wait)
+		except BaseException as error:
+			#callers waiting for the requests which won't be completed fail the same way
+			for index, flight in leading.items():
+				self.flights.finish(urls[index], flight, error = error)
+			raise
+		finally:
+			#transfers aborted by an error
+			for c, (index, buffer, started) in active.items():
+				multi.remove_handle(c)
+				self.pool.discard(c)
+				self.scheduler.release(time.monotonic() - started)
+			multi.close()
+
+		for index, flight in following.items():
+			result, body = self.flights.wait(flight)
+			bodies[index] = self.__sharedResponse__(urls[index], body)
+		return bodies
+
+	#applies the output dtypes of the client to a getter result: data frames, tuples and lists of them,
+	#amplitudeLTVResult and amplitudeRetentionResult (whose tables are converted once they are built)
+	def __output__(self, result):
+		if self.dtypes in (AMPL_DTYPES_DEFAULT, AMPL_DTYPES_JSON): return result
+		if isinstance(result, pd.DataFrame): return self.__compactFrame__(result)
+		if isinstance(result, tuple): return tuple(self.__output__(member) for member in result)
+		if isinstance(result, list): return [self.__output__(member) for member in result]
+		if isinstance(result, (amplitudeLTVResult, amplitudeRetentionResult)): 
+			result.convert = self.__compactFrame__
+		return result
+
+	def __compactFrame__(self, frame):
+		bytesBefore = frame.memory_usage(deep = True).sum()
+		frame = self.__typedColumns__(frame, None, arrow = self.dtypes == AMPL_DTYPES_ARROW)
+		bytesAfter = frame.memory_usage(deep = True).sum()
+		with self.memoryLock:
+			self.memoryStats['frames'] += 1
+			self.memoryStats['bytesBefore'] += int(bytesBefore)
+			self.memoryStats['bytesAfter'] += int(bytesAfter)
+		return frame
+
+	#memory taken by the data frames returned so far, before and after applying the output dtypes
+	def memoryReport(self):
+		with self.memoryLock:
+			report = dict(self.memoryStats)
+		report['bytesSaved'] = report['bytesBefore'] - report['bytesAfter']
+		report['ratio'] = report['bytesAfter'] / report['bytesBefore'] if report['bytesBefore'] > 0 else 1.0
+		return report
+
+	#builds (url, parser) pair for a single getter call
+	#query is either a list of positional arguments, a dict of keyword arguments or an amplitudeRequestSpec
+	def __buildRequest__(self, getterName, query):
+		builder = getattr(self, AMPL_REQUEST_BUILDERS[getterName])
+		if isinstance(query, amplitudeRequestSpec):
+			query = query.kwargs()
+		if isinstance(query, dict):
+			return builder(**query)
+		return builder(*query)
+
+	#builds the result of a getter from decoded responses, with AMPL_DTYPES_JSON the response is returned as it is
+	def __build__(self, parse, body):
+		if self.dtypes == AMPL_DTYPES_JSON: return body
+		return self.metrics.build(parse, body)
+
+	#single request getters: queries url and builds the result with parse, accounted to a call of getterName
+	def __fetch__(self, getterName, url, parse):
+		with self.metrics.getter(getterName):
+			return self.__shared__(self.__resultKey__(getterName, url, parse), lambda: self.__output__(self.__build__(parse, self.queryApi(url))))
+
+	#returns the result of fetch() for a getter call identified by key
+	#concurrent identical calls share a single fetch() and result, results are kept in the optional result cache
+	def __shared__(self, key, fetch):
+		if self.resultCache is not None:
+			result = self.resultCache.get(key)
+			if result is not None: return result
+
+		flight, leader = self.flights.begin(key)
+		if not leader:
+			return amplitudeResultCache.copy(self.flights.wait(flight))
+		try:
+			result = fetch()
+		except BaseException as error:
+			self.flights.finish(key, flight, error = error)
+			raise
+		self.flights.finish(key, flight, result)
+
+		if self.resultCache is not None:
+			self.resultCache.put(key, result)
+		#followers copy the result, so the leader's caller gets a copy too
+		if flight.followers > 0:
+			return amplitudeResultCache.copy(result)
+		return result
+
+	#identifies a getter call by its request, the parser options (e.g. labelFilter of getAnnotations) and other options
+	def __resultKey__(self, getterName, url, parse, *options):
+		if isinstance(parse, functools.partial):
+			parse = (parse.func.__name__, repr(parse.args), repr(sorted(parse.keywords.items())))
+		else:
+			parse = parse.__name__
+		return ('getter', self.apiKey, self.dtypes, getterName, url, parse) + options
+
+	#runs the same getter for a list of queries concurrently
+	#returns a list of results in queries order or, with concat = True, a single data frame
+	#with an extra 'query' column pointing to the query index (decoded responses are never concatenated)
+	def getMany(self, getterName, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		with self.metrics.getter(getterName + 'Many'):
+			results = self.__getMany__(getterName, queries, maxInFlight)
+			if concat and self.dtypes != AMPL_DTYPES_JSON:
+				return self.__output__(self.__concatResults__(results))
+			return self.__output__(results)
+
+	def __getMany__(self, getterName, queries, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		requests = [self.__buildRequest__(getterName, query) for query in queries]
+		bodies = self.queryMany([url for url, parse in requests], maxInFlight = maxInFlight)
+		return [self.__build__(parse, body) for (url, parse), body in zip(requests, bodies)]
+
+	#results are labelled with their index in the column, or with labels when given
+	def __concatResults__(self, results, column = 'query', labels = None):
+		if labels is None:
+			labels = range(len(results))
+
+		def concatFrames(frames):
+			frames = [frame.assign(**{column: label}) for label, frame in frames if frame is not None]
+			if len(frames) == 0: return None
+			return pd.concat(frames, ignore_index = True)
+
+		#getters like getLTV or getUserActivity return tuples, each tuple member is concatenated separately
+		if any(isinstance(result, tuple) for result in results):
+			width = max(len(result) for result in results if isinstance(result, tuple))
+			combined = []
+			for position in range(width):
+				members = [(label, result[position]) for label, result in zip(labels, results) if result is not None]
+				if all(isinstance(member, pd.DataFrame) for label, member in members):
+					combined += [concatFrames(members)]
+				else:
+					combined += [[member for label, member in members]]
+			return tuple(combined)
+
+		return concatFrames(list(zip(labels, results)))
+
+	#turns a batch of logical queries, given as amplitudeRequestSpec objects or (getterName, query) pairs,
+	#into an amplitudeQueryPlan: equal calls are fetched once and event segmentation calls (getEventSegmentation
+	#with a formula, getEventUniques, getEventTotals, getEventPropSum) differing only by overlapping or adjacent
+	#date ranges are fetched as a single range and sliced afterwards (ungrouped daily and hourly series only)
+	def planQueries(self, queries):
+		specs = []
+		positions = {}
+		mapping = []
+		for query in queries:
+			spec = query if isinstance(query, amplitudeRequestSpec) else amplitudeRequestSpec(*query)
+			if spec not in positions:
+				positions[spec] = len(specs)
+				specs += [spec]
+			mapping += [positions[spec]]
+
+		fetches = []
+		series = collections.OrderedDict()
+		for index, spec in enumerate(specs):
+			planned = self.__plannedSeries__(spec)
+			if planned is None:
+				url, parse = spec.request(self)
+				fetches += [(url, [(index, None, None, parse)])]
+				continue
+			event, start, finish, frequency, limit, segment, groupBy, formula = planned
+			#the top limit group by values and weekly or monthly buckets depend on the date range
+			mergeable = frequency in (AMPL_FREQ_DAILY, AMPL_FREQ_HOURLY) and len(event.groupby) == 0 and groupBy is None
+			key = (event, frequency, limit, segment, groupBy, formula, None if mergeable else (start, finish))
+			series.setdefault(key, []).append((start, finish, index))
+
+		#(key, start, finish, members) of every date range to be fetched
+		ranges = []
+		for key, members in series.items():
+			current = None
+			for start, finish, index in sorted(members):
+				if current is not None and datetime.strptime(start, '%Y%m%d') <= datetime.strptime(current[1], '%Y%m%d') + timedelta(days = 1):
+					current = (current[0], max(current[1], finish), current[2] + [(index, start, finish)])
+				else:
+					if current is not None: ranges += [(key, ) + current]
+					current = (start, finish, [(index, start, finish)])
+			ranges += [(key, ) + current]
+
+		for key, start, finish, members in ranges:
+			event, frequency, limit, segment, groupBy, formula, unique = key
+			url, parse = self.__eventSegmentationRequest__(event, start, finish, 
+														   frequency = frequency, 
+														   limit = limit, 
+														   segment = segment, 
+														   groupBy = groupBy, 
+														   formula = formula)
+			fetchMembers = []
+			for index, memberStart, memberFinish in members:
+				sliced = (memberStart, memberFinish) != (start, finish)
+				fetchMembers += [(index, memberStart if sliced else None, memberFinish if sliced else None, parse)]
+			fetches += [(url, fetchMembers)]
+
+		return amplitudeQueryPlan(specs, mapping, fetches)
+
+	#(event, start, finish, frequency, limit, segment, groupBy, formula) of an event segmentation call,
+	#None for calls which can't be merged
+	def __plannedSeries__(self, spec):
+		arguments = spec.kwargs()
+		if spec.getterName == 'getEventSegmentation':
+			if arguments['metric'] != AMPL_METRIC_FORMULA: return None
+			if arguments['rollingWindow'] is not None or arguments['rollingAverage'] is not None: return None
+			formula = arguments['formula']
+		elif spec.getterName in ('getEventUniques', 'getEventTotals', 'getEventPropSum'):
+			formula = {'getEventUniques': AMPL_FORMULA_UNIQUES,
+					   'getEventTotals': AMPL_FORMULA_TOTALS,
+					   'getEventPropSum': AMPL_FORMULA_PROPSUM}[spec.getterName]
+		else:
+			return None
+
+		event = arguments['event']
+		if spec.getterName == 'getEventPropSum':
+			groupProperty = arguments['groupProperty']
+			event = event.withGroupBy([arguments['sumProperty']] + ([groupProperty] if groupProperty is not None else []))
+
+		return (event, 
+				arguments['startDt'].replace('-', ''), 
+				arguments['finishDt'].replace('-', ''), 
+				arguments['frequency'], 
+				arguments.get('limit', 1000), 
+				arguments['segment'], 
+				arguments['groupBy'], 
+				formula)
+
+	#fetches the requests of a plan concurrently, returns the results in the order of the logical queries
+	def runPlan(self, plan, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.__planResults__(plan, self.queryMany([url for url, members in plan.fetches], maxInFlight = maxInFlight))
+
+	#results of the logical queries of a plan from the responses of its fetches
+	def __planResults__(self, plan, bodies):
+		results = [None] * len(plan.specs)
+		for (url, members), body in zip(plan.fetches, bodies):
+			for index, start, finish, parse in members:
+				results[index] = self.__build__(parse, self.__sliceSeries__(body, start, finish))
+
+		#repeated queries get copies, so changing one of the frames doesn't change the others
+		returned = set()
+		output = []
+		for index in plan.queries:
+			result = results[index]
+			if index in returned and self.dtypes != AMPL_DTYPES_JSON and isinstance(result, pd.DataFrame):
+				result = result.copy()
+			returned.add(index)
+			output += [result]
+		return output
+
+	#runs a batch of logical queries through planQueries and runPlan
+	def getPlanned(self, queries, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		with self.metrics.getter('getPlanned'):
+			return self.__output__(self.runPlan(self.planQueries(queries), maxInFlight = maxInFlight))
+
+	#the part of a segmentation response belonging to a single planned call: x values between start and finish
+	def __sliceSeries__(self, body, start, finish):
+		if start is None: return body
+
+		data = body['data']
+		xValues = list(data['xValues'])
+		positions = [position for position, x in enumerate(xValues) if start <= str(x)[:10].replace('-', '') <= finish]
+		xValues = [xValues[position] for position in positions]
+		series = [[values[position] for position in positions if position < len(values)] for values in data['series']]
+
+		return dict(body, data = dict(data, xValues = xValues, series = series))
+
+	#splits startDt - finishDt into shardBy-aligned chunks of shardSize days, weeks or months,
+	#fetches them concurrently and stitches the responses, so the result has the same structure as a single getterName call
+	#the remaining getter arguments are passed as keywords, e.g. getSharded('getEventUniques', start, finish, event = event)
+	def getSharded(self, 
+				   getterName, 
+				   startDt, 
+				   finishDt, 
+				   shardBy = AMPL_FREQ_MONTHLY, 
+				   shardSize = 1, 
+				   maxInFlight = AMPL_MAX_IN_FLIGHT, 
+				   **kwargs):
+
+		with self.metrics.getter('getSharded'):
+			if getterName not in AMPL_SHARD_MERGERS:
+				raise ValueError('{0} results cannot be split by date'.format(getterName))
+			if shardBy not in (AMPL_FREQ_DAILY, AMPL_FREQ_WEEKLY, AMPL_FREQ_MONTHLY):
+				raise ValueError('shardBy should be one of AMPL_FREQ_DAILY, AMPL_FREQ_WEEKLY or AMPL_FREQ_MONTHLY')
+
+			#uniques over a week or a month can't be summed up from parts of the week or the month
+			frequency = kwargs.get('frequency', AMPL_FREQ_DAILY)
+			if frequency in (AMPL_FREQ_WEEKLY, AMPL_FREQ_MONTHLY) and shardBy != frequency:
+				raise ValueError('{0} buckets would be split between shards, use shardBy = frequency'.format('weekly' if frequency == AMPL_FREQ_WEEKLY else 'monthly'))
+			if kwargs.get('rollingWindow') is not None or kwargs.get('rollingAverage') is not None:
+				raise ValueError('rolling windows span shard boundaries and cannot be sharded')
+			#every shard would return its own top group by values
+			event = kwargs.get('event')
+			if kwargs.get('groupBy') is not None or (event is not None and len(event.freeze().groupby) > 0) or 'limit' in kwargs:
+				raise ValueError('group by values are limited per shard, grouped queries cannot be sharded')
+
+			builder = getattr(self, AMPL_REQUEST_BUILDERS[getterName])
+			requests = [builder(startDt = shardStart, finishDt = shardFinish, **kwargs) 
+						for shardStart, shardFinish in self.__shardRange__(startDt, finishDt, shardBy, shardSize)]
+			bodies = self.queryMany([url for url, parse in requests], maxInFlight = maxInFlight)
+
+			merge = getattr(self, AMPL_SHARD_MERGERS[getterName])
+			if getterName == 'getLTV':
+				merge = functools.partial(merge, metric = kwargs.get('metric', AMPL_LTV_METRIC_ARPPU))
+
+			url, parse = requests[0]
+			return self.__output__(self.__build__(parse, merge(bodies)))
+
+	def __shardRange__(self, startDt, finishDt, shardBy, shardSize):
+		start = datetime.strptime(startDt.replace('-', ''), '%Y%m%d').date()
+		finish = datetime.strptime(finishDt.replace('-', ''), '%Y%m%d').date()
+
+		shards = []
+		while start <= finish:
+			if shardBy == AMPL_FREQ_MONTHLY:
+				boundary = start
+				for i in range(shardSize):
+					boundary = (boundary.replace(day = 1) + timedelta(days = 32)).replace(day = 1)
+			elif shardBy == AMPL_FREQ_WEEKLY:
+				boundary = start + timedelta(days = (AMPL_WEEK_START - start.weekday()) % 7 or 7)
+				boundary += timedelta(days = 7 * (shardSize - 1))
+			else:
+				boundary = start + timedelta(days = shardSize)
+
+			shards += [(start.strftime('%Y%m%d'), min(boundary - timedelta(days = 1), finish).strftime('%Y%m%d'))]
+			start = boundary
+
+		return shards
+
+	#series responses (segmentation, session averages): x values are concatenated,
+	#series missing from some of the shards are filled with zeros
+	def __mergeSeries__(self, bodies):
+		labels = []
+		series = {}
+		xValues = []
+		for body in bodies:
+			data = body['data']
+			offset = len(xValues)
+			xValues += list(data['xValues'])
+			for label, values in zip(data['seriesLabels'], data['series']):
+				key = json.dumps(label)
+				if key not in series:
+					labels += [label]
+					series[key] = [0] * offset
+				series[key] += list(values)
+			for key in series:
+				series[key] += [0] * (len(xValues) - len(series[key]))
+
+		return {'data': {'seriesLabels': labels, 
+						 'xValues': xValues, 
+						 'series': [series[json.dumps(label)] for label in labels]}}
+
+	#histogram responses (session lengths): every shard reports the same buckets, counts are added up
+	def __mergeHistograms__(self, bodies):
+		labels = []
+		series = {}
+		for body in bodies:
+			data = body['data']
+			for label, values in zip(data['seriesLabels'], data['series']):
+				key = json.dumps(label)
+				if key not in series:
+					labels += [label]
+					series[key] = [0] * len(values)
+				series[key] = [total + value for total, value in zip(series[key], values)]
+
+		return {'data': {'seriesLabels': labels, 
+						 'xValues': bodies[0]['data']['xValues'], 
+						 'series': [series[json.dumps(label)] for label in labels]}}
+
+	#retention responses: cohorts are merged, combined retention is the sum over all cohorts
+	def __mergeRetention__(self, bodies):
+		labels = []
+		series = {}
+		for body in bodies:
+			data = body['data']
+			for label, current in zip(data['seriesLabels'], data['series']):
+				key = json.dumps(label)
+				if key not in series:
+					labels += [label]
+					series[key] = {'values': {}, 'combined': []}
+				merged = series[key]
+				merged['values'].update(current['values'])
+				for age, value in enumerate(current['combined']):
+					if age == len(merged['combined']):
+						merged['combined'] += [{'count': 0, 'outof': 0, 'incomplete': False}]
+					cell = merged['combined'][age]
+					merged['combined'][age] = {'count': cell['count'] + value['count'],
+											   'outof': cell['outof'] + value['outof'],
+											   'incomplete': cell['incomplete'] or value['incomplete']}
+
+		return {'data': {'seriesLabels': labels, 
+						 'series': [series[json.dumps(label)] for label in labels]}}
+
+	#LTV responses: cohorts are merged, combined values are re-weighted by the number of payers (ARPPU) or users (ARPU)
+	#of every shard, total revenue and paying users are added up
+	def __mergeLTV__(self, bodies, metric = AMPL_LTV_METRIC_ARPPU):
+		labels = []
+		series = {}
+		revenue = {}
+		for body in bodies:
+			data = body['data']
+			for label, current in zip(data['seriesLabels'], data['series']):
+				key = json.dumps(label)
+				if key not in series:
+					labels += [label]
+					series[key] = {'values': {}, 'complete': {}, 'combined': {'paid': 0}, 'combined_complete': {}}
+					revenue[key] = {}
+				merged = series[key]
+				merged['values'].update(current['values'])
+				merged['complete'].update(current['complete'])
+
+				paid = current['combined'].get('paid', 0)
+				merged['combined']['paid'] += paid
+				if metric == AMPL_LTV_METRIC_ARPPU:
+					weight = paid
+				elif metric == AMPL_LTV_METRIC_ARPU:
+					weight = sum(day['count'] for day in current['values'].values())
+				else:
+					weight = 1
+				merged['weight'] = merged.get('weight', 0) + weight
+				for age, value in current['combined'].items():
+					if age.startswith('r') and age.endswith('d'):
+						revenue[key][age] = revenue[key].get(age, 0) + value * weight
+				for age, value in current['combined_complete'].items():
+					merged['combined_complete'][age] = merged['combined_complete'].get(age, True) and value
+
+		for key, merged in series.items():
+			#averages are divided by the total weight, sums are kept as they are
+			weight = merged.pop('weight') if metric in (AMPL_LTV_METRIC_ARPPU, AMPL_LTV_METRIC_ARPU) else 1
+			for age, total in revenue[key].items():
+				merged['combined'][age] = total / weight if weight > 0 else 0
+
+		return {'data': {'seriesLabels': labels, 
+						 'series': [series[json.dumps(label)] for label in labels]}}
+
+	def getEventSegmentationMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getEventSegmentation', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getEventUniquesMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getEventUniques', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getEventTotalsMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getEventTotals', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getEventPropSumMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getEventPropSum', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getFunnelMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getFunnel', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getRetentionMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getRetention', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getLTVMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getLTV', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getUserActivityMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getUserActivity', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getSessionLengthDistroMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getSessionLengthDistro', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getSessionAvgLengthMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getSessionAvgLength', queries, concat = concat, maxInFlight = maxInFlight)
+
+	def getSessionAvgPerUserMany(self, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		return self.getMany('getSessionAvgPerUser', queries, concat = concat, maxInFlight = maxInFlight)
 
 	def getEvents(self):
+		url, parse = self.__eventsRequest__()
+		return self.__fetch__('getEvents', url, parse)
+
+	def __eventsRequest__(self):
 		
 		#getting data from amplitude
-		url = 'https://amplitude.com/api/2/events/list'
-		response = self.queryApi(url)	
+		url = self.apiUrl + '/api/2/events/list'
+
+		return url, self.__parseEvents__
+
+	def __parseEvents__(self, response):
 
 		return pd.DataFrame(response['data'])
 		
+	#exports raw events uploaded between start and finish (dates, 'YYYY-MM-DD', or hours, 'YYYY-MM-DDTHH', in UTC) into sink,
+	#an amplitudeParquetSink, partitioned by date=YYYY-MM-DD of the hourly files of the export
+	#the archive is downloaded into a temporary file and every hourly gzipped NDJSON file is decoded incrementally,
+	#batchSize events at a time, so neither the archive nor a whole day is ever held in memory
+	#returns the number of exported events per date
+	#https://amplitude.zendesk.com/hc/en-us/articles/205406637-Export-API-Export-Your-Project-s-Event-Data
+	def exportEvents(self, start, finish, sink, batchSize = AMPL_EXPORT_BATCH_SIZE):
+		with self.metrics.getter('exportEvents'):
+			start = start.replace('-', '')
+			finish = finish.replace('-', '')
+			if 'T' not in start: start += 'T00'
+			if 'T' not in finish: finish += 'T23'
+			url = self.apiUrl + '/api/2/export?start={0}&end={1}'.format(start, finish)
+
+			counts = {}
+			with tempfile.TemporaryFile() as archive:
+				try:
+					self.queryApiToFile(url, archive)
+				except amplitudeAPIError as error:
+					if error.status == 404: return counts   #no data for the requested range
+					raise
+				archive.seek(0)
+
+				with zipfile.ZipFile(archive) as files:
+					names = sorted(name for name in files.namelist() if name.endswith('.json.gz'))
+					pending = {}
+					for name in names:
+						match = re.search(r'_(\d{4}-\d{2}-\d{2})_\d+#', os.path.basename(name))
+						date = match.group(1) if match is not None else 'unknown'
+
+						#hourly files come ordered by date, so batches of the previous dates are complete
+						for previous in [previous for previous in pending if previous != date]:
+							self.__writeExportBatch__(sink, previous, pending.pop(previous))
+
+						rows = pending.setdefault(date, [])
+						with files.open(name) as compressed, gzip.GzipFile(fileobj = compressed) as lines:
+							for line in lines:
+								if not line.strip(): continue
+								rows += [json.loads(line)]
+								counts[date] = counts.get(date, 0) + 1
+								if len(rows) >= batchSize:
+									self.__writeExportBatch__(sink, date, rows)
+									rows = pending[date] = []
+
+					for date, rows in pending.items():
+						self.__writeExportBatch__(sink, date, rows)
+
+			return counts
+
+	#converts a list of exported events into an arrow table of AMPL_EXPORT_FIELDS columns and writes it into the sink
+	def __writeExportBatch__(self, sink, date, rows):
+		import pyarrow as pa
+
+		if not rows: return
+
+		def toString(value):
+			return value if value is None or isinstance(value, str) else json.dumps(value)
+
+		def toJson(value):
+			return None if value is None else json.dumps(value)
+
+		def toNumber(cast):
+			def convert(value):
+				try:
+					return None if value is None or value == '' else cast(value)
+				except (TypeError, ValueError):
+					return None
+			return convert
+
+		def toBool(value):
+			return value if value is None or isinstance(value, bool) else str(value).lower() == 'true'
+
+		kinds = {'string': (pa.string(), toString),
+				 'json': (pa.string(), None),
+				 'int': (pa.int64(), toNumber(int)),
+				 'float': (pa.float64(), toNumber(float)),
+				 'bool': (pa.bool_(), toBool)}
+
+		columns = []
+		fields = []
+		for name, kind in AMPL_EXPORT_FIELDS:
+			dataType, convert = kinds[kind]
+			values = [row.get(name) for row in rows]
+			if kind == 'json':
+				column = pa.array([toJson(value) for value in values], type = dataType)
+			else:
+				#values are only converted one by one when some of them don't have the expected type
+				try:
+					column = pa.array(values, type = dataType)
+				except (pa.ArrowInvalid, pa.ArrowTypeError):
+					column = pa.array([convert(value) for value in values], type = dataType)
+			columns += [column]
+			fields += [pa.field(name, dataType)]
+
+		known = set(name for name, kind in AMPL_EXPORT_FIELDS)
+		extra = [{key: value for key, value in row.items() if key not in known} for row in rows]
+		columns += [pa.array([json.dumps(value) if value else None for value in extra], type = pa.string())]
+		fields += [pa.field('extra', pa.string())]
+
+		sink.write('date={0}'.format(date), pa.Table.from_arrays(columns, schema = pa.schema(fields)))
+
 	def getDataFromExistingChart(self, dashboardId):
+		url, parse = self.__existingChartRequest__(dashboardId)
+		return self.__fetch__('getDataFromExistingChart', url, parse)
+
+	def __existingChartRequest__(self, dashboardId):
 		
 		#getting data from amplitude
-		url = 'https://amplitude.com/api/3/chart/{0}/query'.format(dashboardId)
-		response = self.queryApi(url)
+		url = self.apiUrl + '/api/3/chart/{0}/query'.format(dashboardId)
+
+		return url, self.__parseExistingChart__
+
+	def __parseExistingChart__(self, response):
 
 		return response
 	
@@ -318,9 +3106,16 @@ class amplitudeAPI:
 	#returns annotations
 	#default filter is set to major releases by default
 	def getAnnotations(self, labelFilter = '^[0-9]+\.[0-9]+$'):
+		url, parse = self.__annotationsRequest__(labelFilter = labelFilter)
+		return self.__fetch__('getAnnotations', url, parse)
+
+	def __annotationsRequest__(self, labelFilter = '^[0-9]+\.[0-9]+$'):
 
-		url = 'https://amplitude.com/api/2/annotations'
-		result = self.queryApi(url)
+		url = self.apiUrl + '/api/2/annotations'
+
+		return url, functools.partial(self.__parseAnnotations__, labelFilter = labelFilter)
+
+	def __parseAnnotations__(self, result, labelFilter):
 
 		try:
 			data = result['data']
@@ -336,7 +3131,7 @@ class amplitudeAPI:
 
 		result.startDt = pd.to_datetime(result.startDt)
 		result = result[result.label.str.contains(labelFilter)].sort_values(by = 'startDt')
-		result['finishDt'] = result.startDt.shift(-1).fillna(datetime.now().date())
+		result['finishDt'] = result.startDt.shift(-1).fillna(pd.Timestamp(datetime.now().date()))
 		result.finishDt = result.finishDt - timedelta(days = 1)
 		result['duration'] = result.apply(lambda row: (row.finishDt - row.startDt).days, axis = 1)
 		result = result.set_index('id')
@@ -350,50 +3145,242 @@ class amplitudeAPI:
 					   'label', 
 					   'details']]
 
+	#with flatten = True user and event properties are spread into typed columns (see __flattenUserActivity__),
+	#userProperties and eventProperties limit them to the listed properties
 	def getUserActivity(self, 
 						amplitudeUserId, 
 						offset = 0, 
-						limit = 1000):
+						limit = 1000,
+						flatten = False,
+						userProperties = None,
+						eventProperties = None,
+						categories = AMPL_USER_ACTIVITY_CATEGORIES):
+		url, parse = self.__userActivityRequest__(amplitudeUserId, offset = offset, limit = limit, flatten = flatten, 
+												  userProperties = userProperties, eventProperties = eventProperties, categories = categories)
+		return self.__fetch__('getUserActivity', url, parse)
+
+	#iterates over the complete history of a user page by page, yielding the same (user, events) pairs as getUserActivity
+	#up to prefetch following pages are requested in the background while the current one is processed
+	def iterUserActivity(self, 
+						 amplitudeUserId, 
+						 limit = 1000, 
+						 prefetch = 1,
+						 flatten = False,
+						 userProperties = None,
+						 eventProperties = None,
+						 categories = AMPL_USER_ACTIVITY_CATEGORIES):
+		return self.metrics.stream('iterUserActivity', self.__iterUserActivity__(amplitudeUserId, limit, prefetch, flatten, userProperties, eventProperties, categories))
+
+	def __iterUserActivity__(self, amplitudeUserId, limit, prefetch, flatten, userProperties, eventProperties, categories):
+		def getPage(offset):
+			page = self.getUserActivity(amplitudeUserId, offset = offset, limit = limit, flatten = flatten, userProperties = userProperties, 
+										eventProperties = eventProperties, categories = categories)
+			#decoded responses are split the same way, into the user data and the list of events
+			if self.dtypes == AMPL_DTYPES_JSON:
+				return page['userData'], page['events']
+			return page
+
+		if prefetch <= 0:
+			offset = 0
+			while True:
+				user, events = getPage(offset = offset)
+				yield user, events
+				offset += limit
+				if len(events) < limit or self.__lastActivityPage__(user, offset): return
+
+		#pages are fetched in the caller's context, so they are accounted to its scheduler job
+		executor = concurrent.futures.ThreadPoolExecutor(max_workers = prefetch)
+		pending = collections.deque()
+		def fetch(offset):
+			pending.append(executor.submit(contextvars.copy_context().run, getPage, offset = offset))
+			return offset + limit
 
-		url = 'https://amplitude.com/api/2/useractivity?user={0}&offset={1}&limit={2}'.format(amplitudeUserId, offset, limit)
-		result = self.queryApi(url)
+		try:
+			offset = fetch(0)
+			while pending:
+				user, events = pending.popleft().result()
+				if len(events) < limit:
+					yield user, events
+					return
+
+				while len(pending) < prefetch and not self.__lastActivityPage__(user, offset):
+					offset = fetch(offset)
+
+				yield user, events
+
+				if not pending:
+					if self.__lastActivityPage__(user, offset): return
+					offset = fetch(offset)
+		finally:
+			for future in pending:
+				future.cancel()
+			executor.shutdown(wait = True)
+
+	#the total number of events (when reported) stops paging at the last page, even when it is full
+	@staticmethod
+	def __lastActivityPage__(user, offset):
+		total = user.get('num_events') if isinstance(user, dict) else None
+		return isinstance(total, int) and offset >= total
+
+	#exports the complete histories of many users into sink (e.g. amplitudeFileSink), page by page,
+	#with up to maxInFlight users fetched at a time
+	#user data goes into the 'users' table and events into the 'events' table,
+	#returns the number of exported users and events together with the errors of the users which failed
+	def exportUserActivity(self, 
+						   amplitudeUserIds, 
+						   sink, 
+						   limit = 1000, 
+						   maxInFlight = AMPL_MAX_IN_FLIGHT,
+						   flatten = False,
+						   userProperties = None,
+						   eventProperties = None,
+						   categories = AMPL_USER_ACTIVITY_CATEGORIES):
+
+		if self.dtypes == AMPL_DTYPES_JSON:
+			raise ValueError('exports write data frames and are not available with AMPL_DTYPES_JSON')
+
+		def export(amplitudeUserId):
+			eventCount = 0
+			pages = self.iterUserActivity(amplitudeUserId, limit = limit, prefetch = 0, flatten = flatten, userProperties = userProperties, 
+										  eventProperties = eventProperties, categories = categories)
+			for page, (user, events) in enumerate(pages):
+				if page == 0:
+					sink.write('users', pd.DataFrame([user]))
+				sink.write('events', events)
+				eventCount += len(events)
+			return eventCount
+
+		with self.metrics.getter('exportUserActivity'):
+			summary = {'users': 0, 'events': 0, 'errors': {}}
+			with concurrent.futures.ThreadPoolExecutor(max_workers = maxInFlight) as executor:
+				futures = {executor.submit(contextvars.copy_context().run, export, amplitudeUserId): amplitudeUserId for amplitudeUserId in amplitudeUserIds}
+				for future in concurrent.futures.as_completed(futures):
+					try:
+						summary['events'] += future.result()
+						summary['users'] += 1
+					except (amplitudeAPIError, pycurl.error, ValueError) as error:
+						summary['errors'][futures[future]] = error
+			return summary
+
+	def __userActivityRequest__(self, 
+						amplitudeUserId, 
+						offset = 0, 
+						limit = 1000,
+						flatten = False,
+						userProperties = None,
+						eventProperties = None,
+						categories = AMPL_USER_ACTIVITY_CATEGORIES):
+
+		url = self.apiUrl + '/api/2/useractivity?user={0}&offset={1}&limit={2}'.format(amplitudeUserId, offset, limit)
+
+		if flatten:
+			return url, functools.partial(self.__parseUserActivity__, flatten = True, userProperties = userProperties, 
+										  eventProperties = eventProperties, categories = categories)
+		return url, self.__parseUserActivity__
+
+	def __parseUserActivity__(self, 
+							  result, 
+							  flatten = False, 
+							  userProperties = None, 
+							  eventProperties = None, 
+							  categories = AMPL_USER_ACTIVITY_CATEGORIES):
 
 		user = result['userData']
-
-		events = []
-		for event in result['events']:
-		    user_properties = event['user_properties']
-		    event_properties = event['event_properties']
-		    #removing nested copies of user_properties and event_properties
-		    header = event.copy()
-		    header.pop('user_id', None)
-		    header.pop('event_type', None)
-		    header.pop('server_received_time', None)
-		    header.pop('user_properties', None)
-		    header.pop('event_properties', None)
-		    
-		    events += [[result['userData']['canonical_amplitude_id'], 
-		                event['user_id'], 
-		                event['event_type'], 
-		                event['server_received_time'], 
-		                result['userData']['paying'],
-		                header,
-		                user_properties,
-		                event_properties]]
-
-		events = pd.DataFrame(events, columns = ['amplitude_id', 
-		                                         'user_id',
-		                                         'event_type',
-		                                         'dt',
-		                                         'paying',
-		                                         'header',
-		                                         'user_properties',
-		                                         'event_properties'])	
-		events.paying = events.apply(lambda x: x.paying in ['true', 'True', True], axis = 1)
-		events.dt = pd.to_datetime(events.dt)	
+		if flatten:
+			return user, self.__flattenUserActivity__(result, userProperties, eventProperties, categories)
+
+		rawEvents = result['events']
+		#header keeps the fields which are not given their own column
+		events = pd.DataFrame({'amplitude_id': [user['canonical_amplitude_id']] * len(rawEvents), 
+							   'user_id': [event['user_id'] for event in rawEvents], 
+							   'event_type': [event['event_type'] for event in rawEvents], 
+							   'dt': pd.to_datetime([event['server_received_time'] for event in rawEvents]), 
+							   'paying': np.repeat(user['paying'] in ['true', 'True', True], len(rawEvents)), 
+							   'header': [{key: value for key, value in event.items() if key not in AMPL_USER_ACTIVITY_FIELDS} for event in rawEvents], 
+							   'user_properties': [event['user_properties'] for event in rawEvents], 
+							   'event_properties': [event['event_properties'] for event in rawEvents]})
 
 		return user, events
 
+	#one row per event with amplitude_id, user_id, event_type, dt, paying, the scalar header fields,
+	#followed by user_properties.<name>, event_properties.<name> and other <dictionary>.<key> columns
+	#columns listed in categories become categoricals, numeric columns are downcast to the smallest lossless type
+	def __flattenUserActivity__(self, result, userProperties, eventProperties, categories):
+		user = result['userData']
+		rawEvents = result['events']
+
+		header = pd.DataFrame(rawEvents)
+		#other dictionaries of the header (groups, data, etc.) are spread into <name>.<key> columns as well
+		nested = [('user_properties', userProperties), ('event_properties', eventProperties)]
+		nested += [(name, None) for name in header.columns 
+				   if name not in ('user_properties', 'event_properties') and header[name].map(lambda value: isinstance(value, dict)).all()]
+		properties = []
+		for name, whitelist in nested:
+			values = header.pop(name) if name in header else [{}] * len(header)
+			values = [value if isinstance(value, dict) else {} for value in values]
+			frame = pd.DataFrame(values, columns = whitelist) if whitelist is not None else pd.DataFrame(values)
+			frame.index = header.index
+			properties += [frame.add_prefix(name + '.')]
+
+		events = pd.DataFrame({'amplitude_id': np.repeat(user['canonical_amplitude_id'], len(header)),
+							   'user_id': header.pop('user_id') if 'user_id' in header else None,
+							   'event_type': header.pop('event_type') if 'event_type' in header else None,
+							   'dt': pd.to_datetime(header.pop('server_received_time')) if 'server_received_time' in header else pd.NaT,
+							   'paying': np.repeat(user['paying'] in ['true', 'True', True], len(header))}, 
+							  index = header.index)
+		#the canonical amplitude_id replaces the per-event one, as in the header of the default output
+		header = header.drop(columns = [column for column in events.columns if column in header])
+		events = pd.concat([events, header] + properties, axis = 1)
+		return self.__typedColumns__(events, categories)
+
+	#casts columns to compact dtypes without losing information
+	#categories lists the columns to become categoricals, with None every string column repeating its values does,
+	#arrow = True backs the rest of the columns by Arrow
+	def __typedColumns__(self, frame, categories, arrow = False):
+		columns = {}
+		for column in frame.columns:
+			values = frame[column]
+			if isinstance(values.dtype, pd.CategoricalDtype):
+				pass
+			elif (column in categories) if categories is not None else self.__repeatedStrings__(values):
+				values = values.astype('category')
+			elif pd.api.types.is_bool_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+				pass
+			elif pd.api.types.is_integer_dtype(values):
+				values = pd.to_numeric(values, downcast = 'integer')
+			elif pd.api.types.is_float_dtype(values) or pd.api.types.is_object_dtype(values):
+				kind = pd.api.types.infer_dtype(values, skipna = True)
+				if kind in ('integer', 'floating', 'mixed-integer-float'):
+					values = pd.to_numeric(values)
+					if pd.api.types.is_integer_dtype(values):
+						values = pd.to_numeric(values, downcast = 'integer')
+					elif values.isna().all() or ((values.astype(np.float32).astype(np.float64) == values) | values.isna()).all():
+						values = values.astype(np.float32)
+				elif kind == 'boolean' and not values.isna().any():
+					values = values.astype(bool)
+			if arrow and not isinstance(values.dtype, pd.CategoricalDtype):
+				values = self.__arrowColumn__(values)
+			columns[column] = values
+		return pd.DataFrame(columns, index = frame.index)
+
+	@staticmethod
+	def __repeatedStrings__(values):
+		if len(values) < 2 or not pd.api.types.is_string_dtype(values): return False
+		if pd.api.types.infer_dtype(values, skipna = True) != 'string': return False
+		return values.nunique() <= len(values) // 2
+
+	@staticmethod
+	def __arrowColumn__(values):
+		import pyarrow as pa
+
+		#nested values (event properties and such) stay Python objects
+		if pd.api.types.is_object_dtype(values) and pd.api.types.infer_dtype(values, skipna = True) not in ('string', 'boolean', 'empty'):
+			return values
+		try:
+			return values.astype(pd.ArrowDtype(pa.Array.from_pandas(values).type))
+		except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError):
+			return values
+
 	#queries LTV
 	def getLTV(self,  
 			   startDt, 
@@ -401,7 +3388,19 @@ class amplitudeAPI:
 			   frequency = AMPL_FREQ_DAILY, 
 			   metric = AMPL_LTV_METRIC_ARPPU,
 			   segment = None,
-			   groupBy = None):
+			   groupBy = None,
+			   asResult = False):
+		url, parse = self.__ltvRequest__(startDt, finishDt, frequency = frequency, metric = metric, segment = segment, groupBy = groupBy, asResult = asResult)
+		return self.__fetch__('getLTV', url, parse)
+
+	def __ltvRequest__(self,  
+			   startDt, 
+			   finishDt, 
+			   frequency = AMPL_FREQ_DAILY, 
+			   metric = AMPL_LTV_METRIC_ARPPU,
+			   segment = None,
+			   groupBy = None,
+			   asResult = False):
 
 		#frequency = AMPL_FREQ_DAILY
 		#metric = AMPL_LTV_METRIC_ARPPU             #we can reconstruct all other metrics from ARPPU
@@ -418,147 +3417,16 @@ class amplitudeAPI:
 		else:
 			groupBy = ''
 
-		url = 'https://amplitude.com/api/2/revenue/ltv?m={0}&start={1}&end={2}&i={3}{4}{5}'.format(metric, startDt, finishDt, frequency, segment, groupBy)
-		result = self.queryApi(url)
-				
-		byDayCumulativeSpendPerUser = []
-		byDayConversions = []
-		byDayTotals = []
-		byDayCompleteFlag = []
+		url = self.apiUrl + '/api/2/revenue/ltv?m={0}&start={1}&end={2}&i={3}{4}{5}'.format(metric, startDt, finishDt, frequency, segment, groupBy)
 
-		combinedSpendPerUser = []
-		combinedTotals = []
-		combinedCompleteFlag = []
+		return url, functools.partial(self.__parseLTV__, asResult = asResult)
 
-		#for each of the series
-		for seriesIndex, seriesName in enumerate(result['data']['seriesLabels']):
-			currentSeriesData = result['data']['series'][seriesIndex]   
-		
-			#day by day values
-			for day, dayValues in currentSeriesData['values'].items():
-				
-				byDayTotals += [[seriesName, 
-								day,
-								dayValues['count'], 
-								dayValues['paid'],                         
-								dayValues['total_amount'],  
-								dayValues['rtotalnew'], 
-								dayValues['rtotal']]]
-				
-				#remove totals in order not to break the generation of daily values
-				dayValues.pop('total_amount')
-				dayValues.pop('count')
-				dayValues.pop('rtotalnew')
-				dayValues.pop('rtotal')
-				dayValues.pop('paid')
-				
-				byDayConversions += [[seriesName, 
-									  day, 
-									  int(key.replace('r', '').replace('new', '')), 
-									  value] for key, value in dayValues.items() if key.endswith("new")]
-				byDayCumulativeSpendPerUser += [[seriesName, 
-												 day, 
-												 int(key.replace('r', '').replace('d', '')), 
-												 value] for key, value in dayValues.items() if key.endswith("d")] 
-			
-			#day by day completeness
-			for day, dayValues in currentSeriesData['complete'].items():
-				byDayCompleteFlag += [[seriesName, 
-									   day, 
-									   int(key.replace('r', '').replace('d', '')), 
-									   value] for key, value in dayValues.items() if key.endswith("d")] 
-				
-			combinedCompleteFlag += [[seriesName, 
-									  int(key.replace('r', '').replace('d', '')), 
-									  value] for key, value in currentSeriesData['combined_complete'].items() if key.endswith("d")]
-			
-			#combined spenders, without by day separation
-			combinedTotals += [[seriesName, currentSeriesData['combined']['paid']]]
-			currentSeriesData['combined'].pop('paid')
-			
-			#combined spend per user (without by day separation)
-			combinedSpendPerUser += [[seriesName, 
-									  int(key.replace('r', '').replace('d', '')), 
-									  value] for key, value in currentSeriesData['combined'].items() if key.endswith("d")]
-
-		#flags indicating that the data is available for a day and age
-		byDayCompleteFlag = pd.DataFrame(byDayCompleteFlag, columns=['segment',
-																	 'dt',
-																	 'age',
-																	 'completed']).set_index(['segment',
-																							  'dt',
-																							  'age'])
-
-		#combined daily statistics
-		byDayTotals = pd.DataFrame(byDayTotals, columns = [	'segment', 
-															'dt', 
-															'cohort_size', 
-															'payers', 
-															'x1', 
-															'x2', 
-															'x3'])
-
-		#day-by-day non-cumulative conversions up to d180, discrete values for d1-d7, d14, d30, d60, d90, d120, d180 are available
-		byDayConversions = pd.DataFrame(byDayConversions, 
-										columns = ['segment', 
-												   'dt', 
-												   'age',
-												   'new_payers']).sort_values(by = ['segment', 
-																					'dt', 
-																					'age'])
-		byDayConversions['conv'] = byDayConversions.groupby(by = ['segment', 
-																  'dt']).new_payers.cumsum()
-		byDayConversions = byDayConversions.set_index(['segment', 
-													   'dt']).join(byDayTotals.set_index(['segment', 
-													   									  'dt'])[['cohort_size', 
-													                                              'payers']])
-		byDayConversions = byDayConversions.reset_index().set_index(['segment', 
-																	 'dt', 
-																	 'age']).join(byDayCompleteFlag)
-		byDayConversions = byDayConversions[['cohort_size', 
-											 'payers', 
-											 'new_payers', 
-											 'conv', 
-											 'completed']].reset_index()
-
-		#day-by-day cumulative spend per user up to d180, continuos values for d1-d180 are available
-		byDayCumulativeSpendPerUser = pd.DataFrame(byDayCumulativeSpendPerUser, 
-												   columns = ['segment', 
-															  'dt', 
-															  'age', 
-															  'rev_ppu']).sort_values(by = ['segment', 
-																							'dt', 
-																							'age'])	
-
-		byDayCumulativeSpendPerUser = byDayCumulativeSpendPerUser.set_index(['segment', 
-																			 'dt']).join(byDayTotals.set_index(['segment', 
-																			 	                                'dt'])[['cohort_size', 
-																			 											'payers']])
-		byDayCumulativeSpendPerUser['tot_rev'] = byDayCumulativeSpendPerUser.rev_ppu * byDayCumulativeSpendPerUser.payers
-		byDayCumulativeSpendPerUser = byDayCumulativeSpendPerUser.reset_index().set_index(['segment', 
-																						   'dt', 
-																						   'age']).join(byDayCompleteFlag)
-		byDayCumulativeSpendPerUser = byDayCumulativeSpendPerUser[['cohort_size', 
-																   'payers', 
-																   'rev_ppu', 
-																   'tot_rev', 
-																   'completed']].reset_index()
-
-		combinedTotals = pd.DataFrame(combinedTotals, columns = ['segment', 'payers']).set_index('segment')
-
-		#combined completed flags
-		combinedCompleteFlag = pd.DataFrame(combinedCompleteFlag, columns = ['segment', 
-																			 'age', 
-																			 'combined_complete']).set_index(['segment', 'age']) 
-
-		#combined spend by user
-		combinedSpendPerUser = pd.DataFrame(combinedSpendPerUser, columns = ['segment', 
-																			 'age', 
-																			 'x']).sort_values(by = ['segment', 'age'])		
-		combinedSpendPerUser = combinedSpendPerUser.set_index('segment').join(combinedTotals).reset_index()
-		combinedSpendPerUser = combinedSpendPerUser.set_index(['segment', 'age']).join(combinedCompleteFlag).reset_index()
-
-		return byDayCumulativeSpendPerUser, byDayConversions
+	#by default returns the day-by-day cumulative spend per user and conversions frames,
+	#asResult = True returns the amplitudeLTVResult itself, which also gives access to the combined tables
+	def __parseLTV__(self, result, asResult = False):
+		ltv = amplitudeLTVResult(result)
+		if asResult: return ltv
+		return ltv.byDayCumulativeSpendPerUser, ltv.byDayConversions
 
 	#queries user retention
 	#https://amplitude.zendesk.com/hc/en-us/articles/205469748#retention-analysis
@@ -567,7 +3435,18 @@ class amplitudeAPI:
 				 	 finishDt, 
 				     frequency = AMPL_FREQ_DAILY, 
 					 segment = None,
-					 groupBy = None):
+					 groupBy = None,
+					 asResult = False):
+		url, parse = self.__retentionRequest__(startDt, finishDt, frequency = frequency, segment = segment, groupBy = groupBy, asResult = asResult)
+		return self.__fetch__('getRetention', url, parse)
+
+	def __retentionRequest__(self,  
+					 startDt, 
+				 	 finishDt, 
+				     frequency = AMPL_FREQ_DAILY, 
+					 segment = None,
+					 groupBy = None,
+					 asResult = False):
 
 		startAction = '_new'
 		returnAction = '_all'  #re=\{"event_type":"Play%20Song%20or%20Video"\}
@@ -597,45 +3476,57 @@ class amplitudeAPI:
 		else: 
 			retentionBracket = ''
 
-		url = 'https://amplitude.com/api/2/retention?se={{"event_type":"{0}"}}&re={{"event_type":"{1}"}}{2}{3}&start={4}&end={5}&i={6}{7}{8}'.format(startAction, returnAction, retentionMode, retentionBracket, startDt, finishDt, frequency, segment, groupBy)   	
-		result = self.queryApi(url)
+		url = self.apiUrl + '/api/2/retention?se={{"event_type":"{0}"}}&re={{"event_type":"{1}"}}{2}{3}&start={4}&end={5}&i={6}{7}{8}'.format(startAction, returnAction, retentionMode, retentionBracket, startDt, finishDt, frequency, segment, groupBy)   	
 
-		byDayRetention = []
+		return url, functools.partial(self.__parseRetention__, asResult = asResult)
 
-		combinedRetention = []
-
-		#for each of the series
-		for seriesIndex, seriesName in enumerate(result['data']['seriesLabels']):
-			currentSeriesData = result['data']['series'][seriesIndex]   
-			
-			#day by day values
-			for day, dayValues in currentSeriesData['values'].items(): 
-				
-				for lifetime, value in enumerate(dayValues):
-					byDayRetention += [[seriesName, day, lifetime, value['count'], value['outof'], not value['incomplete']]]
-			
-			#combined values
-			for lifetime, value in enumerate(currentSeriesData['combined']):
-				combinedRetention += [[seriesName, lifetime, value['count'], value['outof'], not value['incomplete']]]    
-			
-		byDayRetention = pd.DataFrame(byDayRetention, columns = ['segment', 
-																 'dt', 
-																 'age', 
-																 'retained', 
-																 'cohort_size', 
-																 'completed'])
-		byDayRetention = byDayRetention[byDayRetention.age > 0] #day 0 always duplicates day 1
-
-		combinedRetention = pd.DataFrame(combinedRetention, columns = ['segment', 
-																	   'age', 
-																	   'retained', 
-																	   'cohort_size', 
-																	   'completed'])
-		combinedRetention = combinedRetention[combinedRetention.age > 0] #day 0 always duplicates day 1
-
-		return byDayRetention
+	#by default returns the day-by-day retention frame,
+	#asResult = True returns the amplitudeRetentionResult itself, which also gives access to the combined retention and the matrices
+	def __parseRetention__(self, result, asResult = False):
+		retention = amplitudeRetentionResult(result)
+		if asResult: return retention
+		return retention.byDayRetention
 
 	def getFunnel(self, 
+				  funnel,
+				  startDt, 
+				  finishDt, 
+				  mode = 'ordered',
+				  new = 'new',  					#active
+				  segment = None,
+				  groupBy = None,	
+				  conversionWindow = 2592000,		#30 days	 
+				  limit = 1000, 					#number of group by values returned				   
+				  exhaustive = False				#query past limit group by values of the first group by property
+				  ):
+		with self.metrics.getter('getFunnel'):
+			url, parse = self.__funnelRequest__(funnel, startDt, finishDt, mode = mode, new = new, segment = segment, groupBy = groupBy, conversionWindow = conversionWindow, limit = limit)
+
+			#the whole call, including the exhaustive requests, is shared by concurrent identical calls
+			def fetch():
+				body = self.queryApi(url)
+
+				dims = self.__groupDimensions__(None, groupBy) if exhaustive else []
+				if len(dims) > 0:
+
+					def build(filters, currentDims):
+						currentSegment, currentGroupBy = self.__restrictSegment__(segment, filters, currentDims)
+						url, parse = self.__funnelRequest__(funnel, startDt, finishDt, mode = mode, new = new, segment = currentSegment, groupBy = currentGroupBy, conversionWindow = conversionWindow, limit = limit)
+						return url
+
+					#funnel group values can't be relabelled, so the second property is not exhausted for a single value of the first one
+					bodies = self.__exhaustiveBodies__(build, 
+													   lambda currentBody: currentBody['data'], 
+													   lambda item, count: self.__labelValues__(item['groupValue'], count)[0], 
+													   lambda currentBody, positions: dict(currentBody, data = [currentBody['data'][position] for position in positions]), 
+													   None, [], dims, body, limit)
+					body = dict(bodies[0], data = [item for currentBody in bodies for item in currentBody['data']])
+
+				return self.__output__(self.__build__(parse, body))
+
+			return self.__shared__(self.__resultKey__('getFunnel', url, parse, exhaustive), fetch)
+
+	def __funnelRequest__(self, 
 				  funnel,
 				  startDt, 
 				  finishDt, 
@@ -663,9 +3554,12 @@ class amplitudeAPI:
 		funnelString = ''.join(['&e={0}'.format(evt.getEventUrl()) for evt in funnel])
 
 		#getting data from amplitude
-		url = 'https://amplitude.com/api/2/funnels?{0}&start={1}&end={2}{3}{4}&mode={5}&n={6}&cs={7}&limit={8}'.format(funnelString, startDt, finishDt, segment, groupBy, mode, new, conversionWindow, limit)
-		result = self.queryApi(url) 
-						
+		url = self.apiUrl + '/api/2/funnels?{0}&start={1}&end={2}{3}{4}&mode={5}&n={6}&cs={7}&limit={8}'.format(funnelString, startDt, finishDt, segment, groupBy, mode, new, conversionWindow, limit)
+
+		return url, functools.partial(self.__parseFunnel__, conversionWindow = conversionWindow)
+
+	def __parseFunnel__(self, result, conversionWindow):
+
 		cumulativeResults = []                
 		#for each of the series
 		for currentData in result['data']:
@@ -692,6 +3586,64 @@ class amplitudeAPI:
 		return cumulativeResults
 
 	def getEventSegmentation(self, 
+							 event, 
+							 startDt, 
+							 finishDt, 
+							 frequency = AMPL_FREQ_DAILY, 
+							 metric = AMPL_METRIC_FORMULA, 			#probably everything can be expressed by a formula
+							 limit = 1000, 					        #number of group by values returned
+							 segment = None,
+							 groupBy = None,
+							 formula = AMPL_FORMULA_UNIQUES, 		#only a single formula is supported
+							 rollingWindow = None,
+							 rollingAverage = None,
+							 exhaustive = False						#query past limit group by values (see __exhaustiveBodies__)
+							 ): 
+		with self.metrics.getter('getEventSegmentation'):
+			url, parse = self.__eventSegmentationRequest__(event, startDt, finishDt, frequency = frequency, metric = metric, limit = limit, segment = segment, groupBy = groupBy, formula = formula, rollingWindow = rollingWindow, rollingAverage = rollingAverage)
+
+			def fetch():
+				body = self.queryApi(url)
+
+				dims = self.__groupDimensions__(event, groupBy) if exhaustive else []
+				if len(dims) > 0:
+					frozenEvent = event.freeze()
+
+					def build(filters, currentDims):
+						currentEvent = amplitudeFrozenEvent(frozenEvent.eventName, 
+															frozenEvent.filters + tuple((dimension[1], dimension[2], operator, values) for dimension, operator, values in filters if dimension[0] == 'event'),
+															[(dimension[1], dimension[2]) for dimension in currentDims if dimension[0] == 'event'])
+						currentSegment, currentGroupBy = self.__restrictSegment__(segment, filters, currentDims)
+						url, parse = self.__eventSegmentationRequest__(currentEvent, startDt, finishDt, frequency = frequency, metric = metric, limit = limit, segment = currentSegment, groupBy = currentGroupBy, formula = formula, rollingWindow = rollingWindow, rollingAverage = rollingAverage)
+						return url
+
+					def prefix(currentBody, value):
+						data = currentBody['data']
+						return dict(currentBody, data = dict(data, seriesLabels = [[value] + (label if isinstance(label, list) else [label]) for label in data['seriesLabels']]))
+
+					def select(currentBody, positions):
+						data = currentBody['data']
+						return dict(currentBody, data = dict(data, seriesLabels = [data['seriesLabels'][position] for position in positions], 
+																	series = [data['series'][position] for position in positions]))
+
+					bodies = self.__exhaustiveBodies__(build, 
+													   lambda currentBody: currentBody['data']['seriesLabels'], 
+													   lambda label, count: self.__labelValues__(label, count)[0], 
+													   select, prefix, [], dims, body, limit)
+					body = self.__mergeEntries__(bodies)
+
+				return self.__output__(self.__build__(parse, body))
+
+			return self.__shared__(self.__resultKey__('getEventSegmentation', url, parse, exhaustive), fetch)
+
+	#a single segmentation response made of responses of disjoint series (all of the same date range)
+	def __mergeEntries__(self, bodies):
+		data = dict(bodies[0]['data'])
+		data['seriesLabels'] = [label for body in bodies for label in body['data']['seriesLabels']]
+		data['series'] = [values for body in bodies for values in body['data']['series']]
+		return dict(bodies[0], data = data)
+
+	def __eventSegmentationRequest__(self, 
 							 event, 
 							 startDt, 
 							 finishDt, 
@@ -724,30 +3676,211 @@ class amplitudeAPI:
 			formula = '&formula={0}'.format(formula)
 
 		#getting data from amplitude
-		url = 'https://amplitude.com/api/2/events/segmentation?e={0}&start={1}&end={2}&i={3}&m={4}{5}{6}&limit={7}{8}'.format(event.getEventUrl(), startDt, finishDt, frequency, metric, segment, groupBy, limit, formula)
-		result = self.queryApi(url)     
+		url = self.apiUrl + '/api/2/events/segmentation?e={0}&start={1}&end={2}&i={3}&m={4}{5}{6}&limit={7}{8}'.format(event.getEventUrl(), startDt, finishDt, frequency, metric, segment, groupBy, limit, formula)
 
-		dfResult = []
-		#for each of the series
-		for seriesIndex, seriesName in enumerate(result['data']['seriesLabels']):
-			currentSeriesData = result['data']['series'][seriesIndex]   
-			
-			for xLabelIndex, xLabel in enumerate(result['data']['xValues']):
-				dfResult += [[seriesName, xLabel, currentSeriesData[xLabelIndex]]]
-		
+		return url, self.__parseEventSegmentation__
+
+	def __parseEventSegmentation__(self, result):
+
+		data = result['data']
 		try: 
-			dfResult = pd.DataFrame(dfResult, columns = ['Segment', 'x', 'y'])
 			def segmentToString(segment):
 				if isinstance(segment, list): return ', '.join(segment)
 				return str(segment)
-			dfResult.Segment = dfResult.apply(lambda row: segmentToString(row.Segment), axis = 1)
-			dfResult.x = pd.to_datetime(dfResult.x)
-
-			#print(dfResult)
-			return(dfResult)
+			#labels are formatted and dates are parsed once, not for every cell
+			return self.__seriesFrame__([segmentToString(segment) for segment in data['seriesLabels']],
+										pd.to_datetime(data['xValues']),
+										data['series'],
+										['Segment', 'x', 'y'])
 		except:
 			return None
 
+	#builds a long-format frame with a row per (series, x value) pair out of series labels,
+	#x values and a series x values matrix, without creating Python objects per cell
+	def __seriesFrame__(self, labels, xValues, series, columns):
+		labelColumn = np.empty(len(labels), dtype = object)
+		for index, label in enumerate(labels): 
+			labelColumn[index] = label                    #element-wise, so list labels stay lists
+
+		xColumn = np.asarray(xValues)
+		if xColumn.dtype.kind not in 'iufcmM':
+			xColumn = np.empty(len(xValues), dtype = object)
+			xColumn[:] = list(xValues)
+
+		values = np.array([currentSeriesData[:len(xValues)] for currentSeriesData in series[:len(labels)]])
+
+		return pd.DataFrame({columns[0]: np.repeat(labelColumn, len(xValues)),
+							 columns[1]: np.tile(xColumn, len(labels)),
+							 columns[2]: values.ravel()}, 
+							columns = columns)
+
+	#all entries of a grouped query whose group by values were cut at limit: the values of the first dimension are
+	#collected in rounds excluding the values seen so far (andIsNot), then queried in disjoint chunks concurrently,
+	#chunks still hitting the limit are split, a single value still hitting it is fixed and the next dimension is exhausted
+	#build(filters, dims) returns the url of the query restricted by filters ((dimension, operator, values) triples)
+	#and grouped by dims, items(body) lists the group by entries of a response, value(item, count) gives the value of
+	#the first of count dimensions of an entry, select(body, positions) keeps the entries at the given positions of a
+	#response (a discovery round keeps only the entries of values it adds), prefix(body, value) prepends the value of a fixed dimension to every
+	#entry (None when entries can't be relabelled), first is the response grouped by all dims
+	def __exhaustiveBodies__(self, build, items, value, select, prefix, filters, dims, first, limit, maxInFlight = AMPL_MAX_IN_FLIGHT):
+		if len(items(first)) < limit: return [first]
+		dimension = dims[0]
+
+		seen = []
+		rounds = []
+		body = first if len(dims) == 1 else self.queryApi(build(filters, dims[:1]))
+		while True:
+			values = [value(item, 1) for item in items(body)]
+			positions = [position for position, currentValue in enumerate(values) if currentValue not in seen]
+			new = list(dict.fromkeys(values[position] for position in positions))
+			if len(new) > 0:
+				rounds += [body if len(positions) == len(values) else select(body, positions)]
+			seen += new
+			if len(items(body)) < limit or len(new) == 0: break
+			body = self.queryApi(build(filters + [(dimension, 'is not', seen)], dims[:1]))
+		if len(dims) == 1: return rounds
+
+		#chunks are sized after the average number of entries per value in the first response
+		entries = items(first)
+		perValue = len(entries) / max(1, len(set(value(item, len(dims)) for item in entries)))
+		size = max(1, int(limit / perValue / 2))
+		chunks = [seen[position:position + size] for position in range(0, len(seen), size)]
+
+		result = []
+		while chunks:
+			bodies = self.queryMany([build(filters + [(dimension, 'is', chunk)], dims) for chunk in chunks], maxInFlight = maxInFlight)
+			split = []
+			for chunk, body in zip(chunks, bodies):
+				if len(items(body)) < limit or (len(chunk) == 1 and prefix is None):
+					result += [body]
+				elif len(chunk) > 1:
+					split += [chunk[:len(chunk) // 2], chunk[len(chunk) // 2:]]
+				else:
+					fixed = filters + [(dimension, 'is', chunk)]
+					result += [prefix(subBody, chunk[0]) for subBody in self.__exhaustiveBodies__(build, items, value, select, prefix, fixed, dims[1:], 
+																									self.queryApi(build(fixed, dims[1:])), 
+																									limit, maxInFlight)]
+			chunks = split
+
+		return result
+
+	#restriction of a segment and group by to the given filters and dimensions, dimensions are
+	#(level, property type, Amplitude property name, property name) with level either 'event' or 'segment'
+	def __restrictSegment__(self, segment, filters, dims):
+		conditions = tuple((dimension[2], operator, values) for dimension, operator, values in filters if dimension[0] == 'segment')
+		if len(conditions) > 0:
+			segment = amplitudeFrozenSegment((segment.freeze().conditions if segment is not None else ()) + conditions)
+		names = [dimension[3] for dimension in dims if dimension[0] == 'segment']
+		return segment, amplitudeFrozenUserPropertyGroupBy(names) if len(names) > 0 else None
+
+	#group by dimensions of a segmentation (event group bys first) or a funnel query
+	def __groupDimensions__(self, event, groupBy):
+		dims = []
+		if event is not None:
+			dims += [('event', propertyType, propertyName, propertyName) for propertyType, propertyName in event.freeze().groupby]
+		if groupBy is not None:
+			groupBy = groupBy.freeze()
+			dims += [('segment', 'user', propertyName, name) for name, propertyName in zip(groupBy.names, groupBy.properties)]
+		return dims
+
+	#event segmentation grouped by any number of (propertyType, propertyName) dimensions: the first two are
+	#Amplitude group bys, every combination of values of the others gets its own filtered request and
+	#the results are merged into a frame with a column per dimension (named by the property), x and y
+	#values of the extra dimensions come from values ({propertyName: [values]}) or are discovered by
+	#requests grouped by up to two of them at a time (only combinations seen there are fetched)
+	#the event's own group by is replaced; raises ValueError if more than maxRequests requests would be needed
+	def getEventSegmentationFanOut(self, 
+								   event, 
+								   startDt, 
+								   finishDt, 
+								   groupProperties, 
+								   values = None, 
+								   frequency = AMPL_FREQ_DAILY, 
+								   metric = AMPL_METRIC_FORMULA, 
+								   limit = 1000, 
+								   segment = None, 
+								   formula = AMPL_FORMULA_UNIQUES, 
+								   maxRequests = AMPL_FANOUT_MAX_REQUESTS, 
+								   maxInFlight = AMPL_MAX_IN_FLIGHT):
+
+		with self.metrics.getter('getEventSegmentationFanOut'):
+			event = event.freeze()
+			groupProperties = [tuple(groupProperty) for groupProperty in groupProperties]
+			if len(groupProperties) == 0:
+				raise ValueError('at least one group by property is needed')
+			dimensions, extra = groupProperties[:2], groupProperties[2:]
+			values = dict(values or {})
+
+			def request(currentEvent):
+				url, parse = self.__eventSegmentationRequest__(currentEvent, startDt, finishDt, 
+															   frequency = frequency, 
+															   metric = metric, 
+															   limit = limit, 
+															   segment = segment, 
+															   formula = formula)
+				return url
+
+			#extra dimensions are combined in groups: a group per supplied property and per pair of discovered ones
+			groups = [([groupProperty], [(value, ) for value in values[groupProperty[1]]]) for groupProperty in extra if groupProperty[1] in values]
+			missing = [groupProperty for groupProperty in extra if groupProperty[1] not in values]
+			discovery = [missing[position:position + 2] for position in range(0, len(missing), 2)]
+			if len(discovery) > maxRequests:
+				raise ValueError('fan-out needs more than {0} requests'.format(maxRequests))
+
+			bodies = self.queryMany([request(event.withGroupBy(properties)) for properties in discovery], maxInFlight = maxInFlight)
+			for properties, body in zip(discovery, bodies):
+				seen = [tuple(self.__labelValues__(label, len(properties))) for label in body['data']['seriesLabels']]
+				groups += [(properties, list(dict.fromkeys(seen)))]
+
+			#combinations of values in the order of the extra dimensions
+			order = [groupProperty for properties, combinations in groups for groupProperty in properties]
+			positions = [order.index(groupProperty) for groupProperty in extra]
+			combinations = [tuple(sum(parts, ())[position] for position in positions) 
+							for parts in itertools.product(*[combinations for properties, combinations in groups])]
+
+			if len(discovery) + len(combinations) > maxRequests:
+				raise ValueError('fan-out needs {0} requests, more than {1} allowed'.format(len(discovery) + len(combinations), maxRequests))
+
+			urls = []
+			for combination in combinations:
+				currentEvent = event.withGroupBy(dimensions)
+				for (propertyType, propertyName), value in zip(extra, combination):
+					currentEvent = currentEvent.andIs(propertyType, propertyName, [value])
+				urls += [request(currentEvent)]
+			bodies = self.queryMany(urls, maxInFlight = maxInFlight)
+
+			#a single segmentation response labelled with the values of all group by properties
+			if self.dtypes == AMPL_DTYPES_JSON:
+				if len(bodies) == 0:
+					return {'data': {'series': [], 'seriesLabels': [], 'xValues': []}}
+				return self.__mergeEntries__([dict(body, data = dict(body['data'], seriesLabels = [self.__labelValues__(label, len(dimensions)) + list(combination) 
+																								  for label in body['data']['seriesLabels']]))
+											  for combination, body in zip(combinations, bodies)])
+
+			columns = [propertyName for propertyType, propertyName in groupProperties]
+			frames = []
+			for combination, body in zip(combinations, bodies):
+				data = body['data']
+				labels = [self.__labelValues__(label, len(dimensions)) for label in data['seriesLabels']]
+				frame = self.__seriesFrame__(list(range(len(labels))), pd.to_datetime(data['xValues']), data['series'], ['Segment', 'x', 'y'])
+				segments = frame.pop('Segment').to_numpy()
+				for position, (propertyType, propertyName) in enumerate(dimensions):
+					frame.insert(position, propertyName, np.array([label[position] for label in labels], dtype = object)[segments.astype(int)])
+				for position, value in enumerate(combination):
+					frame.insert(len(dimensions) + position, columns[len(dimensions) + position], value)
+				frames += [frame]
+
+			if len(frames) == 0:
+				return self.__output__(pd.DataFrame(columns = columns + ['x', 'y']))
+			return self.__output__(pd.concat(frames, ignore_index = True)[columns + ['x', 'y']])
+
+	#group by values of a series label, list labels hold a value per dimension (possibly after other items)
+	@staticmethod
+	def __labelValues__(label, count):
+		if not isinstance(label, list): label = [label]
+		label = [str(value) for value in label[-count:]]
+		return [''] * (count - len(label)) + label
+
 	def getEventUniques(self, 
 						event, 
 						startDt, 
@@ -755,13 +3888,14 @@ class amplitudeAPI:
 						frequency = AMPL_FREQ_DAILY, 
 						segment = None, 
 						groupBy = None):
-		return self.getEventSegmentation(event, 
-										 startDt, 
-										 finishDt, 
-										 frequency = frequency,
-										 segment = segment, 
-										 groupBy = groupBy,
-										 formula = AMPL_FORMULA_UNIQUES)
+		with self.metrics.getter('getEventUniques'):
+			return self.getEventSegmentation(event, 
+											 startDt, 
+											 finishDt, 
+											 frequency = frequency,
+											 segment = segment, 
+											 groupBy = groupBy,
+											 formula = AMPL_FORMULA_UNIQUES)
 
 	def getEventTotals(self, 
 					   event, 
@@ -770,13 +3904,161 @@ class amplitudeAPI:
 					   frequency = AMPL_FREQ_DAILY, 
 					   segment = None, 
 					   groupBy = None):
-		return self.getEventSegmentation(event, 
-										 startDt, 
-										 finishDt, 
-										 frequency = frequency,
-										 segment = segment, 
-										 groupBy = groupBy,
-										 formula = AMPL_FORMULA_TOTALS)
+		with self.metrics.getter('getEventTotals'):
+			return self.getEventSegmentation(event, 
+											 startDt, 
+											 finishDt, 
+											 frequency = frequency,
+											 segment = segment, 
+											 groupBy = groupBy,
+											 formula = AMPL_FORMULA_TOTALS)
+
+	def __eventUniquesRequest__(self, 
+								event, 
+								startDt, 
+								finishDt, 
+								frequency = AMPL_FREQ_DAILY, 
+								segment = None, 
+								groupBy = None):
+		return self.__eventSegmentationRequest__(event, 
+												 startDt, 
+												 finishDt, 
+												 frequency = frequency,
+												 segment = segment, 
+												 groupBy = groupBy,
+												 formula = AMPL_FORMULA_UNIQUES)
+
+	def __eventTotalsRequest__(self, 
+							   event, 
+							   startDt, 
+							   finishDt, 
+							   frequency = AMPL_FREQ_DAILY, 
+							   segment = None, 
+							   groupBy = None):
+		return self.__eventSegmentationRequest__(event, 
+												 startDt, 
+												 finishDt, 
+												 frequency = frequency,
+												 segment = segment, 
+												 groupBy = groupBy,
+												 formula = AMPL_FORMULA_TOTALS)
+
+	#same as getEventSegmentation, but only the days missing from store are requested from Amplitude
+	#and merged into the stored series, days younger than settleDays are refetched until they become final
+	def getEventSegmentationIncremental(self, 
+										store,
+										event, 
+										startDt, 
+										finishDt, 
+										frequency = AMPL_FREQ_DAILY, 
+										metric = AMPL_METRIC_FORMULA,
+										limit = 1000,
+										segment = None,
+										groupBy = None,
+										formula = AMPL_FORMULA_UNIQUES,
+										settleDays = AMPL_CACHE_SETTLE_DAYS):
+
+		with self.metrics.getter('getEventSegmentationIncremental'):
+			if self.dtypes == AMPL_DTYPES_JSON:
+				raise ValueError('incremental fetching stores data frames and is not available with AMPL_DTYPES_JSON')
+			#weekly and monthly buckets cut by a range boundary would be stored half-filled
+			if frequency != AMPL_FREQ_DAILY:
+				raise ValueError('incremental fetching supports daily series only')
+
+			oneDay = timedelta(days = 1)
+			start = datetime.strptime(startDt.replace('-', ''), '%Y%m%d').date()
+			finish = datetime.strptime(finishDt.replace('-', ''), '%Y%m%d').date()
+			lastFinal = datetime.now().date() - timedelta(days = settleDays)
+
+			key = store.key(event, segment, groupBy, metric, formula, frequency, self.apiKey)
+			entry = store.load(key)
+
+			if entry is None:
+				ranges = [(start, finish)]
+				entry = {'start': start, 'end': finish, 'settled': min(finish, lastFinal), 'frame': None}
+			else:
+				ranges = []
+				#the stored range is always kept contiguous, so gaps between it and the requested range are fetched too
+				if start < entry['start']:
+					ranges += [(start, entry['start'] - oneDay)]
+				if finish > entry['settled']:
+					ranges += [(max(entry['settled'] + oneDay, entry['start']), max(finish, entry['end']))]
+					entry['settled'] = min(max(finish, entry['end']), lastFinal)
+				entry['start'] = min(start, entry['start'])
+				entry['end'] = max(finish, entry['end'])
+
+			if len(ranges) > 0:
+				queries = [{'event': event, 
+							'startDt': rangeStart.strftime('%Y%m%d'), 
+							'finishDt': rangeFinish.strftime('%Y%m%d'),
+							'frequency': frequency,
+							'metric': metric,
+							'limit': limit,
+							'segment': segment,
+							'groupBy': groupBy,
+							'formula': formula} for rangeStart, rangeFinish in ranges]
+				frames = self.__getMany__('getEventSegmentation', queries)
+
+				stored = entry['frame']
+				if stored is not None:
+					#fetched ranges replace whatever was stored for them
+					for rangeStart, rangeFinish in ranges:
+						stored = stored[(stored.x.dt.date < rangeStart) | (stored.x.dt.date > rangeFinish)]
+					frames = [stored] + frames
+				frames = [frame for frame in frames if frame is not None]
+				entry['frame'] = self.__completeSeries__(pd.concat(frames, ignore_index = True), entry['start'], entry['end'])
+				store.save(key, entry)
+
+			result = entry['frame']
+			result = result[(result.x.dt.date >= start) & (result.x.dt.date <= finish)]
+			return self.__output__(result.reset_index(drop = True))
+
+	#fills days missing from some of the series with zeros and orders the frame by series, then by date
+	def __completeSeries__(self, frame, start, finish):
+		segments = pd.unique(frame.Segment)
+		days = pd.date_range(start, finish, freq = 'D')
+		grid = pd.MultiIndex.from_product([segments, days], names = ['Segment', 'x'])
+		dateType = frame.x.dtype
+		frame = frame.drop_duplicates(subset = ['Segment', 'x'], keep = 'last').set_index(['Segment', 'x'])
+		frame = frame.reindex(grid, fill_value = 0).reset_index()
+		frame.x = frame.x.astype(dateType)
+		return frame
+
+	def getEventUniquesIncremental(self, 
+								   store,
+								   event, 
+								   startDt, 
+								   finishDt, 
+								   segment = None, 
+								   groupBy = None,
+								   settleDays = AMPL_CACHE_SETTLE_DAYS):
+		with self.metrics.getter('getEventUniquesIncremental'):
+			return self.getEventSegmentationIncremental(store,
+														event, 
+														startDt, 
+														finishDt, 
+														segment = segment, 
+														groupBy = groupBy,
+														formula = AMPL_FORMULA_UNIQUES,
+														settleDays = settleDays)
+
+	def getEventTotalsIncremental(self, 
+								  store,
+								  event, 
+								  startDt, 
+								  finishDt, 
+								  segment = None, 
+								  groupBy = None,
+								  settleDays = AMPL_CACHE_SETTLE_DAYS):
+		with self.metrics.getter('getEventTotalsIncremental'):
+			return self.getEventSegmentationIncremental(store,
+														event, 
+														startDt, 
+														finishDt, 
+														segment = segment, 
+														groupBy = groupBy,
+														formula = AMPL_FORMULA_TOTALS,
+														settleDays = settleDays)
 
 	def getEventPropSum(self, event, startDt, finishDt, 
 						sumProperty, 							#property to be summed
@@ -785,18 +4067,25 @@ class amplitudeAPI:
 						segment = None, 
 						groupBy = None 							#groupby on global level
 						):
-		event.resetGroupBy()
-		event.groupBy(sumProperty[0], sumProperty[1])
-		if groupProperty is not None:
-			event.groupBy(groupProperty[0], groupProperty[1])
-
-		return self.getEventSegmentation(event, 
-										 startDt, 
-										 finishDt, 
-										 frequency = frequency,
-										 segment = segment, 
-										 groupBy = groupBy,
-										 formula = AMPL_FORMULA_PROPSUM)
+		url, parse = self.__eventPropSumRequest__(event, startDt, finishDt, sumProperty, groupProperty = groupProperty, frequency = frequency, segment = segment, groupBy = groupBy)
+		return self.__fetch__('getEventPropSum', url, parse)
+
+	def __eventPropSumRequest__(self, event, startDt, finishDt, 
+								sumProperty, 
+								groupProperty = None,
+								frequency = AMPL_FREQ_DAILY,
+								segment = None, 
+								groupBy = None):
+		#the caller's event is left untouched
+		event = event.withGroupBy([sumProperty] + ([groupProperty] if groupProperty is not None else []))
+
+		return self.__eventSegmentationRequest__(event, 
+												 startDt, 
+												 finishDt, 
+												 frequency = frequency,
+												 segment = segment, 
+												 groupBy = groupBy,
+												 formula = AMPL_FORMULA_PROPSUM)
 
 	def getEventFullData(self, event, startDt, finishDt, 
 						 frequency = AMPL_FREQ_DAILY,	
@@ -805,63 +4094,78 @@ class amplitudeAPI:
 						 segment = None, 
 						 groupBy = None):
 
-		result = None
+		with self.metrics.getter('getEventFullData'):
+			columns, requests = self.__eventFullDataRequests__(event, 
+																startDt, 
+																finishDt, 
+																frequency = frequency, 
+																sumProperty = sumProperty, 
+																groupProperty = groupProperty, 
+																segment = segment, 
+																groupBy = groupBy)
+			#all sub-queries are independent, so they are issued concurrently
+			bodies = self.queryMany([url for column, (url, parse) in requests])
+			if self.dtypes == AMPL_DTYPES_JSON:
+				return {column: body for (column, request), body in zip(requests, bodies)}
+			frames = [self.__build__(parse, body) for (column, (url, parse)), body in zip(requests, bodies)]
+
+			return self.__output__(self.__combineEventFullData__(columns, [column for column, request in requests], frames))
+
+	#returns the order of resulting columns and a list of (column, (url, parser)) pairs
+	def __eventFullDataRequests__(self, event, startDt, finishDt, 
+								  frequency = AMPL_FREQ_DAILY,	
+								  sumProperty = None, 
+								  groupProperty = None, 
+								  segment = None, 
+								  groupBy = None):
+
+		requests = []
 		returnColumnsOrder = ['Unique users', 'Total events']
 		if sumProperty is not None:
 			sumPropName = sumProperty[1]
 			returnColumnsOrder += [sumPropName]
 
-			result = self.getEventPropSum(event, 
-										  startDt, 
-										  finishDt, 
-										  sumProperty, 
-										  groupProperty = groupProperty,
-										  frequency = frequency,
-										  segment = segment, 
-										  groupBy = groupBy)
-
-			try:
-				result = result.rename(columns = {'y': sumPropName}).set_index(['Segment', 
-																				'x'])
-			except:
-				print(result)
-				raise
+			requests += [(sumPropName, self.__eventPropSumRequest__(event, 
+																	startDt, 
+																	finishDt, 
+																	sumProperty, 
+																	groupProperty = groupProperty,
+																	frequency = frequency,
+																	segment = segment, 
+																	groupBy = groupBy))]
 
 			#in this case we have to cancel all existing group by on event and replace it by
-			#additional group by from summation 
-			event.resetGroupBy()
-			if groupProperty is not None:
-				event.groupBy(groupProperty[0], groupProperty[1])			
-
-
-		dfUniques = self.getEventUniques(event, 
-										 startDt, 
-										 finishDt,
-										 frequency = frequency,
-										 segment = segment, 
-										 groupBy = groupBy)
-		if dfUniques is not None:
-			if len(dfUniques.index) > 0:
-				dfUniques = dfUniques.rename(columns = {'y': 'Unique users'}).set_index(['Segment', 'x'])
+			#additional group by from summation (on a copy, the caller's event is left untouched)
+			event = event.withGroupBy([groupProperty] if groupProperty is not None else [])
+
+		requests += [('Unique users', self.__eventUniquesRequest__(event, 
+																	startDt, 
+																	finishDt,
+																	frequency = frequency,
+																	segment = segment, 
+																	groupBy = groupBy))]
+		requests += [('Total events', self.__eventTotalsRequest__(event, 
+																   startDt, 
+																   finishDt,
+																   frequency = frequency,
+																   segment = segment, 
+																   groupBy = groupBy))]
+		return returnColumnsOrder, requests
+
+	def __combineEventFullData__(self, returnColumnsOrder, columns, frames):
+
+		result = None
+		for column, frame in zip(columns, frames):
+			if frame is not None:
+				if len(frame.index) > 0:
+					frame = frame.rename(columns = {'y': column}).set_index(['Segment', 'x'])
+
+			if result is not None:
+				result = result.join(frame)
+			else:
+				result = frame
 
 		if result is not None:
-			result = result.join(dfUniques)
-		else:
-			result = dfUniques
-
-		dfTotals = self.getEventTotals(event, 
-									   startDt, 
-									   finishDt,
-									   frequency = frequency,
-									   segment = segment, 
-									   groupBy = groupBy)
-		if dfTotals is not None:
-			if len(dfTotals.index) > 0:
-				dfTotals = dfTotals.rename(columns = {'y': 'Total events'}).set_index(['Segment', 'x'])
-
-		#result = result.join(dfTotals)
-		if result is not None:
-			result = result.join(dfTotals)	
 			return result[returnColumnsOrder].reset_index()
 		else:
 			return None
@@ -871,6 +4175,14 @@ class amplitudeAPI:
 							   finishDt, 
 							   segment = None, 
 							   groupBy = None):
+		url, parse = self.__sessionLengthDistroRequest__(startDt, finishDt, segment = segment, groupBy = groupBy)
+		return self.__fetch__('getSessionLengthDistro', url, parse)
+
+	def __sessionLengthDistroRequest__(self, 
+							   startDt, 
+							   finishDt, 
+							   segment = None, 
+							   groupBy = None):
 
 		startDt = startDt.replace('-', '')
 		finishDt = finishDt.replace('-', '')
@@ -886,23 +4198,22 @@ class amplitudeAPI:
 			groupBy = ''
 
 		#getting data from amplitude
-		url = 'https://amplitude.com/api/2/sessions/length?start={0}&end={1}{2}{3}'.format(startDt, finishDt, segment, groupBy)
+		url = self.apiUrl + '/api/2/sessions/length?start={0}&end={1}{2}{3}'.format(startDt, finishDt, segment, groupBy)
 		#print(url)
-		result = self.queryApi(url) 			
 
-		dfResult = []
-		#for each of the series
-		for seriesIndex, seriesName in enumerate(result['data']['seriesLabels']):
-			currentSeriesData = result['data']['series'][seriesIndex]   
+		return url, self.__parseSessionLengthDistro__
 
-			for xLabelIndex, xLabel in enumerate(result['data']['xValues']):
-				dfResult += [[seriesName, xLabel, currentSeriesData[xLabelIndex]]]
-				
-		dfResult = pd.DataFrame(dfResult, columns = ['Segment', 
-													 'Duration', 
-													 'Sessions']).groupby(['Segment', 
+	def __parseSessionLengthDistro__(self, result):
+
+		data = result['data']
+		dfResult = self.__seriesFrame__(data['seriesLabels'], 
+										data['xValues'], 
+										data['series'], 
+										['Segment', 
+										 'Duration', 
+										 'Sessions']).groupby(['Segment', 
 													 					   'Duration']).agg({'Sessions': 'max'})
-		dfResult['% of total'] = dfResult.groupby(level = 0).apply(lambda x: x / float(x.sum()))
+		dfResult['% of total'] = dfResult.Sessions / dfResult.groupby(level = 0).Sessions.transform('sum')
 		dfResult = dfResult.reset_index()
 
 		return dfResult
@@ -912,6 +4223,14 @@ class amplitudeAPI:
 							   finishDt, 
 							   segment = None, 
 							   groupBy = None):
+		url, parse = self.__sessionAvgLengthRequest__(startDt, finishDt, segment = segment, groupBy = groupBy)
+		return self.__fetch__('getSessionAvgLength', url, parse)
+
+	def __sessionAvgLengthRequest__(self, 
+							   startDt, 
+							   finishDt, 
+							   segment = None, 
+							   groupBy = None):
 
 		startDt = startDt.replace('-', '')
 		finishDt = finishDt.replace('-', '')
@@ -927,19 +4246,18 @@ class amplitudeAPI:
 			groupBy = ''
 
 		#getting data from amplitude
-		url = 'https://amplitude.com/api/2/sessions/average?start={0}&end={1}{2}{3}'.format(startDt, finishDt, segment, groupBy)
+		url = self.apiUrl + '/api/2/sessions/average?start={0}&end={1}{2}{3}'.format(startDt, finishDt, segment, groupBy)
 		#print(url)
-		result = self.queryApi(url) 	
 
-		dfResult = []
-		#for each of the series
-		for seriesIndex, seriesName in enumerate(result['data']['seriesLabels']):
-			currentSeriesData = result['data']['series'][seriesIndex]   
+		return url, self.__parseSessionAvgLength__
 
-			for xLabelIndex, xLabel in enumerate(result['data']['xValues']):
-				dfResult += [[seriesName, xLabel, currentSeriesData[xLabelIndex]]]
-				
-		dfResult = pd.DataFrame(dfResult, columns = ['Segment', 'Date', 'Avg session length [sec]'])
+	def __parseSessionAvgLength__(self, result):
+
+		data = result['data']
+		dfResult = self.__seriesFrame__(data['seriesLabels'], 
+										data['xValues'], 
+										data['series'], 
+										['Segment', 'Date', 'Avg session length [sec]'])
 
 		return dfResult
 
@@ -948,6 +4266,14 @@ class amplitudeAPI:
 							 finishDt, 
 							 segment = None, 
 							 groupBy = None):
+		url, parse = self.__sessionAvgPerUserRequest__(startDt, finishDt, segment = segment, groupBy = groupBy)
+		return self.__fetch__('getSessionAvgPerUser', url, parse)
+
+	def __sessionAvgPerUserRequest__(self, 
+							 startDt, 
+							 finishDt, 
+							 segment = None, 
+							 groupBy = None):
 
 		startDt = startDt.replace('-', '')
 		finishDt = finishDt.replace('-', '')
@@ -963,19 +4289,482 @@ class amplitudeAPI:
 			groupBy = ''
 
 		#getting data from amplitude
-		url = 'https://amplitude.com/api/2/sessions/peruser?start={0}&end={1}{2}{3}'.format(startDt, finishDt, segment, groupBy)
-		result = self.queryApi(url) 
+		url = self.apiUrl + '/api/2/sessions/peruser?start={0}&end={1}{2}{3}'.format(startDt, finishDt, segment, groupBy)
 
-		dfResult = []
-		#for each of the series
-		for seriesIndex, seriesName in enumerate(result['data']['seriesLabels']):
-			currentSeriesData = result['data']['series'][seriesIndex]   
+		return url, self.__parseSessionAvgPerUser__
 
-			for xLabelIndex, xLabel in enumerate(result['data']['xValues']):
-				dfResult += [[seriesName, xLabel, currentSeriesData[xLabelIndex]]]
-				
-		dfResult = pd.DataFrame(dfResult, columns = ['Segment', 
-													 'Date', 
-													 'Avg session per user'])
+	def __parseSessionAvgPerUser__(self, result):
+
+		data = result['data']
+		dfResult = self.__seriesFrame__(data['seriesLabels'], 
+										data['xValues'], 
+										data['series'], 
+										['Segment', 
+										 'Date', 
+										 'Avg session per user'])
+
+		return dfResult
+
+
+#drives pooled curl handles from an asyncio event loop
+#libcurl reports the sockets it waits for and its timeouts, the loop calls back when they are ready,
+#so any number of transfers are multiplexed without blocking the loop or spawning threads
+#the multi handle belongs to the loop it was created in, a client used from another loop (e.g. a second asyncio.run)
+#gets a new one and the transfers left in the old loop are dropped
+class amplitudeAsyncTransport:
+
+	def __init__(self, pool):
+		self.pool = pool
+		self.loop = None
+		self.multi = None
+		self.timer = None
+		self.transfers = {}
+
+	def __start__(self, loop):
+		self.close()
+		self.loop = loop
+		self.multi = pycurl.CurlMulti()
+		self.multi.setopt(pycurl.M_SOCKETFUNCTION, self.__onSocket__)
+		self.multi.setopt(pycurl.M_TIMERFUNCTION, self.__onTimer__)
+
+	async def fetch(self, url):
+		loop = asyncio.get_running_loop()
+		if self.multi is None or loop is not self.loop:
+			self.__start__(loop)
+
+		buffer = bytearray()
+		c = self.pool.acquire()
+		c.setopt(pycurl.URL, url)
+		c.setopt(pycurl.WRITEFUNCTION, buffer.extend)
+
+		future = self.loop.create_future()
+		self.transfers[c] = (future, buffer)
+		self.multi.add_handle(c)
+		try:
+			result = await future
+		except BaseException:
+			#cancelled or timed out while still in flight
+			if c in self.transfers:
+				del self.transfers[c]
+				self.multi.remove_handle(c)
+			self.pool.discard(c)
+			raise
+		self.pool.release(c)
+		return result
+
+	def __onSocket__(self, event, fd, multi, data):
+		if self.loop.is_closed(): return
+		self.loop.remove_reader(fd)
+		self.loop.remove_writer(fd)
+		if event in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+			self.loop.add_reader(fd, self.__onAction__, fd, pycurl.CSELECT_IN)
+		if event in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+			self.loop.add_writer(fd, self.__onAction__, fd, pycurl.CSELECT_OUT)
+
+	def __onTimer__(self, timeoutMs):
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		#libcurl also sets timers while handles are removed, possibly after the loop was closed
+		if timeoutMs >= 0 and not self.loop.is_closed():
+			self.timer = self.loop.call_later(timeoutMs / 1000.0, self.__onAction__, pycurl.SOCKET_TIMEOUT, 0)
+
+	def __onAction__(self, fd, mask):
+		while True:
+			ret, running = self.multi.socket_action(fd, mask)
+			if ret != pycurl.E_CALL_MULTI_PERFORM: break
+
+		while True:
+			queued, succeeded, failed = self.multi.info_read()
+			for c in succeeded:
+				self.__finish__(c, None)
+			for c, errno, message in failed:
+				self.__finish__(c, pycurl.error(errno, message))
+			if queued == 0: break
+
+	def __finish__(self, c, error):
+		future, buffer = self.transfers.pop(c)
+		status = c.getinfo(pycurl.RESPONSE_CODE)
+		transfer = self.pool.transferInfo(c)
+		self.multi.remove_handle(c)
+		if future.done(): return
+		if error is not None:
+			future.set_exception(error)
+		else:
+			future.set_result((status, buffer, transfer))
+
+	def close(self):
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		for c, (future, buffer) in list(self.transfers.items()):
+			self.multi.remove_handle(c)
+			#a cancelled fetch discards its handle itself, in a closed loop it never runs again
+			if future.get_loop().is_closed():
+				self.pool.discard(c)
+			else:
+				future.cancel()
+		self.transfers = {}
+		if self.multi is not None:
+			self.multi.close()
+			self.multi = None
+		self.loop = None
+
+#asyncio flavour of amplitudeAPI
+#getters are coroutines sharing url building and response parsing with amplitudeAPI,
+#at most maxConcurrency requests are in flight, every getter accepts an optional timeout in seconds
+#and can be cancelled like any other awaitable
+class amplitudeAsyncAPI(amplitudeAPI):
+
+	def __init__(self, 
+				 configFile,
+				 maxConcurrency = AMPL_MAX_IN_FLIGHT,
+				 poolSize = AMPL_POOL_SIZE,
+				 connectTimeout = AMPL_CONNECT_TIMEOUT,
+				 timeout = AMPL_TIMEOUT,
+				 cache = None,
+				 scheduler = None,
+				 dtypes = AMPL_DTYPES_DEFAULT,
+				 metrics = None,
+				 resultCache = None):
+
+		amplitudeAPI.__init__(self, 
+							  configFile, 
+							  poolSize = poolSize, 
+							  connectTimeout = connectTimeout, 
+							  timeout = timeout,
+							  cache = cache,
+							  scheduler = scheduler,
+							  dtypes = dtypes,
+							  metrics = metrics,
+							  resultCache = resultCache)
+
+		self.maxConcurrency = maxConcurrency
+		self.semaphore = None                  #created on first use inside every running loop
+		self.semaphoreLoop = None
+		self.transport = amplitudeAsyncTransport(self.pool)
+
+	def close(self):
+		self.transport.close()
+		amplitudeAPI.close(self)
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, excType, excValue, traceback):
+		self.close()
+
+	async def queryApiAsync(self, url, timeout = None):
+		body = self.__cacheGet__(url)
+		if body is not None:
+			return self.__cachedResponse__(url, body)
+
+		loop = asyncio.get_running_loop()
+		if self.semaphoreLoop is not loop:
+			self.semaphore = asyncio.Semaphore(self.maxConcurrency)
+			self.semaphoreLoop = loop
+
+		#timeout covers the whole call, including waiting for a slot and retries
+		status, body, transfer = await asyncio.wait_for(self.__performAsync__(url), timeout)
+		return self.__completeResponse__(url, status, body, transfer)
+
+	async def __performAsync__(self, url):
+		async with self.semaphore:
+			attempt = 0
+			while True:
+				queuedAt = time.monotonic()
+				while True:
+					delay = self.scheduler.tryAcquire()
+					if delay == 0: break
+					await asyncio.sleep(delay)
+				self.scheduler.recordWait(time.monotonic() - queuedAt)
+
+				started = time.monotonic()
+				try:
+					status, body, transfer = await self.transport.fetch(url)
+				except pycurl.error:
+					delay = self.scheduler.retryDelay(attempt, None)
+					if delay is None: raise
+					attempt += 1
+					await asyncio.sleep(delay)
+					continue
+				finally:
+					self.scheduler.release(time.monotonic() - started)
+
+				delay = self.scheduler.retryDelay(attempt, status, transfer['retryAfter'])
+				if delay is None: 
+					return status, body, transfer
+				self.__recordRequest__(url, status, body, transfer)
+				attempt += 1
+				await asyncio.sleep(delay)
+
+	async def __runAsync__(self, getterName, args, kwargs, timeout):
+		url, parse = getattr(self, AMPL_REQUEST_BUILDERS[getterName])(*args, **kwargs)
+		with self.metrics.getter(getterName):
+			key = self.__resultKey__(getterName, url, parse)
+			if self.resultCache is not None:
+				result = self.resultCache.get(key)
+				if result is not None: return result
+
+			result = self.__output__(self.__build__(parse, await self.queryApiAsync(url, timeout = timeout)))
+			if self.resultCache is not None:
+				self.resultCache.put(key, result)
+			return result
+
+	async def getEvents(self, timeout = None):
+		return await self.__runAsync__('getEvents', (), {}, timeout)
+
+	async def getDataFromExistingChart(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getDataFromExistingChart', args, kwargs, timeout)
+
+	async def getAnnotations(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getAnnotations', args, kwargs, timeout)
+
+	async def getUserActivity(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getUserActivity', args, kwargs, timeout)
+
+	async def getLTV(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getLTV', args, kwargs, timeout)
+
+	async def getRetention(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getRetention', args, kwargs, timeout)
+
+	async def getFunnel(self, *args, timeout = None, exhaustive = False, **kwargs):
+		self.__unsupported__('getFunnel with exhaustive = True', exhaustive)
+		return await self.__runAsync__('getFunnel', args, kwargs, timeout)
+
+	async def getEventSegmentation(self, *args, timeout = None, exhaustive = False, **kwargs):
+		self.__unsupported__('getEventSegmentation with exhaustive = True', exhaustive)
+		return await self.__runAsync__('getEventSegmentation', args, kwargs, timeout)
+
+	async def getEventUniques(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getEventUniques', args, kwargs, timeout)
+
+	async def getEventTotals(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getEventTotals', args, kwargs, timeout)
+
+	async def getEventPropSum(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getEventPropSum', args, kwargs, timeout)
+
+	async def getEventFullData(self, *args, timeout = None, **kwargs):
+		columns, requests = self.__eventFullDataRequests__(*args, **kwargs)
+		with self.metrics.getter('getEventFullData'):
+			bodies = await asyncio.gather(*[self.queryApiAsync(url, timeout = timeout) for column, (url, parse) in requests])
+			if self.dtypes == AMPL_DTYPES_JSON:
+				return {column: body for (column, request), body in zip(requests, bodies)}
+			frames = [self.__build__(parse, body) for (column, (url, parse)), body in zip(requests, bodies)]
+			return self.__output__(self.__combineEventFullData__(columns, [column for column, request in requests], frames))
+
+	async def getSessionLengthDistro(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getSessionLengthDistro', args, kwargs, timeout)
+
+	async def getSessionAvgLength(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getSessionAvgLength', args, kwargs, timeout)
+
+	async def getSessionAvgPerUser(self, *args, timeout = None, **kwargs):
+		return await self.__runAsync__('getSessionAvgPerUser', args, kwargs, timeout)
+
+	#at most maxInFlight of the queries are in flight, within the maxConcurrency limit of the client
+	#the getEventSegmentationMany, getLTVMany, etc. variants return this coroutine too
+	async def getMany(self, getterName, queries, concat = False, maxInFlight = AMPL_MAX_IN_FLIGHT, timeout = None):
+		with self.metrics.getter(getterName + 'Many'):
+			requests = [self.__buildRequest__(getterName, query) for query in queries]
+			bodies = await self.__queryAllAsync__([url for url, parse in requests], maxInFlight, timeout)
+			results = [self.__build__(parse, body) for (url, parse), body in zip(requests, bodies)]
+			if concat and self.dtypes != AMPL_DTYPES_JSON:
+				return self.__output__(self.__concatResults__(results))
+			return self.__output__(results)
+
+	async def runPlan(self, plan, maxInFlight = AMPL_MAX_IN_FLIGHT, timeout = None):
+		return self.__planResults__(plan, await self.__queryAllAsync__([url for url, members in plan.fetches], maxInFlight, timeout))
+
+	async def getPlanned(self, queries, maxInFlight = AMPL_MAX_IN_FLIGHT, timeout = None):
+		with self.metrics.getter('getPlanned'):
+			return self.__output__(await self.runPlan(self.planQueries(queries), maxInFlight = maxInFlight, timeout = timeout))
+
+	async def __queryAllAsync__(self, urls, maxInFlight, timeout):
+		slots = asyncio.Semaphore(maxInFlight)
+		async def query(url):
+			async with slots:
+				return await self.queryApiAsync(url, timeout = timeout)
+		return await asyncio.gather(*[query(url) for url in urls])
+
+	#an asynchronous iterator over the pages of a user's history, used with async for
+	async def iterUserActivity(self, 
+							   amplitudeUserId, 
+							   limit = 1000, 
+							   prefetch = 1,
+							   flatten = False,
+							   userProperties = None,
+							   eventProperties = None,
+							   categories = AMPL_USER_ACTIVITY_CATEGORIES,
+							   timeout = None):
+
+		async def getPage(offset):
+			page = await self.getUserActivity(amplitudeUserId, offset = offset, limit = limit, flatten = flatten, userProperties = userProperties, 
+											  eventProperties = eventProperties, categories = categories, timeout = timeout)
+			if self.dtypes == AMPL_DTYPES_JSON:
+				return page['userData'], page['events']
+			return page
+
+		pending = collections.deque()
+		def fetch(offset):
+			pending.append(asyncio.ensure_future(getPage(offset)))
+			return offset + limit
+
+		try:
+			offset = fetch(0)
+			while pending:
+				user, events = await pending.popleft()
+				if len(events) < limit:
+					yield user, events
+					return
+
+				while len(pending) < prefetch and not self.__lastActivityPage__(user, offset):
+					offset = fetch(offset)
+
+				yield user, events
+
+				if not pending:
+					if self.__lastActivityPage__(user, offset): return
+					offset = fetch(offset)
+		finally:
+			for task in pending:
+				task.cancel()
+
+	#helpers driving the synchronous getters from threads aren't available, use amplitudeAPI for them
+	def __unsupported__(self, name, used = True):
+		if used:
+			raise NotImplementedError('{0} is not supported by amplitudeAsyncAPI, use amplitudeAPI'.format(name))
+
+	def getSharded(self, *args, **kwargs):
+		self.__unsupported__('getSharded')
+
+	def getEventSegmentationFanOut(self, *args, **kwargs):
+		self.__unsupported__('getEventSegmentationFanOut')
+
+	def getEventSegmentationIncremental(self, *args, **kwargs):
+		self.__unsupported__('getEventSegmentationIncremental')
+
+	def getEventUniquesIncremental(self, *args, **kwargs):
+		self.__unsupported__('getEventUniquesIncremental')
+
+	def getEventTotalsIncremental(self, *args, **kwargs):
+		self.__unsupported__('getEventTotalsIncremental')
+
+	def exportEvents(self, *args, **kwargs):
+		self.__unsupported__('exportEvents')
+
+	def exportUserActivity(self, *args, **kwargs):
+		self.__unsupported__('exportUserActivity')
+
+#a pool of amplitudeAPI clients, one per Amplitude project, loaded from a single config file (or dict) like
+#{"apiUrl": "...", "rate": 2, "projects": {"app-us": {"apiKey": "...", "secretKey": "..."}, "app-eu": {..., "apiUrl": "..."}}}
+#top-level entries are defaults of every project, project entries override them; the entries of AMPL_PROJECT_SCHEDULER_SETTINGS
+#configure the project's own amplitudeScheduler, as Amplitude rate limits every project separately
+#run() calls a getter of all or selected projects concurrently, the clients share the response cache, the result cache and metrics
+class amplitudeProjectPool:
+
+	def __init__(self, 
+				 configFile,
+				 maxWorkers = AMPL_PROJECT_WORKERS,
+				 poolSize = AMPL_POOL_SIZE,
+				 connectTimeout = AMPL_CONNECT_TIMEOUT,
+				 timeout = AMPL_TIMEOUT,
+				 cache = None,
+				 dtypes = AMPL_DTYPES_DEFAULT,
+				 metrics = None,
+				 resultCache = None):
+
+		if isinstance(configFile, dict):
+			config = configFile
+		else:
+			with open(configFile, 'r') as f:
+				config = json.load(f)
+
+		defaults = {key: value for key, value in config.items() if key != 'projects'}
+		if len(config.get('projects', {})) == 0:
+			raise ValueError('No projects in the config')
+
+		if metrics is None:
+			metrics = amplitudeMetrics()
+		self.metrics = metrics
+		self.maxWorkers = maxWorkers
+		self.dtypes = dtypes
+
+		#project name -> amplitudeAPI, in config order
+		self.clients = {}
+		try:
+			for name, project in config['projects'].items():
+				settings = dict(defaults, **project)
+				scheduler = amplitudeScheduler(**{key: settings[key] for key in AMPL_PROJECT_SCHEDULER_SETTINGS if key in settings})
+				self.clients[name] = amplitudeAPI(settings,
+												  poolSize = poolSize,
+												  connectTimeout = connectTimeout,
+												  timeout = timeout,
+												  cache = cache,
+												  scheduler = scheduler,
+												  dtypes = dtypes,
+												  metrics = metrics,
+												  resultCache = resultCache)
+		except BaseException:
+			self.close()
+			raise
 
-		return dfResult		        	
\ No newline at end of file
+	@property
+	def projects(self):
+		return list(self.clients)
+
+	def __getitem__(self, project):
+		return self.clients[project]
+
+	def close(self):
+		for client in self.clients.values():
+			client.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	#calls getterName with the same arguments for every project of projects (all by default), at most maxWorkers calls at a time
+	#returns a single data frame with an extra 'project' column (a tuple of them for getters returning several frames) or,
+	#with concat = False, AMPL_DTYPES_JSON or results which aren't data frames, a dict of results by project;
+	#None when no project returned a frame
+	#a failing project raises its exception once all the calls are finished; when an errors dict is given
+	#failures are stored in it by project instead and the project is left out of the result
+	def run(self, getterName, *args, projects = None, concat = True, errors = None, **kwargs):
+		if projects is None:
+			projects = self.projects
+		unknown = [project for project in projects if project not in self.clients]
+		if len(unknown) > 0:
+			raise KeyError('Unknown projects {0}'.format(', '.join(unknown)))
+
+		def call(project):
+			return getattr(self.clients[project], getterName)(*args, **kwargs)
+
+		with self.metrics.getter(getterName + 'Projects'):
+			with concurrent.futures.ThreadPoolExecutor(max_workers = max(1, min(self.maxWorkers, len(projects)))) as executor:
+				futures = [executor.submit(contextvars.copy_context().run, call, project) for project in projects]
+				concurrent.futures.wait(futures)
+
+			results = {}
+			for project, future in zip(projects, futures):
+				try:
+					results[project] = future.result()
+				except Exception as error:
+					if errors is None: raise
+					errors[project] = error
+
+			if not concat or self.dtypes == AMPL_DTYPES_JSON:
+				return results
+			if not all(isinstance(result, (pd.DataFrame, tuple)) for result in results.values()):
+				return results
+			#the results already have the output dtypes of the clients
+			client = next(iter(self.clients.values()))
+			return client.__concatResults__(list(results.values()), 'project', list(results))
+
+	#scheduler statistics of every project (see amplitudeScheduler.stats)
+	def stats(self):
+		return {project: client.scheduler.stats() for project, client in self.clients.items()}
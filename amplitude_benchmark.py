@@ -0,0 +1,223 @@
+#!/usr/bin/python
+
+#benchmarks every amplitudeAPI getter against amplitude_mock_server.py for a range of payload sizes
+#for every getter and size it reports:
+#* latency of a complete call (median and 95th percentile) and throughput (calls and megabytes per second);
+#* response size, JSON decoding and parsing (building the data frames) time;
+#* peak memory allocated during a call (tracemalloc)
+#
+#   python amplitude_benchmark.py --sizes small medium --repeat 5 --csv results.csv
+#   python amplitude_benchmark.py --compare results.csv      #exits with 1 if any getter got slower than --tolerance
+#   python amplitude_benchmark.py --imports                  #exits with 1 if importing amplitude_API is over its time budget
+#
+#the mock server runs in a separate process, so its work isn't counted in the measurements
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+from datetime import datetime, timedelta
+
+from amplitude_API import *
+
+import numpy as np
+import pandas as pd
+
+#payload sizes: series (group by values) x days x ages, events of user histories
+AMPL_BENCHMARK_SIZES = {'small': {'series': 5, 'days': 30, 'ages': 15, 'events': 500},
+						'medium': {'series': 20, 'days': 90, 'ages': 30, 'events': 2000},
+						'large': {'series': 100, 'days': 180, 'ages': 90, 'events': 10000}}
+AMPL_BENCHMARK_REPEAT = 5
+AMPL_BENCHMARK_TOLERANCE = 0.2     #relative slowdown reported as a regression by --compare
+AMPL_BENCHMARK_START = '2024-01-01'
+AMPL_BENCHMARK_IMPORT_BUDGET_MS = 100                                   #cumulative import time of amplitude_API
+AMPL_BENCHMARK_IMPORT_LAZY = ['pandas', 'numpy', 'pycurl', 'asyncio']   #modules importing amplitude_API must not load
+
+#getter calls benchmarked for a size: (getterName, keyword arguments)
+def amplitudeBenchmarkCases(size):
+	start = AMPL_BENCHMARK_START
+	finish = (datetime.strptime(start, '%Y-%m-%d') + timedelta(days = size['days'] - 1)).strftime('%Y-%m-%d')
+	event = amplitudeEvent('Play Song or Video')
+	groupBy = amplitudeUserPropertyGroupBy(['country'])
+	funnel = [amplitudeEvent(name) for name in ['Welcome', 'User Sign Up', 'Play Song or Video']]
+	period = {'startDt': start, 'finishDt': finish, 'groupBy': groupBy}
+
+	return [('getEvents', {}),
+			('getDataFromExistingChart', {'dashboardId': 'abc123'}),
+			('getAnnotations', {}),
+			('getUserActivity', {'amplitudeUserId': 1, 'limit': size['events']}),
+			('getLTV', period),
+			('getRetention', period),
+			('getFunnel', dict(period, funnel = funnel)),
+			('getEventSegmentation', dict(period, event = event)),
+			('getEventUniques', dict(period, event = event)),
+			('getEventTotals', dict(period, event = event)),
+			('getEventPropSum', dict(period, event = event, sumProperty = ('event', 'price'))),
+			('getEventFullData', dict(period, event = event, sumProperty = ('event', 'price'))),
+			('getSessionLengthDistro', period),
+			('getSessionAvgLength', period),
+			('getSessionAvgPerUser', period)]
+
+#starts amplitude_mock_server.py in a separate process and waits until it accepts connections
+def amplitudeBenchmarkServer(size, latency = 0.0):
+	with socket.socket() as probe:
+		probe.bind(('127.0.0.1', 0))
+		port = probe.getsockname()[1]
+
+	script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'amplitude_mock_server.py')
+	process = subprocess.Popen([sys.executable, script,
+								'--port', str(port),
+								'--series', str(size['series']),
+								'--ages', str(size['ages']),
+								'--events', str(size['events']),
+								'--latency', str(latency)],
+							   stdout = subprocess.DEVNULL)
+	deadline = time.monotonic() + 30
+	while True:
+		try:
+			socket.create_connection(('127.0.0.1', port), timeout = 1).close()
+			break
+		except OSError:
+			if time.monotonic() > deadline or process.poll() is not None:
+				process.kill()
+				raise RuntimeError('mock server didn\'t start')
+			time.sleep(0.05)
+	return process, 'http://127.0.0.1:{0}'.format(port)
+
+#measurements of a single getter
+def amplitudeBenchmarkGetter(api, getterName, kwargs, repeat):
+	getter = getattr(api, getterName)
+	getter(**kwargs)                                        #warm up connections and imports
+
+	latencies = []
+	for attempt in range(repeat):
+		started = time.perf_counter()
+		getter(**kwargs)
+		latencies += [time.perf_counter() - started]
+
+	tracemalloc.start()
+	try:
+		getter(**kwargs)
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+
+	result = {'latency_ms': np.median(latencies) * 1000,
+			  'latency_p95_ms': np.percentile(latencies, 95) * 1000,
+			  'calls_per_s': repeat / sum(latencies),
+			  'peak_mb': peak / 1024 ** 2,
+			  'bytes': np.nan,
+			  'mb_per_s': np.nan,
+			  'decode_ms': np.nan,
+			  'parse_ms': np.nan}
+
+	#getters issuing a single request are also timed part by part
+	if getterName in AMPL_REQUEST_BUILDERS:
+		url, parse = api.__buildRequest__(getterName, kwargs)
+		status, body, transfer = api.__perform__(url)
+		decodes = []
+		parses = []
+		for attempt in range(repeat):
+			started = time.perf_counter()
+			response = json.loads(body)
+			decodes += [time.perf_counter() - started]
+			started = time.perf_counter()
+			parse(response)
+			parses += [time.perf_counter() - started]
+		result['bytes'] = len(body)
+		result['mb_per_s'] = len(body) / 1024 ** 2 * result['calls_per_s']
+		result['decode_ms'] = np.median(decodes) * 1000
+		result['parse_ms'] = np.median(parses) * 1000
+
+	return result
+
+#import time of amplitude_API in fresh interpreters (median of repeat runs, as reported by python -X importtime)
+#and the modules of AMPL_BENCHMARK_IMPORT_LAZY loaded by the import
+def amplitudeImportTime(repeat = AMPL_BENCHMARK_REPEAT):
+	directory = os.path.dirname(os.path.abspath(__file__))
+	code = 'import sys, amplitude_API; print(",".join(name for name in {0!r} if name in sys.modules))'.format(AMPL_BENCHMARK_IMPORT_LAZY)
+	times = []
+	for attempt in range(repeat + 1):
+		process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd = directory, capture_output = True, text = True, check = True)
+		for line in process.stderr.splitlines():
+			fields = [field.strip() for field in line.split('|')]
+			if len(fields) == 3 and fields[2] == 'amplitude_API':
+				times += [int(fields[1]) / 1000]
+	#the first run may compile the module
+	return {'import_ms': np.median(times[1:]), 'loaded': [name for name in process.stdout.strip().split(',') if name]}
+
+#runs every getter for every size, returns a data frame with a row per (size, getter)
+def amplitudeBenchmark(sizes = ('small', 'medium'), repeat = AMPL_BENCHMARK_REPEAT, getters = None, latency = 0.0, dtypes = AMPL_DTYPES_DEFAULT):
+	rows = []
+	for sizeName in sizes:
+		size = AMPL_BENCHMARK_SIZES[sizeName]
+		process, url = amplitudeBenchmarkServer(size, latency = latency)
+		configFile = tempfile.NamedTemporaryFile('w', suffix = '.json', delete = False)
+		try:
+			json.dump({'apiKey': 'benchmark', 'secretKey': 'benchmark', 'apiUrl': url}, configFile)
+			configFile.close()
+			with amplitudeAPI(configFile.name, dtypes = dtypes) as api:
+				for getterName, kwargs in amplitudeBenchmarkCases(size):
+					if getters is not None and getterName not in getters: continue
+					row = {'size': sizeName, 'getter': getterName}
+					row.update(amplitudeBenchmarkGetter(api, getterName, kwargs, repeat))
+					rows += [row]
+		finally:
+			os.remove(configFile.name)
+			process.terminate()
+			process.wait()
+
+	return pd.DataFrame(rows, columns = ['size', 'getter', 'latency_ms', 'latency_p95_ms', 'calls_per_s', 'bytes', 'mb_per_s', 'decode_ms', 'parse_ms', 'peak_mb'])
+
+#rows of results slower than baseline by more than tolerance (latency or parse time)
+def amplitudeBenchmarkRegressions(results, baseline, tolerance = AMPL_BENCHMARK_TOLERANCE):
+	merged = results.merge(baseline, on = ['size', 'getter'], suffixes = ('', '_baseline'))
+	slower = np.zeros(len(merged), dtype = bool)
+	for column in ['latency_ms', 'parse_ms']:
+		ratio = merged[column] / merged[column + '_baseline']
+		merged[column + '_ratio'] = ratio
+		slower |= (ratio > 1 + tolerance).to_numpy()
+	return merged.loc[slower, ['size', 'getter', 'latency_ms', 'latency_ms_baseline', 'latency_ms_ratio', 'parse_ms', 'parse_ms_baseline', 'parse_ms_ratio']]
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Benchmarks amplitudeAPI getters against a local mock server')
+	parser.add_argument('--sizes', nargs = '+', default = ['small', 'medium'], choices = list(AMPL_BENCHMARK_SIZES))
+	parser.add_argument('--getters', nargs = '+', default = None, help = 'getters to run, all by default')
+	parser.add_argument('--repeat', type = int, default = AMPL_BENCHMARK_REPEAT)
+	parser.add_argument('--latency', type = float, default = 0.0, help = 'seconds the mock server adds to every response')
+	parser.add_argument('--dtypes', default = AMPL_DTYPES_DEFAULT, choices = [AMPL_DTYPES_DEFAULT, AMPL_DTYPES_COMPACT, AMPL_DTYPES_ARROW])
+	parser.add_argument('--csv', default = None, help = 'file to save the results to')
+	parser.add_argument('--compare', default = None, help = 'results of an earlier run to compare with')
+	parser.add_argument('--tolerance', type = float, default = AMPL_BENCHMARK_TOLERANCE)
+	parser.add_argument('--imports', action = 'store_true', help = 'only check the import time of amplitude_API against --budget')
+	parser.add_argument('--budget', type = float, default = AMPL_BENCHMARK_IMPORT_BUDGET_MS, help = 'import time budget in milliseconds')
+	arguments = parser.parse_args()
+
+	if arguments.imports:
+		imports = amplitudeImportTime(arguments.repeat)
+		print('amplitude_API imports in {0:.1f} ms (budget {1:.0f} ms), loaded: {2}'.format(imports['import_ms'], arguments.budget, ', '.join(imports['loaded']) or 'nothing heavy'))
+		sys.exit(1 if imports['import_ms'] > arguments.budget or imports['loaded'] else 0)
+
+	results = amplitudeBenchmark(sizes = arguments.sizes,
+								 repeat = arguments.repeat,
+								 getters = arguments.getters,
+								 latency = arguments.latency,
+								 dtypes = arguments.dtypes)
+	with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{0:.2f}'.format):
+		print(results.to_string(index = False))
+	if arguments.csv is not None:
+		results.to_csv(arguments.csv, index = False)
+
+	if arguments.compare is not None:
+		regressions = amplitudeBenchmarkRegressions(results, pd.read_csv(arguments.compare), arguments.tolerance)
+		if len(regressions) > 0:
+			print('\nRegressions (more than {0:.0%} slower):'.format(arguments.tolerance))
+			print(regressions.to_string(index = False))
+			sys.exit(1)
+		print('\nNo regressions')
@@ -0,0 +1,465 @@
+#!/usr/bin/python
+
+#local stand-in for Amplitude's Dashboard REST API, serving synthetic responses of a configurable size
+#used by amplitude_benchmark.py, and handy for trying the library out without credentials:
+#
+#   python amplitude_mock_server.py --port 8080 --series 20 --ages 30 --events 1000
+#
+#with {"apiKey": "any", "secretKey": "any", "apiUrl": "http://127.0.0.1:8080"} in the config file
+#responses have the structure of the real ones, values are pseudo-random but the same for the same request
+
+import io
+import gzip
+import json
+import zlib
+import random
+import zipfile
+import argparse
+import threading
+import collections
+import time
+
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AMPL_MOCK_HOST = '127.0.0.1'
+AMPL_MOCK_PORT = 8080
+AMPL_MOCK_SERIES = 10              #series (group by values) of grouped responses
+AMPL_MOCK_AGES = 30                #ages (days since the cohort start) of retention and LTV responses
+AMPL_MOCK_EVENTS = 1000            #events in the history of every user
+AMPL_MOCK_EXPORT_EVENTS = 20       #events of every hour of an export archive, 0 - exports answer 404 (no data)
+AMPL_MOCK_PROJECT_ID = 187520      #project id naming the files of export archives
+AMPL_MOCK_LATENCY = 0.0            #seconds added to every response
+
+#session length buckets of sessions/length
+AMPL_MOCK_SESSION_BUCKETS = ['0s-3s', '3s-10s', '10s-30s', '30s-1m', '1m-3m', '3m-10m', '10m-30m', '30m-1h', '1h-3h', '3h-24h', '24h+']
+
+#x values of a response of frequency i between start and end (YYYYMMDD)
+def amplitudeMockBuckets(start, end, frequency):
+	start = datetime.strptime(start, '%Y%m%d')
+	end = datetime.strptime(end, '%Y%m%d')
+	buckets = []
+	if frequency in (-3600000, -300000):
+		current = start
+		while current < end + timedelta(days = 1):
+			buckets += [current.strftime('%Y-%m-%dT%H:%M:%S')]
+			current += timedelta(hours = 1) if frequency == -3600000 else timedelta(minutes = 5)
+	elif frequency == 7:
+		current = start - timedelta(days = (start.weekday() + 1) % 7)            #weeks start on Sunday
+		while current <= end:
+			buckets += [current.strftime('%Y-%m-%d')]
+			current += timedelta(days = 7)
+	elif frequency == 30:
+		current = start.replace(day = 1)
+		while current <= end:
+			buckets += [current.strftime('%Y-%m-%d')]
+			current = (current + timedelta(days = 32)).replace(day = 1)
+	else:
+		current = start
+		while current <= end:
+			buckets += [current.strftime('%Y-%m-%d')]
+			current += timedelta(days = 1)
+	return buckets
+
+class amplitudeMockHandler(BaseHTTPRequestHandler):
+
+	protocol_version = 'HTTP/1.1'          #keep-alive, as Amplitude
+	disable_nagle_algorithm = True         #headers and body are written separately, Nagle would delay the body by ~40ms
+
+	def do_GET(self):
+		mock = self.server.mock
+		if mock.latency > 0: time.sleep(mock.latency)
+
+		headers = {}
+		failure = mock.nextFailure()
+		if failure == 'reset':
+			mock.record(0)
+			self.close_connection = True
+			return
+		elif failure is not None:
+			status, headers = failure if isinstance(failure, tuple) else (failure, {})
+			result = {'error': 'Mock failure {0}'.format(status)}
+		else:
+			status, result = mock.respond(self.path)
+
+		#export archives are served as they are
+		if isinstance(result, bytes):
+			body, contentType = result, 'application/zip'
+		else:
+			body, contentType = json.dumps(result, separators = (',', ':')).encode('utf-8'), 'application/json'
+		mock.record(len(body))
+
+		self.send_response(status)
+		self.send_header('Content-Type', contentType)
+		self.send_header('Content-Length', str(len(body)))
+		for name, value in headers.items():
+			self.send_header(name, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+class amplitudeMockServer:
+
+	def __init__(self,
+				 port = 0,                                 #0 - any free port
+				 series = AMPL_MOCK_SERIES,
+				 ages = AMPL_MOCK_AGES,
+				 events = AMPL_MOCK_EVENTS,
+				 latency = AMPL_MOCK_LATENCY,
+				 seed = 0,
+				 host = AMPL_MOCK_HOST,
+				 exportEvents = AMPL_MOCK_EXPORT_EVENTS,
+				 noneValue = False):
+		self.series = series
+		self.noneValue = noneValue
+		self.ages = ages
+		self.events = events
+		self.exportEvents = exportEvents
+		self.latency = latency
+		self.seed = seed
+		self.lock = threading.Lock()
+		self.requests = 0
+		self.bytesSent = 0
+		self.failures = collections.deque()
+
+		self.server = ThreadingHTTPServer((host, port), amplitudeMockHandler)
+		self.server.daemon_threads = True
+		self.server.mock = self
+		self.thread = None
+
+	@property
+	def url(self):
+		host, port = self.server.server_address[:2]
+		return 'http://{0}:{1}'.format(host, port)
+
+	def start(self):
+		self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+		self.thread.start()
+		return self
+
+	def serve(self):
+		self.server.serve_forever()
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, excType, excValue, traceback):
+		self.stop()
+
+	def record(self, size):
+		with self.lock:
+			self.requests += 1
+			self.bytesSent += size
+
+	def stats(self):
+		with self.lock:
+			return {'requests': self.requests, 'bytesSent': self.bytesSent}
+
+	#the next requests fail, one per failure: an HTTP status, a (status, headers) pair (e.g. (429, {'Retry-After': '2'}))
+	#or 'reset' - the connection is closed without a response
+	def fail(self, *failures):
+		with self.lock:
+			self.failures.extend(failures)
+
+	def nextFailure(self):
+		with self.lock:
+			return self.failures.popleft() if self.failures else None
+
+	#(status, JSON response) for a request path, the response of export requests is the zip archive (bytes)
+	def respond(self, path):
+		parts = urlsplit(path)
+		query = parse_qs(parts.query)
+		#values depend on the request only, so repeated requests get the same response
+		rng = random.Random(zlib.crc32(path.encode('utf-8')) ^ self.seed)
+
+		endpoint = parts.path.rstrip('/')
+		if endpoint == '/api/2/events/list': return 200, self.__eventsList__(rng)
+		if endpoint == '/api/2/events/segmentation': return 200, self.__segmentation__(query, rng)
+		if endpoint == '/api/2/funnels': return 200, self.__funnels__(query, rng)
+		if endpoint == '/api/2/retention': return 200, self.__retention__(query, rng)
+		if endpoint == '/api/2/revenue/ltv': return 200, self.__ltv__(query, rng)
+		if endpoint == '/api/2/useractivity': return 200, self.__userActivity__(query, rng)
+		if endpoint == '/api/2/sessions/length': return 200, self.__sessionLength__(query, rng)
+		if endpoint in ('/api/2/sessions/average', '/api/2/sessions/peruser'): return 200, self.__sessionAverage__(query, rng, endpoint.endswith('peruser'))
+		if endpoint == '/api/2/annotations': return 200, self.__annotations__(rng)
+		if endpoint == '/api/2/export':
+			if self.exportEvents <= 0: return 404, {'error': 'Raw data files were not found.'}
+			return 200, self.exportArchive(query['start'][0], query['end'][0])
+		if endpoint.startswith('/api/3/chart/') and endpoint.endswith('/query'): return 200, self.__chart__(rng)
+		return 404, {'error': 'Unknown endpoint {0}'.format(parts.path)}
+
+	#labels of a response grouped by dimensions properties, a list of values per series
+	#every property has self.series values, '<property> <index>', series combine the values of the same index;
+	#'is' and 'is not' conditions on the grouped properties (event filters and segment conditions) drop series
+	#and only the first limit ones are returned, like the top values of a real response
+	#with noneValue users without the property form the first series, labelled '(none)', which 'is not' can't exclude
+	def __labels__(self, query, dimensions, limit = None):
+		if len(dimensions) == 0: return [['(none)']]
+
+		conditions = [(condition['prop'], condition['op'], condition['values']) for condition in json.loads(query.get('s', ['[]'])[0])]
+		for event in query.get('e', [])[:1]:
+			conditions += [(condition['subprop_key'], condition['subprop_op'], condition['subprop_value']) for condition in json.loads(event).get('filters', [])]
+
+		def allowed(dimension, value):
+			for name, operator, values in conditions:
+				if name != dimension: continue
+				if operator == 'is' and value not in values: return False
+				if operator == 'is not' and value in values and value != '(none)': return False
+			return True
+
+		labels = [['(none)'] * len(dimensions)] if self.noneValue else []
+		labels += [['{0} {1}'.format(dimension.replace('gp:', ''), index) for dimension in dimensions] for index in range(self.series)]
+		labels = [label for label in labels if all(allowed(dimension, value) for dimension, value in zip(dimensions, label))]
+		return labels if limit is None else labels[:limit]
+
+	#start, end and the date range between them of a request
+	@staticmethod
+	def __range__(query):
+		start = datetime.strptime(query['start'][0], '%Y%m%d')
+		end = datetime.strptime(query['end'][0], '%Y%m%d')
+		return start, end, [start + timedelta(days = offset) for offset in range((end - start).days + 1)]
+
+	def __eventsList__(self, rng):
+		return {'data': [{'name': 'Event {0}'.format(index),
+						  'value': 'Event {0}'.format(index),
+						  'totals': rng.randint(0, 10 ** 6),
+						  'hidden': False,
+						  'deleted': False,
+						  'non_active': False,
+						  'flow_hidden': False} for index in range(self.series * 10)]}
+
+	def __segmentation__(self, query, rng):
+		event = json.loads(query['e'][0])
+		dimensions = [groupBy['value'] for groupBy in event.get('group_by', [])] + query.get('g', [])
+		labels = self.__labels__(query, dimensions, int(query.get('limit', ['1000'])[0]))
+		xValues = amplitudeMockBuckets(query['start'][0], query['end'][0], int(query.get('i', ['1'])[0]))
+
+		seriesLabels = []
+		series = []
+		for label in labels:
+			seriesLabels += [label]
+			scale = rng.randint(10, 10 ** 5)
+			series += [[rng.randint(0, scale) for x in xValues]]
+
+		return {'novaCost': len(series),
+				'data': {'series': series,
+						 'seriesLabels': seriesLabels,
+						 'seriesCollapsed': [[{'setId': '', 'value': sum(values)}] for values in series],
+						 'xValues': xValues}}
+
+	def __funnels__(self, query, rng):
+		steps = [json.loads(event)['event_type'] for event in query.get('e', [])]
+		labels = self.__labels__(query, query.get('g', []), int(query.get('limit', ['1000'])[0]))
+
+		data = []
+		for label in labels:
+			users = [rng.randint(10 ** 3, 10 ** 5)]
+			for step in steps[1:]:
+				users += [int(users[-1] * rng.uniform(0.2, 0.9))]
+			data += [{'groupValue': ', '.join(label),
+					  'events': steps,
+					  'cumulativeRaw': users,
+					  'cumulative': [count / users[0] for count in users],
+					  'stepByStep': [1.0] + [count / previous for previous, count in zip(users, users[1:])],
+					  'avgTransTimes': [0] + [rng.randint(10 ** 3, 10 ** 7) for step in steps[1:]],
+					  'medianTransTimes': [0] + [rng.randint(10 ** 3, 10 ** 7) for step in steps[1:]]}]
+		return {'novaCost': len(data), 'data': data}
+
+	#a cell per age (0 - the cohort itself) up to self.ages, cells after the end of the range are incomplete
+	def __retention__(self, query, rng):
+		start, end, days = self.__range__(query)
+		labels = [', '.join(label) for label in self.__labels__(query, query.get('g', []))]
+
+		series = []
+		for label in labels:
+			values = {}
+			for day in days:
+				size = rng.randint(100, 10 ** 4)
+				values[day.strftime('%Y-%m-%d')] = [{'count': size if age == 0 else int(size * rng.uniform(0, 0.5) / age),
+													 'outof': size,
+													 'incomplete': day + timedelta(days = age) > end} for age in range(self.ages + 1)]
+			combined = [{'count': sum(values[day][age]['count'] for day in values),
+						 'outof': sum(values[day][age]['outof'] for day in values),
+						 'incomplete': age > len(days) - 1} for age in range(self.ages + 1)]
+			series += [{'values': values, 'combined': combined}]
+		return {'data': {'seriesLabels': labels, 'series': series}}
+
+	def __ltv__(self, query, rng):
+		start, end, days = self.__range__(query)
+		labels = [', '.join(label) for label in self.__labels__(query, query.get('g', []))]
+		ages = range(1, self.ages + 1)
+
+		series = []
+		for label in labels:
+			values = {}
+			complete = {}
+			for day in days:
+				key = day.strftime('%Y-%m-%d')
+				row = {'count': rng.randint(100, 10 ** 4), 'paid': rng.randint(0, 100), 'total_amount': 0.0}
+				spend = 0.0
+				payers = 0
+				for age in ages:
+					spend += rng.uniform(0, 2)
+					row['r{0}d'.format(age)] = round(spend, 2)
+					row['r{0}new'.format(age)] = rng.randint(0, 5)
+					payers += row['r{0}new'.format(age)]
+				row['total_amount'] = round(spend * row['paid'], 2)
+				#revenue per user and new payers over the whole lifetime of the cohort
+				row['rtotal'] = row['r{0}d'.format(self.ages)] if self.ages > 0 else 0.0
+				row['rtotalnew'] = payers
+				values[key] = row
+				complete[key] = {'r{0}d'.format(age): day + timedelta(days = age) <= end for age in ages}
+			combined = {key: sum(row[key] for row in values.values()) for key in ['count', 'paid', 'total_amount', 'rtotalnew']}
+			combined['rtotal'] = round(sum(row['rtotal'] for row in values.values()) / len(values), 2)
+			combined.update({'r{0}d'.format(age): round(sum(row['r{0}d'.format(age)] for row in values.values()) / len(values), 2) for age in ages})
+			combined.update({'r{0}new'.format(age): sum(row['r{0}new'.format(age)] for row in values.values()) for age in ages})
+			series += [{'values': values,
+						'complete': complete,
+						'combined': combined,
+						'combined_complete': {'r{0}d'.format(age): age <= len(days) - 1 for age in ages}}]
+		return {'data': {'seriesLabels': labels, 'series': series}}
+
+	def __userActivity__(self, query, rng):
+		user = int(query['user'][0]) if query['user'][0].isdigit() else zlib.crc32(query['user'][0].encode('utf-8'))
+		offset = int(query.get('offset', ['0'])[0])
+		limit = int(query.get('limit', ['1000'])[0])
+		started = datetime(2024, 1, 1)
+
+		events = []
+		for index in range(offset, min(self.events, offset + limit)):
+			events += [{'user_id': 'user{0}'.format(user),
+						'event_type': 'Event {0}'.format(index % 10),
+						'event_id': index,
+						'server_received_time': (started + timedelta(seconds = 37 * index)).strftime('%Y-%m-%d %H:%M:%S.%f'),
+						'session_id': 1704067200000 + 3600000 * (index // 50),
+						'platform': ['iOS', 'Android', 'Web'][index % 3],
+						'country': ['United States', 'Germany', 'Japan', 'Brazil'][index % 4],
+						'os_name': 'ios',
+						'version_name': '1.{0}'.format(index % 5),
+						'user_properties': {'tier': ['free', 'premium'][index % 2], 'level': index % 40},
+						'event_properties': {'source': 'mock', 'price': round(rng.uniform(0, 10), 2)}}]
+		return {'userData': {'canonical_amplitude_id': user,
+							 'user_id': 'user{0}'.format(user),
+							 'num_events': self.events,
+							 'num_sessions': self.events // 50 + 1,
+							 'paying': 'true',
+							 'platform': 'iOS',
+							 'properties': {'tier': 'premium'}},
+				'events': events}
+
+	def __sessionLength__(self, query, rng):
+		labels = [', '.join(label) for label in self.__labels__(query, query.get('g', []))]
+		return {'data': {'seriesLabels': labels,
+						 'xValues': AMPL_MOCK_SESSION_BUCKETS,
+						 'series': [[rng.randint(0, 10 ** 5) for bucket in AMPL_MOCK_SESSION_BUCKETS] for label in labels]}}
+
+	def __sessionAverage__(self, query, rng, perUser):
+		start, end, days = self.__range__(query)
+		labels = [', '.join(label) for label in self.__labels__(query, query.get('g', []))]
+		return {'data': {'seriesLabels': labels,
+						 'xValues': [day.strftime('%Y-%m-%d') for day in days],
+						 'series': [[round(rng.uniform(1, 5) if perUser else rng.uniform(30, 1800), 2) for day in days] for label in labels]}}
+
+	#events uploaded in an hour (YYYYMMDDTHH) of an export archive
+	def exportHour(self, hour):
+		started = datetime.strptime(hour, '%Y%m%dT%H')
+		rng = random.Random(zlib.crc32(hour.encode('utf-8')) ^ self.seed)
+		events = []
+		for index in range(self.exportEvents):
+			timestamp = (started + timedelta(seconds = 3600 * index // self.exportEvents)).strftime('%Y-%m-%d %H:%M:%S.%f')
+			user = rng.randint(1, 100)
+			events += [{'$insert_id': '{0}-{1}'.format(hour, index),
+						'$schema': 12,
+						'amplitude_id': 10 ** 9 + user,
+						'app': AMPL_MOCK_PROJECT_ID,
+						'city': rng.choice(['Berlin', 'Tokyo', None]),
+						'client_event_time': timestamp,
+						'country': rng.choice(['Germany', 'Japan', 'United States']),
+						'data': {'path': '/batch'},
+						'device_id': 'device{0}'.format(user),
+						'event_id': index,
+						'event_properties': {'price': round(rng.uniform(0, 10), 2)} if index % 2 else {},
+						'event_time': timestamp,
+						'event_type': 'Event {0}'.format(index % 5),
+						'groups': {},
+						'is_attribution_event': False,
+						'location_lat': None,
+						'location_lng': None,
+						'os_name': 'ios',
+						'paying': None,
+						'platform': 'iOS',
+						'sample_rate': None,
+						'server_received_time': timestamp,
+						'server_upload_time': timestamp,
+						'session_id': 1704067200000 + 3600000 * index,
+						'user_id': 'user{0}'.format(user),
+						'user_properties': {'tier': rng.choice(['free', 'premium'])},
+						'uuid': '{0:08x}-0000-0000-0000-{1:012x}'.format(zlib.crc32(hour.encode('utf-8')), index),
+						'version_name': '1.{0}'.format(index % 3)}]
+		return events
+
+	#a zip archive of the hours between start and end (YYYYMMDDTHH) in the layout of the Export API:
+	#a gzipped NDJSON file per hour, named <project id>/<project id>_<date>_<hour>#0.json.gz
+	def exportArchive(self, start, end):
+		current = datetime.strptime(start, '%Y%m%dT%H')
+		end = datetime.strptime(end, '%Y%m%dT%H')
+		archive = io.BytesIO()
+		with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as files:
+			while current <= end:
+				hour = current.strftime('%Y%m%dT%H')
+				lines = ''.join(json.dumps(event) + '\n' for event in self.exportHour(hour))
+				name = '{0}/{0}_{1}_{2}#0.json.gz'.format(AMPL_MOCK_PROJECT_ID, current.strftime('%Y-%m-%d'), current.hour)
+				files.writestr(name, gzip.compress(lines.encode('utf-8'), mtime = 0))
+				current += timedelta(hours = 1)
+		return archive.getvalue()
+
+	def __annotations__(self, rng):
+		started = datetime(2020, 1, 1)
+		return {'data': [{'id': index,
+						  'date': (started + timedelta(days = 14 * index)).strftime('%Y-%m-%d'),
+						  'label': '{0}.{1}'.format(index // 10 + 1, index % 10) if index % 3 else '{0}.{1}.1'.format(index // 10 + 1, index % 10),
+						  'details': 'Release {0}'.format(index)} for index in range(self.series * 5)]}
+
+	def __chart__(self, rng):
+		days = amplitudeMockBuckets('20240101', '20240130', 1)
+		labels = ['Series {0}'.format(index) for index in range(self.series)]
+		return {'data': {'seriesLabels': labels,
+						 'xValues': days,
+						 'series': [[{'value': rng.randint(0, 10 ** 5)} for day in days] for label in labels]}}
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Local stand-in for Amplitude\'s Dashboard REST API')
+	parser.add_argument('--host', default = AMPL_MOCK_HOST)
+	parser.add_argument('--port', type = int, default = AMPL_MOCK_PORT)
+	parser.add_argument('--series', type = int, default = AMPL_MOCK_SERIES, help = 'series of grouped responses')
+	parser.add_argument('--ages', type = int, default = AMPL_MOCK_AGES, help = 'ages of retention and LTV responses')
+	parser.add_argument('--events', type = int, default = AMPL_MOCK_EVENTS, help = 'events in every user history')
+	parser.add_argument('--export-events', type = int, default = AMPL_MOCK_EXPORT_EVENTS, help = 'events of every hour of an export, 0 for no data')
+	parser.add_argument('--latency', type = float, default = AMPL_MOCK_LATENCY, help = 'seconds added to every response')
+	parser.add_argument('--none-value', action = 'store_true', help = 'grouped responses start with a (none) series')
+	parser.add_argument('--seed', type = int, default = 0)
+	arguments = parser.parse_args()
+
+	mock = amplitudeMockServer(port = arguments.port,
+							   series = arguments.series,
+							   ages = arguments.ages,
+							   events = arguments.events,
+							   latency = arguments.latency,
+							   seed = arguments.seed,
+							   host = arguments.host,
+							   exportEvents = arguments.export_events,
+							   noneValue = arguments.none_value)
+	print('Serving on {0}'.format(mock.url), flush = True)
+	try:
+		mock.serve()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		mock.server.server_close()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amplitude_API import *
+from amplitude_mock_server import amplitudeMockServer
+
+#a mock server shared by the tests of a module
+@pytest.fixture(scope = 'module')
+def mock():
+	with amplitudeMockServer(series = 10, ages = 5, events = 250) as server:
+		yield server
+
+#a client of the mock server
+@pytest.fixture
+def amplitude(mock):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}) as client:
+		yield client
+
+#a client which never goes to the network
+@pytest.fixture
+def offline():
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': 'http://127.0.0.1:1'}) as client:
+		yield client
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from amplitude_API import *
+
+@pytest.fixture
+def client(mock):
+	with amplitudeAsyncAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}) as amplitude:
+		yield amplitude
+
+event = amplitudeFrozenEvent('Play')
+
+def test_results_match_the_sync_client(client, amplitude):
+	frame = asyncio.run(client.getEventUniques(event, '2024-01-01', '2024-01-03'))
+	assert frame.equals(amplitude.getEventUniques(event, '2024-01-01', '2024-01-03'))
+
+def test_client_runs_in_consecutive_loops(client, capsys):
+	async def fetch():
+		return await asyncio.gather(*[client.getEventUniques(event, '2024-01-0{0}'.format(day), '2024-01-09') for day in range(1, 4)])
+
+	first = asyncio.run(fetch())
+	second = asyncio.run(fetch())
+	assert all(a.equals(b) for a, b in zip(first, second))
+	assert 'Event loop is closed' not in capsys.readouterr().err
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_user_activity_pages(client, amplitude, prefetch):
+	async def pages():
+		return [events for user, events in [page async for page in client.iterUserActivity(1, limit = 100, prefetch = prefetch)]]
+
+	assert [len(events) for events in asyncio.run(pages())] == [100, 100, 50]
+	assert [len(events) for user, events in amplitude.iterUserActivity(1, limit = 100)] == [100, 100, 50]
+
+def test_many_and_planned_queries(client, amplitude):
+	queries = [(event, '2024-01-01', '2024-01-03'), (event, '2024-01-02', '2024-01-05')]
+	frames = asyncio.run(client.getEventUniquesMany(queries, maxInFlight = 1))
+	assert all(a.equals(b) for a, b in zip(frames, amplitude.getEventUniquesMany(queries)))
+
+	specs = [amplitudeRequestSpec('getEventUniques', query) for query in queries]
+	frames = asyncio.run(client.getPlanned(specs))
+	assert all(a.equals(b) for a, b in zip(frames, amplitude.getPlanned(specs)))
+
+def test_helpers_of_the_sync_client_are_rejected(client, tmp_path):
+	with pytest.raises(NotImplementedError):
+		asyncio.run(client.getEventSegmentation(event, '2024-01-01', '2024-01-03', exhaustive = True))
+	with pytest.raises(NotImplementedError):
+		client.getSharded('getEventUniques', '2024-01-01', '2024-01-03', event = event)
+	with pytest.raises(NotImplementedError):
+		client.getEventUniquesIncremental(amplitudeSegmentationStore(str(tmp_path)), event, '2024-01-01', '2024-01-03')
+
+	frame = asyncio.run(client.getEventSegmentation(event, '2024-01-01', '2024-01-03', exhaustive = False))
+	assert len(frame) > 0
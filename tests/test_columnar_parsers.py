@@ -0,0 +1,49 @@
+import json
+from urllib.request import urlopen
+
+import pandas as pd
+import pytest
+
+from amplitude_API import *
+
+#the row by row parsers the columnar ones replaced
+def rows(result, columns):
+	data = result['data']
+	return pd.DataFrame([[label, x, series[index]] for label, series in zip(data['seriesLabels'], data['series']) for index, x in enumerate(data['xValues'])], 
+						columns = columns)
+
+def segmentation(result):
+	frame = rows(result, ['Segment', 'x', 'y'])
+	frame.Segment = frame.apply(lambda row: ', '.join(row.Segment) if isinstance(row.Segment, list) else str(row.Segment), axis = 1)
+	frame.x = pd.to_datetime(frame.x)
+	return frame
+
+def sessionLength(result):
+	frame = rows(result, ['Segment', 'Duration', 'Sessions']).groupby(['Segment', 'Duration']).agg({'Sessions': 'max'})
+	frame['% of total'] = frame.Sessions / frame.groupby(level = 0).Sessions.transform('sum')
+	return frame.reset_index()
+
+def response(url):
+	with urlopen(url) as body:
+		return json.loads(body.read())
+
+@pytest.mark.parametrize('groupBy', [None, amplitudeUserPropertyGroupBy(['tier']), amplitudeUserPropertyGroupBy(['tier', 'country'])])
+@pytest.mark.parametrize('frequency', [AMPL_FREQ_DAILY, AMPL_FREQ_HOURLY])
+def test_segmentation_matches_the_row_parser(amplitude, groupBy, frequency):
+	event = amplitudeFrozenEvent('Play').groupBy('event', 'source')
+	url, parse = amplitude.__eventSegmentationRequest__(event, '2024-01-01', '2024-01-03', frequency = frequency, groupBy = groupBy)
+	pd.testing.assert_frame_equal(amplitude.getEventSegmentation(event, '2024-01-01', '2024-01-03', frequency = frequency, groupBy = groupBy), 
+								  segmentation(response(url)))
+
+def test_sessions_match_the_row_parser(amplitude):
+	groupBy = amplitudeUserPropertyGroupBy(['tier'])
+	url, parse = amplitude.__sessionLengthDistroRequest__('2024-01-01', '2024-01-03', groupBy = groupBy)
+	pd.testing.assert_frame_equal(amplitude.getSessionLengthDistro('2024-01-01', '2024-01-03', groupBy = groupBy), sessionLength(response(url)))
+
+	url, parse = amplitude.__sessionAvgLengthRequest__('2024-01-01', '2024-01-03', groupBy = groupBy)
+	pd.testing.assert_frame_equal(amplitude.getSessionAvgLength('2024-01-01', '2024-01-03', groupBy = groupBy), 
+								  rows(response(url), ['Segment', 'Date', 'Avg session length [sec]']))
+
+	url, parse = amplitude.__sessionAvgPerUserRequest__('2024-01-01', '2024-01-03', groupBy = groupBy)
+	pd.testing.assert_frame_equal(amplitude.getSessionAvgPerUser('2024-01-01', '2024-01-03', groupBy = groupBy), 
+								  rows(response(url), ['Segment', 'Date', 'Avg session per user']))
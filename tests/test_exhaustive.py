@@ -0,0 +1,31 @@
+import pytest
+
+from amplitude_API import *
+from amplitude_mock_server import amplitudeMockServer
+
+@pytest.fixture(scope = 'module')
+def client():
+	with amplitudeMockServer(series = 30, noneValue = True) as mock:
+		with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}) as amplitude:
+			yield amplitude
+
+values = ['(none)'] + ['tier {0}'.format(index) for index in range(30)]
+
+def test_segmentation_rounds_add_each_value_once(client):
+	frame = client.getEventSegmentation(amplitudeFrozenEvent('Play'), '2024-01-01', '2024-01-02', 
+										groupBy = amplitudeUserPropertyGroupBy(['tier']), limit = 10, exhaustive = True)
+	assert not frame.duplicated(['Segment', 'x']).any()
+	assert sorted(frame.Segment.unique()) == sorted(values)
+	assert len(frame) == len(values) * 2
+
+def test_funnel_rounds_add_each_value_once(client):
+	frame = client.getFunnel([amplitudeFrozenEvent('Play'), amplitudeFrozenEvent('Pay')], '2024-01-01', '2024-01-02', 
+							 groupBy = amplitudeUserPropertyGroupBy(['tier']), limit = 10, exhaustive = True)
+	assert not frame.duplicated(['Segment', 'Step']).any()
+	assert sorted(frame.Segment.unique()) == sorted(values)
+
+def test_two_dimensions_have_no_duplicates(client):
+	frame = client.getEventSegmentation(amplitudeFrozenEvent('Play').groupBy('event', 'source'), '2024-01-01', '2024-01-02', 
+										groupBy = amplitudeUserPropertyGroupBy(['tier']), limit = 10, exhaustive = True)
+	assert not frame.duplicated(['Segment', 'x']).any()
+	assert frame.Segment.nunique() == len(values)
@@ -0,0 +1,32 @@
+import os
+import json
+
+import pytest
+import pandas as pd
+
+from amplitude_API import *
+from amplitude_mock_server import amplitudeMockServer
+
+pytest.importorskip('pyarrow')
+
+def test_export_round_trip(amplitude, mock, tmp_path):
+	directory = str(tmp_path / 'events')
+	with amplitudeParquetSink(directory) as sink:
+		counts = amplitude.exportEvents('2024-01-01T22', '2024-01-02T01', sink, batchSize = 15)
+	assert counts == {'2024-01-01': 2 * mock.exportEvents, '2024-01-02': 2 * mock.exportEvents}
+
+	for date, hours in [('2024-01-01', ['20240101T22', '20240101T23']), ('2024-01-02', ['20240102T00', '20240102T01'])]:
+		frame = pd.read_parquet(os.path.join(directory, 'date=' + date))
+		expected = [event for hour in hours for event in mock.exportHour(hour)]
+		assert list(frame['$insert_id']) == [event['$insert_id'] for event in expected]
+		assert list(frame['amplitude_id']) == [event['amplitude_id'] for event in expected]
+		assert [json.loads(value) for value in frame['event_properties']] == [event['event_properties'] for event in expected]
+		#fields missing from AMPL_EXPORT_FIELDS are kept in the extra column
+		assert [json.loads(value) for value in frame['extra']] == [{'$schema': 12}] * len(expected)
+		assert frame['location_lat'].isna().all()
+
+def test_export_without_data(tmp_path):
+	with amplitudeMockServer(exportEvents = 0) as mock:
+		with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}) as amplitude:
+			with amplitudeParquetSink(str(tmp_path / 'events')) as sink:
+				assert amplitude.exportEvents('2024-01-01', '2024-01-01', sink) == {}
@@ -0,0 +1,48 @@
+import pytest
+
+from amplitude_API import *
+
+event = amplitudeEvent('Play')
+dimensions = [('user', 'country'), ('user', 'platform'), ('user', 'version'), ('event', 'Source')]
+values = {'version': ['1.0', '1.1']}
+
+def test_every_combination_is_fetched(amplitude, mock):
+	before = mock.stats()['requests']
+	frame = amplitude.getEventSegmentationFanOut(event, '2024-05-01', '2024-05-02', dimensions, values = values)
+	#a discovery request for Source, then one per version and Source
+	assert mock.stats()['requests'] - before == 1 + 2 * 10
+	assert list(frame.columns) == ['country', 'platform', 'version', 'Source', 'x', 'y']
+	assert frame.groupby(['version', 'Source']).size().to_dict() == {(version, 'Source {0}'.format(index)): 10 * 2 
+																	  for version in values['version'] for index in range(10)}
+
+def test_combinations_match_filtered_requests(amplitude):
+	frame = amplitude.getEventSegmentationFanOut(event, '2024-05-01', '2024-05-02', dimensions, values = values)
+	filtered = event.freeze().withGroupBy(dimensions[:2]).andIs('user', 'version', ['1.1']).andIs('event', 'Source', ['Source 3'])
+	expected = amplitude.getEventSegmentation(filtered, '2024-05-01', '2024-05-02')
+	part = frame[(frame.version == '1.1') & (frame.Source == 'Source 3')]
+	assert list(part.y) == list(expected.y)
+	assert list(part.x) == list(expected.x)
+
+def test_two_dimensions_need_a_single_request(amplitude, mock):
+	before = mock.stats()['requests']
+	frame = amplitude.getEventSegmentationFanOut(event, '2024-05-01', '2024-05-02', dimensions[:2])
+	assert mock.stats()['requests'] - before == 1
+	assert list(frame.columns) == ['country', 'platform', 'x', 'y']
+	assert len(frame) == 10 * 2
+
+def test_request_cap(amplitude, mock):
+	before = mock.stats()['requests']
+	with pytest.raises(ValueError):
+		amplitude.getEventSegmentationFanOut(event, '2024-05-01', '2024-05-02', dimensions, values = values, maxRequests = 20)
+	#only the discovery request was sent
+	assert mock.stats()['requests'] - before == 1
+
+	with pytest.raises(ValueError):
+		amplitude.getEventSegmentationFanOut(event, '2024-05-01', '2024-05-02', dimensions, maxRequests = 0)
+	assert mock.stats()['requests'] - before == 1
+
+def test_json_output(mock):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, dtypes = AMPL_DTYPES_JSON) as client:
+		body = client.getEventSegmentationFanOut(event, '2024-05-01', '2024-05-02', dimensions, values = values)
+	assert len(body['data']['series']) == 2 * 10 * 10
+	assert all(len(label) == 4 for label in body['data']['seriesLabels'])
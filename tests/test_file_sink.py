@@ -0,0 +1,47 @@
+import glob
+import json
+import os
+
+import pytest
+import pandas as pd
+
+from amplitude_API import *
+
+def read(directory, table, fileFormat):
+	paths = sorted(glob.glob(os.path.join(directory, table, '*.' + fileFormat)))
+	reader = pd.read_parquet if fileFormat == 'parquet' else pd.read_csv
+	return paths, pd.concat([reader(path) for path in paths], ignore_index = True)
+
+@pytest.mark.parametrize('fileFormat', ['parquet', 'csv'])
+def test_frames_round_trip(tmp_path, fileFormat):
+	if fileFormat == 'parquet':
+		pytest.importorskip('pyarrow')
+	frame = pd.DataFrame({'id': range(25),
+						  'value': [index / 4 for index in range(25)],
+						  'flag': [index % 2 == 0 for index in range(25)],
+						  'name': ['name {0}'.format(index) for index in range(25)],
+						  'properties': [{'index': index, 'tags': ['a', 'b']} for index in range(25)]})
+	with amplitudeFileSink(str(tmp_path), fileFormat = fileFormat, rowsPerFile = 10) as sink:
+		for start in range(0, 25, 5):
+			sink.write('events', frame[start:start + 5])
+
+	paths, written = read(str(tmp_path), 'events', fileFormat)
+	assert [os.path.basename(path) for path in paths] == ['part-{0:05d}.{1}'.format(part, fileFormat) for part in range(3)]
+	assert written.drop(columns = ['properties']).equals(frame.drop(columns = ['properties']))
+	assert [json.loads(value) for value in written.properties] == list(frame.properties)
+
+def test_user_activity_export(amplitude, tmp_path):
+	with amplitudeFileSink(str(tmp_path), fileFormat = 'csv', rowsPerFile = 1000) as sink:
+		summary = amplitude.exportUserActivity([1, 2], sink, limit = 100)
+	assert summary == {'users': 2, 'events': 500, 'errors': {}}
+
+	paths, users = read(str(tmp_path), 'users', 'csv')
+	assert sorted(users.user_id) == sorted(user['user_id'] for user, events in [amplitude.getUserActivity(1), amplitude.getUserActivity(2)])
+	paths, events = read(str(tmp_path), 'events', 'csv')
+	#events of every user are written page by page, users are exported concurrently
+	for user in [1, 2]:
+		written = events[events.user_id == 'user{0}'.format(user)]
+		expected = pd.concat([page for data, page in amplitude.iterUserActivity(user, limit = 100)], ignore_index = True)
+		assert len(written) == len(expected)
+		assert list(written.event_type) == list(expected.event_type)
+		assert [json.loads(value) for value in written.event_properties] == list(expected.event_properties)
@@ -0,0 +1,50 @@
+import pytest
+
+from amplitude_API import *
+
+groupBy = amplitudeUserPropertyGroupBy(['tier'])
+event = amplitudeFrozenEvent('Play')
+
+@pytest.fixture
+def store(tmp_path):
+	return amplitudeSegmentationStore(str(tmp_path))
+
+def test_only_missing_days_are_requested(amplitude, mock, store):
+	before = mock.stats()['requests']
+	first = amplitude.getEventUniquesIncremental(store, event, '2024-05-01', '2024-05-05', groupBy = groupBy)
+	assert mock.stats()['requests'] - before == 1
+	assert amplitude.getEventUniquesIncremental(store, event, '2024-05-01', '2024-05-05', groupBy = groupBy).equals(first)
+	assert mock.stats()['requests'] - before == 1
+
+	#a day after the stored range and one before it
+	extended = amplitude.getEventUniquesIncremental(store, event, '2024-04-30', '2024-05-06', groupBy = groupBy)
+	assert mock.stats()['requests'] - before == 3
+	assert len(extended) == len(first) // 5 * 7
+
+	stored = extended[(extended.x >= '2024-05-01') & (extended.x <= '2024-05-05')].reset_index(drop = True)
+	assert stored.equals(first)
+	for day in ['2024-04-30', '2024-05-06']:
+		fetched = amplitude.getEventUniques(event, day, day, groupBy = groupBy)
+		assert list(extended[extended.x == day].y) == list(fetched.y)
+
+	#a range inside the stored one is served from the store
+	before = mock.stats()['requests']
+	inner = amplitude.getEventUniquesIncremental(store, event, '2024-05-02', '2024-05-03', groupBy = groupBy)
+	assert mock.stats()['requests'] == before
+	assert list(inner.y) == list(extended[(extended.x >= '2024-05-02') & (extended.x <= '2024-05-03')].y)
+
+def test_days_which_are_not_final_are_refetched(amplitude, mock, store):
+	before = mock.stats()['requests']
+	for call in range(2):
+		amplitude.getEventUniquesIncremental(store, event, '2024-05-01', '2024-05-05', settleDays = 10 ** 5)
+	assert mock.stats()['requests'] - before == 2
+
+def test_series_are_stored_separately(amplitude, store, tmp_path):
+	amplitude.getEventUniquesIncremental(store, event, '2024-05-01', '2024-05-02')
+	amplitude.getEventTotalsIncremental(store, event, '2024-05-01', '2024-05-02')
+	amplitude.getEventUniquesIncremental(store, event, '2024-05-01', '2024-05-02', groupBy = groupBy)
+	assert len(list(tmp_path.glob('*.pkl'))) == 3
+
+def test_only_daily_series_are_supported(amplitude, store):
+	with pytest.raises(ValueError):
+		amplitude.getEventSegmentationIncremental(store, event, '2024-05-01', '2024-05-31', frequency = AMPL_FREQ_WEEKLY)
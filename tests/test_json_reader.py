@@ -0,0 +1,36 @@
+import json
+from urllib.request import urlopen
+
+import pytest
+
+from amplitude_API import *
+
+body = json.dumps({'novaCost': 3, 'data': {'seriesLabels': [0, 'ü'], 'series': [[1, 2.5], {'a': [1, {'b': 'c]'}]}, 'x', 12345, []], 
+										   'xValues': ['2024-01-01']}}).encode('utf-8')
+
+def read(path, chunks):
+	reader = amplitudeJSONArrayReader(path)
+	items = [item for chunk in chunks for item in reader.feed(chunk)]
+	return items + reader.finish(), reader.values
+
+@pytest.mark.parametrize('size', [1, 7, len(body)])
+def test_items_and_values_do_not_depend_on_chunks(size):
+	items, values = read(['data', 'series'], [body[position:position + size] for position in range(0, len(body), size)])
+	assert items == json.loads(body)['data']['series']
+	assert values['novaCost'] == 3 and values['seriesLabels'] == [0, 'ü'] and values['xValues'] == ['2024-01-01']
+
+def test_top_level_array():
+	assert read([], [b' [1, ', b'2', b'3 , "a"] '])[0] == [1, 23, 'a']
+
+def test_malformed_responses_raise():
+	with pytest.raises(ValueError):
+		read(['data', 'series'], [body[:-5]])
+	with pytest.raises(ValueError):
+		read(['events'], [body])
+
+def test_stream_yields_the_events_of_a_response(amplitude):
+	url, parse = amplitude.__userActivityRequest__(1, limit = 100)
+	with urlopen(url) as response:
+		events = json.loads(response.read())['events']
+	assert list(amplitude.queryApiStream(url, ['events'])) == events
+	assert len(events) == 100
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#runs code in a fresh interpreter, where nothing has been imported yet
+def run(code):
+	subprocess.run([sys.executable, '-c', textwrap.dedent(code)], cwd = root, check = True)
+
+def test_import_loads_no_heavy_module():
+	run('''
+		import sys
+		import amplitude_API
+		from amplitude_API import *
+
+		heavy = {'pandas', 'numpy', 'pycurl', 'asyncio'}
+		assert not heavy & set(sys.modules), heavy & set(sys.modules)
+
+		event = amplitudeFrozenEvent('Play').andIs('event', 'source', ['a']).groupBy('event', 'source')
+		assert event.url and amplitudeFrozenSegment().andIs('country', ['US']).url
+		assert not heavy & set(sys.modules), heavy & set(sys.modules)
+
+		assert amplitude_API.pd.DataFrame({'a': [1]}).shape == (1, 1)
+		assert amplitude_API.pd is sys.modules['pandas']
+		assert 'numpy' in sys.modules and 'pycurl' not in sys.modules
+	''')
+
+def test_json_output_needs_no_pandas(mock):
+	run('''
+		import sys
+		from amplitude_API import *
+
+		with amplitudeAPI({{'apiKey': 'test', 'secretKey': 'test', 'apiUrl': '{0}'}}, dtypes = AMPL_DTYPES_JSON) as amplitude:
+			assert len(amplitude.getEvents()['data']) > 0
+		assert 'pycurl' in sys.modules
+		assert 'pandas' not in sys.modules and 'numpy' not in sys.modules
+	'''.format(mock.url))
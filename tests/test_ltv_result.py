@@ -0,0 +1,39 @@
+import json
+from urllib.request import urlopen
+
+import pytest
+
+from amplitude_API import *
+
+groupBy = amplitudeUserPropertyGroupBy(['tier'])
+
+def response(url):
+	with urlopen(url) as body:
+		return json.loads(body.read())['data']
+
+def test_ltv_combined_tables(amplitude, mock):
+	url, parse = amplitude.__ltvRequest__('2024-01-01', '2024-01-04', groupBy = groupBy)
+	data = response(url)
+	ltv = amplitude.getLTV('2024-01-01', '2024-01-04', groupBy = groupBy, asResult = True)
+	ages = range(1, mock.ages + 1)
+
+	spend = ltv.combinedSpendPerUser
+	assert list(spend.columns) == ['segment', 'age', 'x', 'payers', 'combined_complete']
+	assert len(spend) == len(data['seriesLabels']) * mock.ages
+	expected = [(label, age, series['combined']['r{0}d'.format(age)], series['combined']['paid'], series['combined_complete']['r{0}d'.format(age)])
+				for label, series in zip(data['seriesLabels'], data['series']) for age in ages]
+	assert [tuple(row) for row in spend.itertuples(index = False)] == expected
+
+	assert ltv.combinedTotals.payers.to_dict() == {label: series['combined']['paid'] for label, series in zip(data['seriesLabels'], data['series'])}
+	flags = ltv.combinedCompleteFlag.combined_complete
+	assert flags.to_dict() == {(label, age): series['combined_complete']['r{0}d'.format(age)] 
+							   for label, series in zip(data['seriesLabels'], data['series']) for age in ages}
+
+	spendPerUser, conversions = amplitude.getLTV('2024-01-01', '2024-01-04', groupBy = groupBy)
+	assert ltv.byDayCumulativeSpendPerUser.equals(spendPerUser)
+	assert ltv.byDayConversions.equals(conversions)
+
+def test_compact_dtypes_convert_combined_tables(mock):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, dtypes = AMPL_DTYPES_COMPACT) as client:
+		ltv = client.getLTV('2024-01-01', '2024-01-04', groupBy = groupBy, asResult = True)
+		assert isinstance(ltv.combinedSpendPerUser.segment.dtype, pd.CategoricalDtype)
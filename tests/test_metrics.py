@@ -0,0 +1,44 @@
+import re
+
+import pytest
+
+from amplitude_API import *
+
+def samples(text, name):
+	pattern = re.compile(r'^amplitude_{0}\{{(.*)\}} (\S+)$'.format(name))
+	result = []
+	for line in text.splitlines():
+		match = pattern.match(line)
+		if match is not None:
+			result += [(dict(re.findall(r'(\w+)="([^"]*)"', match.group(1))), float(match.group(2)))]
+	return result
+
+@pytest.fixture
+def client(mock, tmp_path):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, cache = amplitudeResponseCache(str(tmp_path))) as amplitude:
+		yield amplitude
+
+def test_requests_are_exposed_per_getter(client):
+	event = amplitudeFrozenEvent('Play')
+	client.getEventUniques(event, '2024-01-01', '2024-01-03')
+	client.getEventUniques(event, '2024-01-01', '2024-01-03')
+	text = client.metrics.prometheus()
+
+	requests = {(labels['getter'], labels['cached']): value for labels, value in samples(text, 'requests_total')}
+	assert requests == {('getEventUniques', 'false'): 1.0, ('getEventUniques', 'true'): 1.0}
+	assert [value for labels, value in samples(text, 'getter_calls_total')] == [2.0]
+	assert all(value > 0 for labels, value in samples(text, 'response_bytes_total') if labels['cached'] == 'false')
+	assert {labels['le'] for labels, value in samples(text, 'request_duration_seconds_bucket')} >= {'+Inf'}
+
+def test_streams_and_incremental_calls_have_getters(client, tmp_path):
+	event = amplitudeFrozenEvent('Play')
+	client.getEventUniquesIncremental(amplitudeSegmentationStore(str(tmp_path / 'store')), event, '2024-01-01', '2024-01-03')
+	list(client.iterUserActivity(1, limit = 100))
+	url, parse = client.__userActivityRequest__(2)
+	items = client.queryApiStream(url, ['events'])
+	next(items)
+	client.getEvents()               #while the stream is suspended
+	list(items)
+
+	getters = {labels['getter'] for labels, value in samples(client.metrics.prometheus(), 'requests_total')}
+	assert getters == {'getEventUniquesIncremental', 'iterUserActivity', 'queryApiStream', 'getEvents'}
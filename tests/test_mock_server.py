@@ -0,0 +1,34 @@
+import json
+from urllib.request import urlopen
+
+from amplitude_API import *
+from amplitude_mock_server import amplitudeMockServer
+
+def test_ltv_rows_have_the_fields_of_real_responses(amplitude, mock):
+	url, parse = amplitude.__ltvRequest__('2024-01-01', '2024-01-03')
+	with urlopen(url) as response:
+		series = json.loads(response.read())['data']['series'][0]
+	for row in list(series['values'].values()) + [series['combined']]:
+		assert {'count', 'paid', 'total_amount', 'rtotal', 'rtotalnew'} <= set(row)
+		assert {'r{0}d'.format(age) for age in range(1, mock.ages + 1)} <= set(row)
+		assert {'r{0}new'.format(age) for age in range(1, mock.ages + 1)} <= set(row)
+
+def test_conditions_and_limit_select_the_group_values(amplitude):
+	groupBy = amplitudeUserPropertyGroupBy(['tier'])
+	segment = amplitudeFrozenSegment().andIsNot('tier', ['tier 0', 'tier 1'])
+	event = amplitudeFrozenEvent('Play')
+	frame = amplitude.getEventUniques(event, '2024-01-01', '2024-01-01', segment = segment, groupBy = groupBy)
+	assert list(frame.Segment) == ['tier {0}'.format(index) for index in range(2, 10)]
+
+	frame = amplitude.getEventSegmentation(event.andIs('event', 'source', ['source 3', 'source 5']).groupBy('event', 'source'), '2024-01-01', '2024-01-01')
+	assert list(frame.Segment) == ['source 3', 'source 5']
+
+	frame = amplitude.getEventSegmentation(event, '2024-01-01', '2024-01-01', groupBy = groupBy, limit = 3)
+	assert list(frame.Segment) == ['tier 0', 'tier 1', 'tier 2']
+
+def test_none_value_is_not_excluded():
+	with amplitudeMockServer(series = 3, noneValue = True) as mock:
+		with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}) as amplitude:
+			segment = amplitudeFrozenSegment().andIsNot('tier', ['(none)', 'tier 0'])
+			frame = amplitude.getEventUniques(amplitudeFrozenEvent('Play'), '2024-01-01', '2024-01-01', segment = segment, groupBy = amplitudeUserPropertyGroupBy(['tier']))
+			assert list(frame.Segment) == ['(none)', 'tier 1', 'tier 2']
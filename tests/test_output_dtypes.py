@@ -0,0 +1,49 @@
+import pytest
+
+from amplitude_API import *
+
+groupBy = amplitudeUserPropertyGroupBy(['tier'])
+funnel = [amplitudeFrozenEvent('Play'), amplitudeFrozenEvent('Pay')]
+
+@pytest.fixture(params = [AMPL_DTYPES_COMPACT, AMPL_DTYPES_ARROW])
+def compact(mock, request):
+	if request.param == AMPL_DTYPES_ARROW:
+		pytest.importorskip('pyarrow')
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, dtypes = request.param) as client:
+		yield client
+
+#getters returning frames with labels, dates, integers and floats
+def frames(client):
+	uniques = client.getEventUniques(amplitudeFrozenEvent('Play'), '2024-05-01', '2024-05-10', groupBy = groupBy)
+	funnels = client.getFunnel(funnel, '2024-05-01', '2024-05-02', groupBy = groupBy)
+	user, events = client.getUserActivity(1)
+	return [uniques, funnels, events]
+
+def test_values_match_default_output(amplitude, compact):
+	for default, converted in zip(frames(amplitude), frames(compact)):
+		assert list(converted.columns) == list(default.columns)
+		assert len(converted) == len(default)
+		for column in default.columns:
+			assert converted[column].astype(object).tolist() == default[column].astype(object).tolist(), column
+
+def test_repeated_labels_become_categoricals(compact):
+	uniques, funnels, events = frames(compact)
+	assert isinstance(uniques.Segment.dtype, pd.CategoricalDtype)
+	assert isinstance(events.event_type.dtype, pd.CategoricalDtype)
+
+def test_memory_report(amplitude, compact):
+	assert compact.memoryReport()['frames'] == 0
+	frames(compact)
+	report = compact.memoryReport()
+	assert report['frames'] == 3
+	assert report['bytesAfter'] < report['bytesBefore']
+	assert report['bytesSaved'] == report['bytesBefore'] - report['bytesAfter']
+	assert report['ratio'] == report['bytesAfter'] / report['bytesBefore']
+
+	#the default client converts nothing
+	frames(amplitude)
+	assert amplitude.memoryReport() == {'frames': 0, 'bytesBefore': 0, 'bytesAfter': 0, 'bytesSaved': 0, 'ratio': 1.0}
+
+def test_unsupported_dtypes(mock):
+	with pytest.raises(ValueError):
+		amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, dtypes = 'float16')
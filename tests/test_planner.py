@@ -0,0 +1,49 @@
+import pandas as pd
+
+from amplitude_API import *
+
+event = amplitudeFrozenEvent('Play Song')
+
+def test_duplicates_are_fetched_once(amplitude, mock):
+	queries = [('getEventUniques', [event, '2024-01-01', '2024-01-10']),
+			   ('getEventUniques', {'event': event, 'startDt': '2024-01-01', 'finishDt': '2024-01-10'})]
+	plan = amplitude.planQueries(queries)
+	assert plan.report() == {'logical': 2, 'unique': 1, 'physical': 1, 'merged': 0}
+
+	before = mock.stats()['requests']
+	first, second = amplitude.runPlan(plan)
+	assert mock.stats()['requests'] - before == 1
+	pd.testing.assert_frame_equal(first, second)
+	assert first is not second
+
+def test_overlapping_ranges_are_sliced_from_one_request(amplitude, mock):
+	queries = [('getEventUniques', [event, '2024-01-01', '2024-01-10']),
+			   ('getEventUniques', [event, '2024-01-05', '2024-01-20']),
+			   ('getEventUniques', [event, '2024-01-21', '2024-01-25']),
+			   ('getEventTotals', [event, '2024-01-01', '2024-01-10'])]
+	plan = amplitude.planQueries(queries)
+	assert plan.report() == {'logical': 4, 'unique': 4, 'physical': 2, 'merged': 1}
+	#one event and one formula per request
+	for url, members in plan.fetches:
+		assert '%3B' not in url and '&e2=' not in url
+
+	results = amplitude.runPlan(plan)
+	whole = amplitude.getEventUniques(event, '2024-01-01', '2024-01-25')
+	for (getterName, (currentEvent, start, finish)), result in zip(queries[:3], results[:3]):
+		expected = whole[(whole.x >= start) & (whole.x <= finish)].reset_index(drop = True)
+		pd.testing.assert_frame_equal(result.reset_index(drop = True), expected)
+	assert list(results[3].x) == list(pd.date_range('2024-01-01', '2024-01-10'))
+
+def test_grouped_and_weekly_series_are_not_merged(amplitude):
+	grouped = event.groupBy('user', 'country')
+	queries = [('getEventUniques', [grouped, '2024-01-01', '2024-01-10']),
+			   ('getEventUniques', [grouped, '2024-01-05', '2024-01-20']),
+			   ('getEventUniques', {'event': event, 'startDt': '2024-01-01', 'finishDt': '2024-01-31', 'frequency': AMPL_FREQ_WEEKLY}),
+			   ('getEventUniques', {'event': event, 'startDt': '2024-01-15', 'finishDt': '2024-02-15', 'frequency': AMPL_FREQ_WEEKLY})]
+	assert amplitude.planQueries(queries).report() == {'logical': 4, 'unique': 4, 'physical': 4, 'merged': 0}
+
+def test_other_getters_pass_through(amplitude):
+	queries = [('getEvents', []), ('getSessionAvgLength', ['2024-01-01', '2024-01-03'])]
+	events, sessions = amplitude.getPlanned(queries)
+	pd.testing.assert_frame_equal(events, amplitude.getEvents())
+	assert len(sessions) == 3
@@ -0,0 +1,38 @@
+import pytest
+
+from amplitude_API import *
+
+@pytest.fixture
+def pool(mock):
+	config = {'apiUrl': mock.url, 'projects': {'app-us': {'apiKey': 'us', 'secretKey': 'us'}, 
+											   'app-eu': {'apiKey': 'eu', 'secretKey': 'eu'}}}
+	with amplitudeProjectPool(config, dtypes = AMPL_DTYPES_COMPACT) as projects:
+		yield projects
+
+def test_frames_are_converted_once(pool):
+	frame = pool.run('getEventUniques', amplitudeFrozenEvent('Play'), '2024-01-01', '2024-01-03')
+	assert set(frame.project) == {'app-us', 'app-eu'}
+	assert [pool[project].memoryReport()['frames'] for project in pool.projects] == [1, 1]
+
+def test_any_failure_is_stored_by_project(pool, monkeypatch):
+	def fail(*args, **kwargs):
+		raise RuntimeError('failed')
+	monkeypatch.setattr(pool['app-eu'], 'getEventUniques', fail)
+
+	errors = {}
+	frame = pool.run('getEventUniques', amplitudeFrozenEvent('Play'), '2024-01-01', '2024-01-03', errors = errors)
+	assert set(frame.project) == {'app-us'}
+	assert list(errors) == ['app-eu'] and isinstance(errors['app-eu'], RuntimeError)
+
+	with pytest.raises(RuntimeError):
+		pool.run('getEventUniques', amplitudeFrozenEvent('Play'), '2024-01-01', '2024-01-03')
+
+def test_store_keys_differ_by_project(pool, tmp_path):
+	store = amplitudeSegmentationStore(str(tmp_path))
+	event = amplitudeFrozenEvent('Play')
+	keys = [store.key(event, None, None, AMPL_METRIC_UNIQUES, AMPL_FORMULA_UNIQUES, AMPL_FREQ_DAILY, pool[project].apiKey) for project in pool.projects]
+	assert keys[0] != keys[1]
+
+	for project in pool.projects:
+		pool[project].getEventUniquesIncremental(store, event, '2024-01-01', '2024-01-03')
+	assert len(list(tmp_path.glob('*.pkl'))) == 2
@@ -0,0 +1,39 @@
+import json
+from urllib.parse import unquote
+
+from amplitude_API import *
+
+def test_frozen_event_keeps_the_url():
+	event = amplitudeEvent('Play Song')
+	event.andIs('user', 'Country', ['United States', 'Germany'])
+	event.andIsNot('event', 'Genre', ['Rock'])
+	event.groupBy('user', 'device_type')
+	assert event.getEventUrl() == event.freeze().getEventUrl()
+	assert event.freeze() == amplitudeFrozenEvent('Play Song').andIsNot('event', 'Genre', ['Rock']).andIs('user', 'Country', ['Germany', 'United States']).groupBy('user', 'device_type')
+
+def test_percent_encoded_values_are_decoded():
+	encoded = amplitudeEvent('Play%20Song')
+	encoded.andIs('user', 'Country', ['United%20States'])
+	plain = amplitudeEvent('Play Song')
+	plain.andIs('user', 'Country', ['United States'])
+	assert encoded.getEventUrl() == plain.getEventUrl()
+
+	segment = amplitudeSegment()
+	segment.andIs('City', ['San%20Francisco'])
+	assert segment.freeze() == amplitudeFrozenSegment().andIs('City', ['San Francisco'])
+	assert segment.getConditionsUrl() == segment.freeze().getConditionsUrl()
+
+def test_values_with_special_characters_give_valid_json():
+	event = amplitudeEvent('Say "hi"')
+	event.andIs('event', 'text', ['a "quoted" & \\ value'])
+	query = json.loads(unquote(event.getEventUrl()))
+	assert query['event_type'] == 'Say "hi"'
+	assert query['filters'][0]['subprop_value'] == ['a "quoted" & \\ value']
+
+	segment = amplitudeSegment()
+	segment.andIs('Plan', ['a&b'])
+	assert json.loads(unquote(segment.getConditionsUrl()[len('&s='):])) == [{'prop': 'gp:Plan', 'op': 'is', 'values': ['a&b']}]
+
+def test_group_by_urls_match():
+	groupBy = amplitudeUserPropertyGroupBy(['Tier', 'country'])
+	assert groupBy.getConditionsUrl() == groupBy.freeze().getConditionsUrl() == '&g=gp%3ATier&g=country'
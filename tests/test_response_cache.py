@@ -0,0 +1,84 @@
+import json
+import os
+import time
+from urllib.request import urlopen
+
+import pytest
+
+from amplitude_API import *
+
+@pytest.fixture
+def cache(tmp_path):
+	return amplitudeResponseCache(str(tmp_path))
+
+@pytest.fixture
+def cached(mock, cache):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, cache = cache) as client:
+		yield client
+
+def header(cache, url, apiKey = 'test'):
+	with open(os.path.join(cache.directory, cache.key(url, apiKey) + '.z'), 'rb') as f:
+		return json.loads(f.readline())
+
+def test_settled_responses_are_served_from_the_cache(cached, cache, mock):
+	event = amplitudeFrozenEvent('Play')
+	before = mock.stats()['requests']
+	first = cached.getEventUniques(event, '2024-01-01', '2024-01-03')
+	second = cached.getEventUniques(event, '2024-01-01', '2024-01-03')
+	assert mock.stats()['requests'] - before == 1
+	assert first.equals(second)
+	assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+	url, parse = cached.__eventSegmentationRequest__(event, '2024-01-01', '2024-01-03')
+	assert header(cache, url)['expires'] is None
+
+def test_keys_ignore_parameter_order_but_not_the_api_key(cache):
+	assert cache.key('https://a/api/2/x?a=1&b=2') == cache.key('https://A/api/2/x?b=2&a=1')
+	assert cache.key('https://a/api/2/x?a=1', 'us') != cache.key('https://a/api/2/x?a=1', 'eu')
+	assert cache.get(cache.key('https://a/api/2/x?a=1')) is None
+	assert cache.stats()['misses'] == 1
+
+def test_recent_responses_expire(cache, monkeypatch):
+	today = datetime.now().strftime('%Y%m%d')
+	url = 'https://a/api/2/events/segmentation?start=20240101&end={0}'.format(today)
+	cache.put(cache.key(url), url, b'{"data": {}}')
+	assert cache.get(cache.key(url)) == b'{"data": {}}'
+
+	expires = header(cache, url, '')['expires']
+	assert expires is not None
+	monkeypatch.setattr(time, 'time', lambda: expires + 1)
+	assert cache.get(cache.key(url)) is None
+	assert cache.stats()['entries'] == 0
+
+def test_incomplete_bodies_get_the_short_lifetime(cached, cache):
+	url, parse = cached.__ltvRequest__('2024-01-01', '2024-01-03')
+	with urlopen(url) as response:
+		body = response.read()
+	assert b'false' in body
+	assert cache.__expiry__(url, body) is not None
+
+	complete = json.loads(body)
+	for current in complete['data']['series']:
+		current['complete'] = {day: {age: True for age in ages} for day, ages in current['complete'].items()}
+		current['combined_complete'] = {age: True for age in current['combined_complete']}
+	assert cache.__expiry__(url, json.dumps(complete).encode('utf-8')) is None
+
+	url = 'https://a/api/3/chart/retention?start=20240101&end=20240103'
+	assert cache.__expiry__(url, b'{"data": [{"incomplete": true}]}') is not None
+	assert cache.__expiry__(url, b'{"data": [{"incomplete": false}]}') is None
+
+@pytest.mark.parametrize('content', [b'', b'not a header\n', b'{"expires": null}\nnot zlib', b'{}\n'])
+def test_corrupt_entries_are_misses(cache, content):
+	url = 'https://a/api/2/events/segmentation?start=20240101&end=20240102'
+	cache.put(cache.key(url), url, b'{"data": {}}')
+	with open(os.path.join(cache.directory, cache.key(url) + '.z'), 'wb') as f:
+		f.write(content)
+	assert cache.get(cache.key(url)) is None
+	assert not os.path.exists(os.path.join(cache.directory, cache.key(url) + '.z'))
+	assert cache.stats()['misses'] == 1
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+	cache = amplitudeResponseCache(str(tmp_path), maxBytes = 1)
+	url = 'https://a/api/2/events/segmentation?start=20240101&end=20240102'
+	cache.put(cache.key(url), url, b'{"data": {}}')
+	assert cache.stats()['evictions'] == 1 and cache.stats()['entries'] == 0
@@ -0,0 +1,39 @@
+import time
+
+from amplitude_API import *
+
+def test_least_recently_used_results_are_evicted():
+	cache = amplitudeResultCache(maxBytes = 3 * amplitudeResultCache.size({'a': 1}))
+	for key in ['a', 'b', 'c']:
+		cache.put(key, {key: 1})
+	assert cache.get('a') == {'a': 1}              #'b' becomes the least recently used
+	cache.put('d', {'d': 1})
+	assert cache.get('b') is None
+	assert [cache.get(key) for key in ['a', 'c', 'd']] == [{'a': 1}, {'c': 1}, {'d': 1}]
+	assert cache.stats()['evictions'] == 1 and cache.stats()['hits'] == 4 and cache.stats()['misses'] == 1
+
+def test_results_expire_and_are_copied(monkeypatch):
+	cache = amplitudeResultCache(ttl = 10)
+	result = {'data': [1, 2]}
+	cache.put('key', result)
+	result['data'] += [3]
+	cached = cache.get('key')
+	cached['data'] += [4]
+	assert cache.get('key') == {'data': [1, 2]}
+
+	now = time.monotonic()
+	monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+	assert cache.get('key') is None
+	assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 0
+
+def test_getter_results_are_served_from_memory(mock):
+	cache = amplitudeResultCache()
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, resultCache = cache) as client:
+		event = amplitudeFrozenEvent('Play')
+		before = mock.stats()['requests']
+		first = client.getEventUniques(event, '2024-04-01', '2024-04-03')
+		first.loc[0, 'y'] = -1
+		second = client.getEventUniques(event, '2024-04-01', '2024-04-03')
+		assert mock.stats()['requests'] - before == 1
+		assert second.loc[0, 'y'] != -1
+		assert cache.stats()['hits'] == 1
@@ -0,0 +1,45 @@
+import json
+from urllib.request import urlopen
+
+import pytest
+
+from amplitude_API import *
+
+groupBy = amplitudeUserPropertyGroupBy(['tier'])
+
+def response(url):
+	with urlopen(url) as body:
+		return json.loads(body.read())['data']
+
+def test_retention_matrices_and_combined_retention(amplitude, mock):
+	url, parse = amplitude.__retentionRequest__('2024-01-01', '2024-01-04', groupBy = groupBy)
+	data = response(url)
+	retention = amplitude.getRetention('2024-01-01', '2024-01-04', groupBy = groupBy, asResult = True)
+
+	days = sorted(data['series'][0]['values'])
+	assert retention.segments == data['seriesLabels']
+	assert list(retention.cohorts) == days
+	assert list(retention.ages) == list(range(1, mock.ages + 1))
+	assert retention.retained.shape == retention.cohortSize.shape == retention.completed.shape == (len(data['seriesLabels']), len(days), mock.ages)
+
+	for segment, series in enumerate(data['series']):
+		for cohort, day in enumerate(days):
+			cells = series['values'][day]
+			assert list(retention.retained[segment, cohort]) == [cell['count'] for cell in cells[1:]]
+			assert list(retention.cohortSize[segment, cohort]) == [cell['outof'] for cell in cells[1:]]
+			assert list(retention.completed[segment, cohort]) == [not cell['incomplete'] for cell in cells[1:]]
+
+	combined = retention.combinedRetention
+	assert list(combined.columns) == ['segment', 'age', 'retained', 'cohort_size', 'completed']
+	expected = [(label, age, cell['count'], cell['outof'], not cell['incomplete']) 
+				for label, series in zip(data['seriesLabels'], data['series']) for age, cell in enumerate(series['combined']) if age > 0]
+	assert [tuple(row) for row in combined.itertuples(index = False)] == expected
+
+	byDay = retention.byDayRetention
+	assert byDay.equals(amplitude.getRetention('2024-01-01', '2024-01-04', groupBy = groupBy))
+	assert byDay.retained.sum() == retention.retained.sum()
+
+def test_compact_dtypes_convert_combined_retention(mock):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, dtypes = AMPL_DTYPES_COMPACT) as client:
+		retention = client.getRetention('2024-01-01', '2024-01-04', groupBy = groupBy, asResult = True)
+		assert isinstance(retention.combinedRetention.segment.dtype, pd.CategoricalDtype)
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pycurl
+import pytest
+
+from amplitude_API import *
+
+@pytest.fixture
+def scheduler():
+	return amplitudeScheduler(maxRetries = 2, backoffBase = 0.01, backoffCap = 0.05)
+
+@pytest.fixture
+def client(mock, scheduler):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, scheduler = scheduler) as amplitude:
+		yield amplitude
+
+event = amplitudeFrozenEvent('Play')
+
+def test_retry_delays(scheduler):
+	assert scheduler.retryDelay(0, 429, 3) == 3
+	assert 0.005 <= scheduler.retryDelay(0, 429) <= 0.01
+	assert 0.01 <= scheduler.retryDelay(1, 503) <= 0.02
+	assert scheduler.retryDelay(0, None) is not None
+	assert scheduler.retryDelay(0, 404) is None
+	assert scheduler.retryDelay(0, 200) is None
+	assert scheduler.retryDelay(2, 503) is None and scheduler.retryDelay(2, None) is None
+	assert scheduler.stats()['default']['retries'] == 4
+	assert scheduler.stats()['default']['throttled'] == 2
+
+def test_throttled_request_waits_for_retry_after(client, mock):
+	mock.fail((429, {'Retry-After': '1'}))
+	before = mock.stats()['requests']
+	started = time.monotonic()
+	assert len(client.getEventUniques(event, '2024-02-01', '2024-02-02')) > 0
+	assert time.monotonic() - started >= 1
+	assert mock.stats()['requests'] - before == 2
+
+@pytest.mark.parametrize('failure', [500, 503, 'reset'])
+def test_failed_and_interrupted_requests_are_retried(client, mock, failure):
+	mock.fail(failure, failure)
+	before = mock.stats()['requests']
+	assert len(client.getEventUniques(event, '2024-02-03', '2024-02-04')) > 0
+	assert mock.stats()['requests'] - before == 3
+
+def test_client_errors_are_not_retried(client, mock):
+	mock.fail(404)
+	before = mock.stats()['requests']
+	with pytest.raises(amplitudeAPIError) as error:
+		client.getEventUniques(event, '2024-02-05', '2024-02-06')
+	assert error.value.status == 404
+	assert mock.stats()['requests'] - before == 1
+
+def test_retries_are_limited(client, mock):
+	mock.fail('reset', 'reset', 'reset')
+	with pytest.raises(pycurl.error):
+		client.getEventUniques(event, '2024-02-07', '2024-02-08')
+	mock.fail(503, 503, 503)
+	with pytest.raises(amplitudeAPIError):
+		client.getEventUniques(event, '2024-02-07', '2024-02-08')
+
+def test_batched_streamed_and_async_requests_are_retried(client, mock, scheduler):
+	mock.fail('reset')
+	frames = client.getEventUniquesMany([(event, '2024-02-09', '2024-02-10'), (event, '2024-02-11', '2024-02-12')])
+	assert all(len(frame) > 0 for frame in frames)
+
+	url, parse = client.__userActivityRequest__(1, limit = 10)
+	mock.fail('reset')
+	assert len(list(client.queryApiStream(url, ['events']))) == 10
+
+	async def fetch():
+		async with amplitudeAsyncAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': mock.url}, scheduler = scheduler) as amplitude:
+			return await amplitude.getEventUniques(event, '2024-02-13', '2024-02-14')
+	mock.fail('reset')
+	assert len(asyncio.run(fetch())) > 0
@@ -0,0 +1,52 @@
+import pytest
+import pandas as pd
+
+from amplitude_API import *
+
+def test_shard_range_is_aligned_to_months_and_weeks(offline):
+	assert offline.__shardRange__('2024-01-15', '2024-03-10', AMPL_FREQ_MONTHLY, 1) == [('20240115', '20240131'), ('20240201', '20240229'), ('20240301', '20240310')]
+	#weeks start on Sunday, 2024-01-07 is one
+	assert offline.__shardRange__('2024-01-03', '2024-01-20', AMPL_FREQ_WEEKLY, 1) == [('20240103', '20240106'), ('20240107', '20240113'), ('20240114', '20240120')]
+	assert offline.__shardRange__('2024-01-01', '2024-01-05', AMPL_FREQ_DAILY, 2) == [('20240101', '20240102'), ('20240103', '20240104'), ('20240105', '20240105')]
+
+def test_merge_series_concatenates_shards(offline):
+	bodies = [{'data': {'seriesLabels': [['a']], 'xValues': ['2024-01-01', '2024-01-02'], 'series': [[1, 2]]}},
+			  {'data': {'seriesLabels': [['a']], 'xValues': ['2024-01-03'], 'series': [[3]]}}]
+	merged = offline.__mergeSeries__(bodies)['data']
+	assert merged['xValues'] == ['2024-01-01', '2024-01-02', '2024-01-03']
+	assert merged['series'] == [[1, 2, 3]]
+
+def ltvShard(day, count, paid, value):
+	return {'data': {'seriesLabels': ['All'],
+					 'series': [{'values': {day: {'count': count, 'paid': paid, 'r1d': value}},
+								 'complete': {day: {'r1d': True}},
+								 'combined': {'paid': paid, 'r1d': value},
+								 'combined_complete': {'r1d': True}}]}}
+
+@pytest.mark.parametrize('metric, expected', [(AMPL_LTV_METRIC_ARPPU, (10 * 1 + 30 * 3) / 4),
+											  (AMPL_LTV_METRIC_ARPU, (10 * 100 + 30 * 300) / 400),
+											  (AMPL_LTV_METRIC_TOTREV, 40),
+											  (AMPL_LTV_METRIC_PAYING, 40)])
+def test_merge_ltv_depends_on_the_metric(offline, metric, expected):
+	bodies = [ltvShard('2024-01-01', 100, 1, 10), ltvShard('2024-01-02', 300, 3, 30)]
+	combined = offline.__mergeLTV__(bodies, metric = metric)['data']['series'][0]['combined']
+	assert combined['r1d'] == pytest.approx(expected)
+	assert combined['paid'] == 4
+
+def test_grouped_queries_are_not_sharded(offline):
+	event = amplitudeEvent('Play')
+	with pytest.raises(ValueError):
+		offline.getSharded('getEventUniques', '2024-01-01', '2024-03-31', event = event, groupBy = amplitudeUserPropertyGroupBy(['country']))
+	with pytest.raises(ValueError):
+		offline.getSharded('getEventUniques', '2024-01-01', '2024-03-31', event = amplitudeFrozenEvent('Play').groupBy('user', 'country'))
+	with pytest.raises(ValueError):
+		offline.getSharded('getEventSegmentation', '2024-01-01', '2024-03-31', event = event, limit = 10)
+	with pytest.raises(ValueError):
+		offline.getSharded('getFunnel', '2024-01-01', '2024-03-31', funnel = [event])
+
+def test_sharded_call_covers_the_whole_range(amplitude, mock):
+	before = mock.stats()['requests']
+	frame = amplitude.getSharded('getEventUniques', '2024-01-15', '2024-03-10', event = amplitudeEvent('Play'))
+	assert mock.stats()['requests'] - before == 3
+	assert len(frame) == (pd.Timestamp('2024-03-10') - pd.Timestamp('2024-01-15')).days + 1
+	assert frame['x'].is_monotonic_increasing
@@ -0,0 +1,55 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from amplitude_API import *
+from amplitude_mock_server import amplitudeMockServer
+
+@pytest.fixture(scope = 'module')
+def slow():
+	with amplitudeMockServer(latency = 0.3) as mock:
+		yield mock
+
+@pytest.fixture
+def client(slow):
+	with amplitudeAPI({'apiKey': 'test', 'secretKey': 'test', 'apiUrl': slow.url}) as amplitude:
+		yield amplitude
+
+def concurrently(call, count = 8):
+	barrier = threading.Barrier(count)
+	def run():
+		barrier.wait()
+		return call()
+	with concurrent.futures.ThreadPoolExecutor(max_workers = count) as executor:
+		futures = [executor.submit(run) for index in range(count)]
+		concurrent.futures.wait(futures)
+	return futures
+
+def test_identical_calls_share_one_request(client, slow):
+	event = amplitudeFrozenEvent('Play')
+	before = slow.stats()['requests']
+	futures = concurrently(lambda: client.getEventUniques(event, '2024-03-01', '2024-03-05'))
+	frames = [future.result() for future in futures]
+	assert slow.stats()['requests'] - before == 1
+	assert all(frame.equals(frames[0]) for frame in frames)
+	#every caller gets its own copy
+	frames[0].loc[0, 'y'] = -1
+	assert frames[1].loc[0, 'y'] != -1
+
+def test_identical_queries_share_one_request(client, slow):
+	url, parse = client.__eventSegmentationRequest__(amplitudeFrozenEvent('Play'), '2024-03-06', '2024-03-07')
+	before = slow.stats()['requests']
+	futures = concurrently(lambda: client.queryApi(url))
+	assert len({id(future.result()) for future in futures}) == len(futures)
+	assert slow.stats()['requests'] - before == 1
+
+def test_error_reaches_every_waiter(client, slow):
+	event = amplitudeFrozenEvent('Play')
+	slow.fail(404)
+	before = slow.stats()['requests']
+	futures = concurrently(lambda: client.getEventUniques(event, '2024-03-08', '2024-03-09'))
+	for future in futures:
+		with pytest.raises(amplitudeAPIError):
+			future.result()
+	assert slow.stats()['requests'] - before == 1
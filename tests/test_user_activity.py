@@ -0,0 +1,15 @@
+import pytest
+
+from amplitude_API import *
+
+#the mock server's users have 250 events, so pages of 50 end with a full page
+@pytest.mark.parametrize('prefetch', [0, 1, 3])
+def test_paging_stops_at_the_last_full_page(amplitude, mock, prefetch):
+	before = mock.stats()['requests']
+	pages = [events for user, events in amplitude.iterUserActivity(1, limit = 50, prefetch = prefetch)]
+	assert [len(events) for events in pages] == [50] * 5
+	assert mock.stats()['requests'] - before == 5
+
+def test_paging_stops_at_a_partial_page(amplitude):
+	pages = [events for user, events in amplitude.iterUserActivity(1, limit = 100, prefetch = 2)]
+	assert [len(events) for events in pages] == [100, 100, 50]